@@ -7,6 +7,15 @@ which is then run on AutoCAD.
 
 *** NOTE: When exporting dxf file in AutoCAD, use the 2000 DXF version format.
 
+Every shape is also kept as a closed polyline (arcs as bulges) on its layer,
+so writeDXF() can write the DXF (R2000) directly, without AutoCAD:
+a = newScript('test.scr')
+a.addLayer("CPW", [50,250,50])
+a.launchPadBegin(150, 300, 4, 4, 200, 200, [3000,200], startAngleRad = pi/2)
+a.writeDXF() # test.dxf
+The region and subtraction commands only act on the script, the DXF holds
+the shapes as drawn.
+
 Notes for AutoLISP:
 
 Erasing everything from a specified layer:
@@ -15,10 +24,29 @@ Erasing everything from a specified layer:
 
 """
 from math import *
+import colorsys
 import subprocess
 from os import getcwd
 import shlex
 
+def nearestACI(color):
+    """ AutoCAD color index closest to an RGB color, for programs that do
+        not read true colors """
+    # Indices 1-9, the 24 hues of 10-249 (bright, light, then darker) and
+    # the grays of 250-255
+    palette = {1: (255,0,0), 2: (255,255,0), 3: (0,255,0), 4: (0,255,255), \
+        5: (0,0,255), 6: (255,0,255), 7: (255,255,255), 8: (128,128,128), \
+        9: (192,192,192)}
+    for i in range(10, 250):
+        value = [1.0, 0.8, 0.6, 0.5, 0.3][(i % 10)//2]
+        saturation = 1.0 if i % 2 == 0 else 0.5
+        r, g, b = colorsys.hsv_to_rgb(((i - 10)//10)/24.0, saturation, value)
+        palette[i] = (255*r, 255*g, 255*b)
+    for (i, gray) in zip(range(250, 256), [51, 80, 105, 130, 190, 255]):
+        palette[i] = (gray, gray, gray)
+    distance = lambda i: sum([(palette[i][k] - color[k])**2 for k in range(3)])
+    return min(palette, key = distance)
+
 class newScript:
     def __init__(self,filename):
         self.filename = filename
@@ -26,6 +54,10 @@ class newScript:
         self.script.write("(setvar \"CmdEcho\" 0)\n-osnap\n\n") # Script set up commands
         self.prevAngleRad = 0.0
         self.prevEnd = [0.0,0.0]
+        # Shapes for writeDXF: (layer, points, bulges) of closed polylines
+        self.layers = [["0", [255,255,255]]]
+        self.currentLayer = "0"
+        self.entities = []
 
     def runScript(self,pathAutoCAD):
         """ Runs AutoCAD with the script you are working with via subprocess"""
@@ -47,16 +79,134 @@ class newScript:
         self.script.write("ZOOM\nALL\n")
         self.script.write("DXFOUT\n%s\nV\nLT2000\n\n" % nameDXF)
 
+    def writeDXF(self, filename = None):
+        """ Writes the shapes drawn so far to a DXF file (version 2000) as
+            LWPOLYLINE entities, with a layer table of the addLayer
+            colors. Needs no AutoCAD. Same name as the script if no
+            filename is given. Returns the number of entities"""
+        if filename is None:
+            filename = self.filename.replace(".scr", "") + ".dxf"
+        dxf = []
+        def group(code, value):
+            dxf.append("%3d\n%s\n" % (code, value))
+        # Fixed handles of the tables and objects, counted up from 0x100
+        # for the layers and entities
+        handles = [0x100]
+        def handle():
+            handles[0] += 1
+            return "%X" % handles[0]
+        layerHandles = [handle() for l in self.layers]
+        entityHandles = [handle() for e in self.entities]
+        xs = [p[0] for e in self.entities for p in e[1]] or [0.0]
+        ys = [p[1] for e in self.entities for p in e[1]] or [0.0]
+        # Header
+        group(0, "SECTION"); group(2, "HEADER")
+        group(9, "$ACADVER"); group(1, "AC1015")
+        group(9, "$HANDSEED"); group(5, handle())
+        group(9, "$INSUNITS"); group(70, 13) # Microns
+        group(9, "$EXTMIN"); group(10, min(xs)); group(20, min(ys)); group(30, 0.0)
+        group(9, "$EXTMAX"); group(10, max(xs)); group(20, max(ys)); group(30, 0.0)
+        group(0, "ENDSEC")
+        group(0, "SECTION"); group(2, "CLASSES"); group(0, "ENDSEC")
+        # Tables
+        group(0, "SECTION"); group(2, "TABLES")
+        def table(name, tableHandle, count):
+            group(0, "TABLE"); group(2, name); group(5, tableHandle)
+            group(330, 0); group(100, "AcDbSymbolTable"); group(70, count)
+        def record(kind, recordHandle, owner, subclass, name):
+            group(0, kind); group(5, recordHandle); group(330, owner)
+            group(100, "AcDbSymbolTableRecord"); group(100, subclass)
+            group(2, name); group(70, 0)
+        table("VPORT", "8", 0); group(0, "ENDTAB")
+        table("LTYPE", "5", 3)
+        for (name, ltypeHandle, text) in [("ByBlock", "14", ""), \
+                ("ByLayer", "15", ""), ("Continuous", "16", "Solid line")]:
+            record("LTYPE", ltypeHandle, "5", "AcDbLinetypeTableRecord", name)
+            group(3, text); group(72, 65); group(73, 0); group(40, 0.0)
+        group(0, "ENDTAB")
+        table("LAYER", "2", len(self.layers))
+        for ([name, color], layerHandle) in zip(self.layers, layerHandles):
+            record("LAYER", layerHandle, "2", "AcDbLayerTableRecord", name)
+            group(62, nearestACI(color))
+            group(420, int(color[0])*65536 + int(color[1])*256 + int(color[2]))
+            group(6, "Continuous"); group(370, -3); group(390, "F")
+        group(0, "ENDTAB")
+        table("STYLE", "3", 1)
+        record("STYLE", "11", "3", "AcDbTextStyleTableRecord", "Standard")
+        group(40, 0.0); group(41, 1.0); group(50, 0.0); group(71, 0)
+        group(42, 0.2); group(3, "txt"); group(4, "")
+        group(0, "ENDTAB")
+        table("VIEW", "6", 0); group(0, "ENDTAB")
+        table("UCS", "7", 0); group(0, "ENDTAB")
+        table("APPID", "9", 1)
+        record("APPID", "12", "9", "AcDbRegAppTableRecord", "ACAD")
+        group(0, "ENDTAB")
+        table("DIMSTYLE", "A", 0); group(100, "AcDbDimStyleTable"); group(71, 0)
+        group(0, "ENDTAB")
+        table("BLOCK_RECORD", "1", 2)
+        record("BLOCK_RECORD", "1F", "1", "AcDbBlockTableRecord", "*Model_Space")
+        record("BLOCK_RECORD", "58", "1", "AcDbBlockTableRecord", "*Paper_Space")
+        group(0, "ENDTAB")
+        group(0, "ENDSEC")
+        # Blocks
+        group(0, "SECTION"); group(2, "BLOCKS")
+        for (name, owner, begin, end) in [("*Model_Space", "1F", "20", "21"), \
+                ("*Paper_Space", "58", "5A", "5B")]:
+            group(0, "BLOCK"); group(5, begin); group(330, owner)
+            group(100, "AcDbEntity"); group(8, "0"); group(100, "AcDbBlockBegin")
+            group(2, name); group(70, 0)
+            group(10, 0.0); group(20, 0.0); group(30, 0.0)
+            group(3, name); group(1, "")
+            group(0, "ENDBLK"); group(5, end); group(330, owner)
+            group(100, "AcDbEntity"); group(8, "0"); group(100, "AcDbBlockEnd")
+        group(0, "ENDSEC")
+        # Entities
+        group(0, "SECTION"); group(2, "ENTITIES")
+        for ((layer, points, bulges), entityHandle) in zip(self.entities, entityHandles):
+            group(0, "LWPOLYLINE"); group(5, entityHandle); group(330, "1F")
+            group(100, "AcDbEntity"); group(8, layer)
+            group(100, "AcDbPolyline"); group(90, len(points)); group(70, 1)
+            group(43, 0.0)
+            for ([x, y], bulge) in zip(points, bulges):
+                group(10, repr(float(x))); group(20, repr(float(y)))
+                if bulge != 0:
+                    group(42, repr(float(bulge)))
+        group(0, "ENDSEC")
+        # Objects: root dictionary, groups and the plot style of the layers
+        group(0, "SECTION"); group(2, "OBJECTS")
+        group(0, "DICTIONARY"); group(5, "C"); group(330, 0)
+        group(100, "AcDbDictionary"); group(281, 1)
+        group(3, "ACAD_GROUP"); group(350, "D")
+        group(3, "ACAD_PLOTSTYLENAME"); group(350, "E")
+        group(0, "DICTIONARY"); group(5, "D"); group(330, "C")
+        group(100, "AcDbDictionary"); group(281, 1)
+        group(0, "ACDBDICTIONARYWDFLT"); group(5, "E"); group(330, "C")
+        group(100, "AcDbDictionary"); group(281, 1)
+        group(3, "Normal"); group(350, "F")
+        group(100, "AcDbDictionaryWithDefault"); group(340, "F")
+        group(0, "ACDBPLACEHOLDER"); group(5, "F"); group(330, "E")
+        group(0, "ENDSEC")
+        group(0, "EOF")
+        dxfFile = open(filename, 'w')
+        dxfFile.write("".join(dxf))
+        dxfFile.close()
+        return len(self.entities)
+
     def addLayer(self, name = "NameMe", color = [255,255,255]):
         """ Creates a new layer with the specified name and
             RGB color"""
         self.script.write("-LAYER\nMAKE\n%s\n" % name)
         self.script.write("COLOR\nTRUECOLOR\n%d,%d,%d\n\n\n" \
             % tuple(color))
+        # -LAYER MAKE also makes the layer current
+        self.layers = [l for l in self.layers if l[0] != name]
+        self.layers.append([name, list(color)])
+        self.currentLayer = name
 
     def setLayer(self, name):
         """ Changes current layer to specified by name"""
         self.script.write("-LAYER\nSET\n%s\n\n" % name)
+        self.currentLayer = name
 
     def selectAllOnLayer(self, layerName):
         """ Selects all objects on layer """
@@ -88,27 +238,23 @@ class newScript:
             (base[0] + xlen, base[1] + ylen)"""
         self.script.write("RECTANGLE\n%f,%f\n%f,%f\n" \
             % (base[0], base[1], base[0] + xlen, base[1] + ylen))
+        self.recordPolyline([[base[0], base[1]], [base[0] + xlen, base[1]],
+            [base[0] + xlen, base[1] + ylen], [base[0], base[1] + ylen]])
     def addCPWRectGap(self, width, gap, length, start, startAngleRad):
         """ Adds a rectangle with corners (base[0],base[1]) and
             (base[0] + xlen, base[1] + ylen)"""
-        self.script.write("PLINE\n")
-        self.rotateAndWritePoint(startAngleRad, start[0], \
-            start[1],start)
-        self.rotateAndWritePoint(startAngleRad, start[0], \
-            start[1] - width/2 - gap,start)
-        self.rotateAndWritePoint(startAngleRad, start[0] + length, \
-            start[1] - width/2 - gap,start)
-        self.rotateAndWritePoint(startAngleRad, start[0] + length, \
-            start[1] + width/2 + gap,start)
-        self.rotateAndWritePoint(startAngleRad, start[0], \
-            start[1] + width/2 + gap,start)
-        self.script.write("c\n")
+        self.writePolyline(startAngleRad, start, [[start[0], start[1]],
+            [start[0], start[1] - width/2 - gap],
+            [start[0] + length, start[1] - width/2 - gap],
+            [start[0] + length, start[1] + width/2 + gap],
+            [start[0], start[1] + width/2 + gap]])
         self.prevAngleRad = startAngleRad
         self.prevEnd = [start[0] + length*cos(startAngleRad), start[1] + length*sin(startAngleRad)]
 
     def addCircle(self, base, r):
         """ Adds a circle with radius r with center (base[0],base[1])"""
         self.script.write("CIRCLE\n%f,%f\n%f\n" % (base[0],base[1],r))
+        self.recordCircle(base, r)
 
     def addCircleArray(self, base, r, space = [2,2], nRepeat = [2,2]):
         """ Repeats a circle nRepeat times upwards and rightwards with
@@ -122,29 +268,22 @@ class newScript:
             self.script.write("%f\n" % space[0]) # Spacing for rows
         else:
             self.script.write("%f\n%f\n" % tuple(space))
+        # Rows go upwards by space[0], columns rightwards by space[1]
+        for row in range(nRepeat[0]):
+            for column in range(nRepeat[1]):
+                self.recordCircle([base[0] + column*space[1], \
+                    base[1] + row*space[0]], r)
     def addCPWStraightSrtEnd(self, width, gap, start, end):
         """ Adds a coplanar waveguide with the specified width and gap from start to end"""
         [disp, theta] = self.getDisplacementAndAngle(start, end)
-        self.script.write("PLINE\n")
-        self.rotateAndWritePoint(theta, start[0], \
-            start[1] - width/2,start)
-        self.rotateAndWritePoint(theta, start[0] + disp, \
-            start[1] - width/2,start)
-        self.rotateAndWritePoint(theta, start[0] + disp, \
-            start[1] - width/2 - gap,start)
-        self.rotateAndWritePoint(theta, start[0], \
-            start[1] - width/2 - gap,start)
-        self.script.write("c\n")
-        self.script.write("PLINE\n")
-        self.rotateAndWritePoint(theta, start[0], \
-            start[1] + width/2,start)
-        self.rotateAndWritePoint(theta, start[0] + disp, \
-            start[1] + width/2,start)
-        self.rotateAndWritePoint(theta, start[0] + disp, \
-            start[1] + width/2 + gap,start)
-        self.rotateAndWritePoint(theta, start[0], \
-            start[1] + width/2 + gap,start)
-        self.script.write("c\n")
+        self.writePolyline(theta, start, [[start[0], start[1] - width/2],
+            [start[0] + disp, start[1] - width/2],
+            [start[0] + disp, start[1] - width/2 - gap],
+            [start[0], start[1] - width/2 - gap]])
+        self.writePolyline(theta, start, [[start[0], start[1] + width/2],
+            [start[0] + disp, start[1] + width/2],
+            [start[0] + disp, start[1] + width/2 + gap],
+            [start[0], start[1] + width/2 + gap]])
         self.prevAngleRad = theta
         self.prevEnd = end
 
@@ -161,6 +300,30 @@ class newScript:
         self.script.write("%f,%f\n" \
             % (x_rot, y_rot))
 
+    def writePolyline(self, theta, pivot, points):
+        """ Writes a closed PLINE through the points rotated by theta
+            around the pivot and keeps it for the DXF"""
+        self.script.write("PLINE\n")
+        for [x,y] in points:
+            self.rotateAndWritePoint(theta, x, y, pivot)
+        self.script.write("c\n")
+        self.recordPolyline([self.rotatePoint(theta, x, y, pivot) \
+            for [x,y] in points])
+
+    def recordPolyline(self, points, bulges = None):
+        """ Keeps a closed polyline on the current layer for the DXF. The
+            bulge of a vertex is tan(arc angle/4) of the segment leaving
+            it, positive counterclockwise"""
+        if bulges is None:
+            bulges = [0.0]*len(points)
+        self.entities.append((self.currentLayer, \
+            [list(p) for p in points], list(bulges)))
+
+    def recordCircle(self, base, r):
+        """ Keeps a circle as a polyline of two half circles"""
+        self.recordPolyline([[base[0] - r, base[1]], [base[0] + r, base[1]]], \
+            [1.0, 1.0])
+
     def rotatePoint(self,theta,x,y,pivot):
         """ Rotates the specified point (x,y) by an angle theta
             around the pivot"""
@@ -189,27 +352,15 @@ class newScript:
         """ Adds a coplanar waveguide with a linear ramp."""
         [disp, theta] = self.getDisplacementAndAngle(start, end)
         # Right side etch pattern
-        self.script.write("PLINE\n")
-        self.rotateAndWritePoint(theta, start[0], \
-            start[1] - widthStart/2,start)
-        self.rotateAndWritePoint(theta, start[0] + disp, \
-            start[1] - widthEnd/2,start)
-        self.rotateAndWritePoint(theta, start[0] + disp, \
-            start[1] - widthEnd/2 - gapEnd,start)
-        self.rotateAndWritePoint(theta, start[0], \
-            start[1] - widthStart/2 - gapStart,start)
-        self.script.write("c\n")
+        self.writePolyline(theta, start, [[start[0], start[1] - widthStart/2],
+            [start[0] + disp, start[1] - widthEnd/2],
+            [start[0] + disp, start[1] - widthEnd/2 - gapEnd],
+            [start[0], start[1] - widthStart/2 - gapStart]])
         # Left side etch pattern
-        self.script.write("PLINE\n")
-        self.rotateAndWritePoint(theta, start[0], \
-            start[1] + widthStart/2,start)
-        self.rotateAndWritePoint(theta, start[0] + disp, \
-            start[1] + widthEnd/2,start)
-        self.rotateAndWritePoint(theta, start[0] + disp, \
-            start[1] + widthEnd/2 + gapEnd,start)
-        self.rotateAndWritePoint(theta, start[0], \
-            start[1] + widthStart/2 + gapStart,start)
-        self.script.write("c\n")
+        self.writePolyline(theta, start, [[start[0], start[1] + widthStart/2],
+            [start[0] + disp, start[1] + widthEnd/2],
+            [start[0] + disp, start[1] + widthEnd/2 + gapEnd],
+            [start[0], start[1] + widthStart/2 + gapStart]])
         self.prevAngleRad = theta # Keeping track of angles
         self.prevEnd = end # Keeping track of end points
 
@@ -242,10 +393,27 @@ class newScript:
             x = start[0] - radius*sin(angleRad)
             y = start[1] - radius + radius*cos(angleRad)
 
+        self.recordBend(center, start, radius, width, gap, angleRad, startAngleRad)
         self.prevAngleRad = startAngleRad + angleRad # Keeping track of angles
         self.prevEnd = self.rotatePoint(startAngleRad,x,y,start) # Keeping track of end points
         self.joinAll()
 
+    def recordBend(self, center, start, radius, width, gap, angleRad, startAngleRad):
+        """ Keeps the two etch patterns of a bend as polylines of an inner
+            arc, a line, an outer arc and a line, as the PEDIT join makes
+            them"""
+        turn = 1 if angleRad > 0 else -1 # Counterclockwise or clockwise
+        sweep = abs(angleRad)
+        bulge = turn*tan(sweep/4)
+        for sign in [1, -1]:
+            inner = radius + sign*width/2
+            outer = radius + sign*width/2 + sign*gap
+            # Point at radius r after turning by phi, before rotation
+            point = lambda r, phi: self.rotatePoint(startAngleRad, \
+                center[0] + r*sin(phi), center[1] - turn*r*cos(phi), start)
+            self.recordPolyline([point(inner, 0), point(inner, sweep), \
+                point(outer, sweep), point(outer, 0)], [bulge, 0.0, -bulge, 0.0])
+
     def joinAll(self):
         """ Join all into a single polyline """
         self.script.write("PEDIT\nM\nALL\n\n\nJ\n\n\n")
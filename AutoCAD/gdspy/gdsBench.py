@@ -0,0 +1,322 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS Benchmarks
+Times and memory-profiles the CPWPath primitives over a range of sizes and
+runs the dated designs end to end (GDS file written, no LayoutViewer), so
+changes to gdslib can be measured against the designs we ship
+
+Usage:
+    python gdsBench.py                          # print results
+    python gdsBench.py --save baseline.json     # store a baseline
+    python gdsBench.py --baseline baseline.json --output now.json
+
+    results = gdsBench.runBenchmarks(designs = ['2016Mar29_Resonators.py'])
+    gdsBench.benchReport(results, gdsBench.loadBaseline('baseline.json'))
+
+Times are the best of repeat runs, memory is the peak traced by tracemalloc
+in a separate run. Every design runs in its own Python process with
+os.chdir and gdspy.LayoutViewer disabled and its GDS file written to a
+scratch directory
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import argparse
+import contextlib
+import datetime
+import glob
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import gdspy
+import gdslib
+import gdsSweep
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+def benchStraight(cell, size):
+    ### size straight segments
+    cpw = gdslib.CPWPath(10, 5, layer = 6, cellName = cell)
+    cpw.start([0, 0], '+x')
+    for i in range(size):
+        cpw.straight(100)
+    cpw.end()
+
+def benchBend(cell, size):
+    ### size 90 degree bends, alternating left and right
+    cpw = gdslib.CPWPath(10, 5, layer = 6, cellName = cell)
+    cpw.start([0, 0], '+x')
+    for i in range(size):
+        cpw.bend(100, 'l' if i % 2 == 0 else 'r')
+    cpw.end()
+
+def benchOpenGap(cell, size):
+    ### size open gaps separated by straight segments
+    cpw = gdslib.CPWPath(10, 5, layer = 6, cellName = cell)
+    cpw.start([0, 0], '+x')
+    for i in range(size):
+        cpw.openGap(5)
+        cpw.straight(50)
+    cpw.end()
+
+def benchOpenGapFillet(cell, size):
+    ### size feedlines with a filleted launch pad at both ends
+    for i in range(size):
+        cpw = gdslib.CPWPath(300, 150, layer = 5, cellName = cell)
+        cpw.start([1000*i, 0], '+y')
+        cpw.openGapFillet(150, 'beg')
+        cpw.straight(250, widthEnd = 10, gapEnd = 5)
+        cpw.straight(500)
+        cpw.straight(250, widthEnd = 300, gapEnd = 150)
+        cpw.openGapFillet(150, 'end')
+        cpw.end()
+
+def benchMeander(cell, size):
+    ### One meander size um long
+    cpw = gdslib.CPWPath(10, 5, layer = 6, cellName = cell)
+    cpw.start([0, 0], '+y')
+    cpw.meander(size, 100, 500, 'll')
+    cpw.end()
+
+# Primitive benchmarks and the sizes they are run at
+primitives = {'straight': benchStraight, 'bend': benchBend,
+              'openGap': benchOpenGap, 'openGapFillet': benchOpenGapFillet,
+              'meander': benchMeander}
+defaultSizes = {'straight': [10, 100, 1000], 'bend': [10, 100, 1000],
+                'openGap': [10, 100, 1000], 'openGapFillet': [1, 10, 50],
+                'meander': [5000, 50000, 500000]}
+
+def cellCounts(cell):
+    ### Polygons and vertices of a cell
+    polygons = cell.get_polygons()
+    return len(polygons), int(sum([len(p) for p in polygons]))
+
+def measure(build, repeat = 3, memory = True):
+    ### Best time of repeat calls of build() and the peak memory traced
+    ### during one more call, every call in a fresh gdspy namespace
+    ### build returns the cell it drew
+    times = []
+    for i in range(repeat):
+        gdsSweep.freshNamespace()
+        start = time.perf_counter()
+        cell = build()
+        times.append(time.perf_counter() - start)
+    result = {'time': float(minimum.reduce(times)), 'times': times}
+    result['polygons'], result['vertices'] = cellCounts(cell)
+    if memory:
+        gdsSweep.freshNamespace()
+        tracemalloc.start()
+        build()
+        result['peakMemory'] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    gdsSweep.freshNamespace()
+    return result
+
+def benchPrimitives(names = None, sizes = None, repeat = 3, memory = True):
+    ### Results {primitive: {size: measure(...)}} of the primitive benchmarks
+    ### names - primitives to run (all if None), sizes - {name: [sizes]}
+    ### overriding defaultSizes
+    results = {}
+    for name in (names or sorted(primitives)):
+        results[name] = {}
+        for size in (sizes or {}).get(name, defaultSizes[name]):
+            def build():
+                cell = gdspy.Cell('bench')
+                primitives[name](cell, size)
+                gdslib.resolveBooleans()
+                return cell
+            results[name][str(size)] = measure(build, repeat, memory)
+    return results
+
+def findDesigns(directory = here):
+    ### Dated design scripts of the repository
+    return sorted(glob.glob(os.path.join(directory, '20*.py')))
+
+def runDesign(script, outDir, repeat = 1, memory = True):
+    ### Runs a design script in this process and measures it, the script
+    ### writes its GDS file to outDir. Returns build and write times, peak
+    ### memory, polygon and vertex counts and GDS file size
+    script = os.path.abspath(script)
+    with open(script) as f:
+        code = compile(f.read(), script, 'exec')
+    writeTimes = []
+    printGds = gdspy.gds_print
+    def timedPrint(*args, **kwargs):
+        start = time.perf_counter()
+        printGds(*args, **kwargs)
+        writeTimes.append(time.perf_counter() - start)
+    if os.path.dirname(script) not in sys.path:
+        sys.path.insert(0, os.path.dirname(script))
+    cwd = os.getcwd()
+    chdir = os.chdir
+    viewer = gdspy.LayoutViewer
+    def run():
+        namespace = {'__name__': '__bench__', '__file__': script}
+        with open(os.devnull, 'w') as devnull:
+            with contextlib.redirect_stdout(devnull):
+                exec(code, namespace)
+        return namespace
+    chdir(outDir)
+    gdspy.gds_print = timedPrint
+    gdspy.LayoutViewer = lambda *args, **kwargs: None
+    os.chdir = lambda path: None
+    try:
+        def build():
+            namespace = run()
+            return gdspy.Cell.cell_dict[namespace['deviceName']]
+        result = measure(build, repeat, memory)
+    finally:
+        os.chdir = chdir
+        gdspy.LayoutViewer = viewer
+        gdspy.gds_print = printGds
+        chdir(cwd)
+    result['writeTime'] = float(minimum.reduce(writeTimes)) \
+                                            if len(writeTimes) > 0 else 0.
+    result['buildTime'] = result['time'] - result['writeTime']
+    files = glob.glob(os.path.join(outDir, '*.gds'))
+    result['fileSize'] = int(sum([os.path.getsize(name) for name in files]))
+    return result
+
+def benchDesigns(designs = None, repeat = 1, memory = True):
+    ### Results {design: runDesign(...)} of the design scripts (findDesigns
+    ### if None), each run in its own Python process. A design that fails
+    ### or crashes gets {'error': message}
+    results = {}
+    for script in (designs or findDesigns()):
+        name = os.path.splitext(os.path.basename(script))[0]
+        outDir = tempfile.mkdtemp(prefix = 'gdsbench_')
+        command = [sys.executable, os.path.abspath(__file__), '--design',
+                    os.path.abspath(script), '--scratch', outDir,
+                    '--repeat', str(repeat)]
+        if not memory:
+            command.append('--no-memory')
+        child = subprocess.run(command, stdout = subprocess.PIPE,
+                    stderr = subprocess.PIPE, cwd = here, universal_newlines = True)
+        lines = child.stdout.strip().splitlines()
+        if child.returncode == 0 and len(lines) > 0:
+            results[name] = json.loads(lines[-1])
+        else:
+            message = child.stderr.strip().splitlines()
+            results[name] = {'error': message[-1] if len(message) > 0
+                            else 'exit code %d' % child.returncode}
+        for f in os.listdir(outDir):
+            os.remove(os.path.join(outDir, f))
+        os.rmdir(outDir)
+    return results
+
+def runBenchmarks(primitiveNames = None, sizes = None, designs = None,
+                                repeat = 3, memory = True, runDesigns = True):
+    ### Primitive and design benchmarks with the versions they ran on
+    ### Both take the best time of repeat runs
+    results = {'meta': {'date': datetime.datetime.today().isoformat(),
+                        'python': platform.python_version(),
+                        'numpy': __import__('numpy').__version__,
+                        'gdspy': gdspy.__version__,
+                        'machine': platform.platform()},
+               'primitives': benchPrimitives(primitiveNames, sizes, repeat,
+                                                                    memory),
+               'designs': {}}
+    if runDesigns:
+        results['designs'] = benchDesigns(designs, repeat, memory)
+    return results
+
+def saveResults(results, filename):
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent = 1, sort_keys = True)
+
+def loadBaseline(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+def flatResults(results):
+    ### {name: result} of every measurement, names like
+    ### 'primitive/meander/5000' and 'design/2016Mar29_Resonators'
+    flat = {}
+    for name, bySize in results.get('primitives', {}).items():
+        for size, r in bySize.items():
+            flat['primitive/%s/%s' % (name, size)] = r
+    for name, r in results.get('designs', {}).items():
+        flat['design/' + name] = r
+    return flat
+
+def compareBaseline(results, baseline, tolerance = 0.1):
+    ### Time and memory ratios (now/baseline) of the measurements found in
+    ### both, flagged as 'slower'/'faster' past tolerance
+    ### Returns {name: {'time': ratio, 'peakMemory': ratio, 'status': ...}}
+    now = flatResults(results)
+    before = flatResults(baseline)
+    comparison = {}
+    for name in sorted(set(now) & set(before)):
+        a = before[name]
+        b = now[name]
+        if 'error' in a or 'error' in b:
+            continue
+        entry = {'time': b['time']/a['time'] if a['time'] > 0 else 1.}
+        if a.get('peakMemory') and b.get('peakMemory'):
+            entry['peakMemory'] = b['peakMemory']/float(a['peakMemory'])
+        entry['vertices'] = b['vertices'] - a['vertices']
+        if entry['time'] > 1 + tolerance:
+            entry['status'] = 'slower'
+        elif entry['time'] < 1 - tolerance:
+            entry['status'] = 'faster'
+        else:
+            entry['status'] = 'same'
+        comparison[name] = entry
+    return comparison
+
+def benchReport(results, baseline = None, tolerance = 0.1, printReport = True):
+    ### Table of the results, with the ratios to baseline if given, returns
+    ### its lines
+    comparison = {} if baseline is None else compareBaseline(results,
+                                                        baseline, tolerance)
+    lines = ['%-42s %10s %10s %10s %10s %8s %8s' % ('benchmark', 'time [s]',
+                    'peak [MB]', 'polygons', 'vertices', 'time x', 'mem x')]
+    for name, r in sorted(flatResults(results).items()):
+        if 'error' in r:
+            lines.append('%-42s failed: %s' % (name, r['error']))
+            continue
+        c = comparison.get(name, {})
+        lines.append('%-42s %10.4f %10.2f %10d %10d %8s %8s' % (name,
+            r['time'], r.get('peakMemory', 0)/1e6, r['polygons'], r['vertices'],
+            '%.2f' % c['time'] if 'time' in c else '',
+            '%.2f' % c['peakMemory'] if 'peakMemory' in c else ''))
+    if printReport:
+        for line in lines:
+            print(line)
+    return lines
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'gdslib benchmarks')
+    parser.add_argument('--baseline', help = 'compare with this results file')
+    parser.add_argument('--save', help = 'store the results as a baseline')
+    parser.add_argument('--output', help = 'write the results to this file')
+    parser.add_argument('--primitives', nargs = '*', help = 'primitives to run')
+    parser.add_argument('--designs', nargs = '*', help = 'design scripts to run')
+    parser.add_argument('--no-designs', action = 'store_true')
+    parser.add_argument('--no-memory', action = 'store_true')
+    parser.add_argument('--repeat', type = int, default = 3)
+    parser.add_argument('--tolerance', type = float, default = 0.1)
+    # Used by benchDesigns for the child process of one design
+    parser.add_argument('--design', help = argparse.SUPPRESS)
+    parser.add_argument('--scratch', help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.design is not None:
+        result = runDesign(args.design, args.scratch, args.repeat,
+                                                        not args.no_memory)
+        sys.stdout.write('\n' + json.dumps(result) + '\n')
+        sys.exit(0)
+    results = runBenchmarks(args.primitives, None, args.designs, args.repeat,
+                                not args.no_memory, not args.no_designs)
+    baseline = loadBaseline(args.baseline) if args.baseline else None
+    benchReport(results, baseline, args.tolerance)
+    if args.output:
+        saveResults(results, args.output)
+    if args.save:
+        saveResults(results, args.save)
@@ -0,0 +1,118 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS CPW Design
+Conformal mapping formulas for coplanar waveguides, vectorized over NumPy
+arrays of width, gap, length and frequency, so whole sweeps of candidate
+geometries are solved in one call
+
+Usage:
+    widths = linspace(5, 45, 9)
+    line = gdsCPW.cpwLine(widths, widths/2., er = 11.9, height = 500)
+    print(line['ereff'], line['Z0'])
+    lengths = gdsCPW.resonatorLength(linspace(6E9, 6.05E9, 9), widths,
+                                                    widths/2., height = 500)
+    gdslib.resonatorArray(device, f, widths, widths/2., 50, origins,
+                                                        lengths = lengths)
+
+Widths, gaps, heights and thicknesses are in um, frequencies in Hz, lengths
+are returned in um. All arguments broadcast against each other
+With height None (infinitely thick substrate) and no kinetic inductance
+ereff = (1 + er)/2 as in the dated scripts
+
+[1] Coplanar Waveguide Circuits, Components, and Systems by Rainee Simons
+[2] R. Frunzio et al., IEEE Trans. Appl. Supercond. 15, 860 (2005)
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+
+# Speed of light (m/s), vacuum permeability and permittivity
+c0 = 299792458.
+mu0 = 4e-7*pi
+eps0 = 1/(mu0*c0**2)
+
+def ellipticK(k):
+    ### Complete elliptic integral of the first kind K(k) of modulus k,
+    ### K = pi/(2 agm(1, k')), converges to double precision in a few steps
+    a = ones(shape(k))
+    b = sqrt(1 - asarray(k, dtype = float)**2)
+    for i in range(40):
+        a, b = (a + b)/2, sqrt(a*b)
+        if (abs(a - b) <= 1e-15*a).all():
+            break
+    return pi/(2*a)
+
+def ellipticRatio(k):
+    ### K(k)/K(k') of modulus k
+    k = asarray(k, dtype = float)
+    return ellipticK(k)/ellipticK(sqrt(1 - k**2))
+
+def cpwEpsEff(width, gap, er = 11.9, height = None):
+    ### Effective permittivity of a CPW on a substrate of thickness height,
+    ### [1] Eq. 2.29 (Eq. 2.30 for height None)
+    width, gap = asarray(width, dtype = float), asarray(gap, dtype = float)
+    if height is None:
+        return (1 + er)/2.*ones(broadcast(width, gap).shape)
+    k0 = width/(width + 2*gap)
+    k1 = sinh(pi*width/(4*height))/sinh(pi*(width + 2*gap)/(4*height))
+    return 1 + (er - 1)/2.*ellipticRatio(k1)/ellipticRatio(k0)
+
+def kineticFactor(width, gap, thickness):
+    ### Geometric factor g of the kinetic inductance Lk = Ls g/width of a
+    ### thin film CPW, [2] Eq. 2
+    k = width/(width + 2*gap)
+    K = ellipticK(k)
+    return 1/(2*k**2*K**2)*(-log(thickness/(4*width))
+            - width/(width + 2*gap)*log(thickness/(4*(width + 2*gap)))
+            + 2*(width + gap)/(width + 2*gap)*log(gap/(width + gap)))
+
+def cpwLine(width, gap, er = 11.9, height = None, sheetInductance = 0,
+                                                            thickness = 0.1):
+    ### Transmission line parameters of a CPW
+    ### sheetInductance - kinetic sheet inductance of the film (H/square),
+    ### thickness - film thickness (um) used for its geometric factor
+    ### Returns a dictionary of arrays: ereff (geometric), L, Lk, C (per m),
+    ### Z0 (ohm), velocity (m/s), kineticFraction Lk/(L + Lk)
+    width, gap = asarray(width, dtype = float), asarray(gap, dtype = float)
+    ratio = ellipticRatio(width/(width + 2*gap))
+    ereff = cpwEpsEff(width, gap, er, height)
+    L = mu0/(4*ratio)
+    C = 4*eps0*ereff*ratio
+    if ndim(sheetInductance) == 0 and sheetInductance == 0:
+        Lk = zeros(shape(L))
+    else:
+        Lk = sheetInductance*kineticFactor(width, gap, thickness)/(width*1e-6)
+    return {'ereff': ereff, 'L': L, 'Lk': Lk, 'C': C,
+            'Z0': sqrt((L + Lk)/C), 'velocity': 1/sqrt((L + Lk)*C),
+            'kineticFraction': Lk/(L + Lk)}
+
+def resonatorLength(frequency, width, gap, er = 11.9, height = None,
+            sheetInductance = 0, thickness = 0.1, mode = 'quarter'):
+    ### Length (um) of lambda/4 (mode 'quarter') or lambda/2 ('half')
+    ### resonators with resonance frequency (Hz), broadcast over all arrays
+    line = cpwLine(width, gap, er, height, sheetInductance, thickness)
+    fraction = 4. if mode == 'quarter' else 2.
+    return line['velocity']/(fraction*asarray(frequency, dtype = float))*1E6
+
+def resonatorFrequency(length, width, gap, er = 11.9, height = None,
+            sheetInductance = 0, thickness = 0.1, mode = 'quarter'):
+    ### Resonance frequency (Hz) of resonators of length (um), inverse of
+    ### resonatorLength
+    line = cpwLine(width, gap, er, height, sheetInductance, thickness)
+    fraction = 4. if mode == 'quarter' else 2.
+    return line['velocity']/(fraction*asarray(length, dtype = float)*1E-6)
+
+def gapForImpedance(width, Z0 = 50., er = 11.9, height = None, iterations = 60):
+    ### Gap giving impedance Z0 for every width, found by bisection on all
+    ### widths at once (Z0 grows with the gap)
+    width = asarray(width, dtype = float)
+    lo = full(shape(width), 1e-3)*width
+    hi = full(shape(width), 1e3)*width
+    for i in range(iterations):
+        mid = sqrt(lo*hi)
+        low = cpwLine(width, mid, er, height)['Z0'] < Z0
+        lo = where(low, mid, lo)
+        hi = where(low, hi, mid)
+    return sqrt(lo*hi)
@@ -0,0 +1,201 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS Geometry Cache
+On-disk cache of the polygons of gdslib components, addressed by a hash of
+the parameters that produced them
+
+Usage:
+    gdslib.setGeometryCache(gdsCache.GeometryCache('geometry_cache'))
+    cpw = gdslib.CPWPath(10, 5, layer = 6, cellName = device, lazy = True)
+    ...
+    cpw.end()   # loads the polygons if the same route was built before
+
+Every entry is one file named after its key holding the polygons of one
+component as (kind, layer, datatype, polygons) groups in a small binary
+format: a header, the group table, the point count of every polygon and
+all points as little endian doubles. The least recently used entries are
+removed when the cache grows beyond its size limit
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import hashlib
+import json
+import os
+import struct
+
+# File signature and version of the entry format
+magic = b'GDSC'
+formatVersion = 1
+
+def canonical(obj):
+    ### Converts parameters to plain lists, strings and float reprs so equal
+    ### parameters always hash the same (ints and floats of equal value and
+    ### NumPy scalars included)
+    # The star import replaces bool with numpy's on recent NumPy versions
+    if obj is None or obj is True or obj is False or isinstance(obj, str):
+        return obj
+    if isinstance(obj, bool_):
+        return True if obj else False
+    if isinstance(obj, dict):
+        return dict((str(k), canonical(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple, ndarray)):
+        return [canonical(item) for item in obj]
+    return repr(float(obj))
+
+def hashKey(data):
+    ### Stable hash of a parameter structure (see canonical)
+    text = json.dumps(canonical(data), sort_keys = True)
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+def packGroups(groups):
+    ### Serializes a list of (kind, layer, datatype, polygons) to bytes
+    ### kind is a short string naming the part of the component
+    header = [magic, struct.pack('<II', formatVersion, len(groups))]
+    counts = []
+    points = []
+    for kind, layer, datatype, polygons in groups:
+        name = kind.encode('utf-8')
+        header.append(struct.pack('<iiIH', layer, datatype, len(polygons),
+                                                        len(name)) + name)
+        for poly in polygons:
+            poly = asarray(poly, dtype = '<f8').reshape(-1, 2)
+            counts.append(len(poly))
+            points.append(poly)
+    counts = array(counts, dtype = '<u4')
+    points = concatenate(points) if len(points) > 0 else zeros((0, 2), '<f8')
+    return b''.join(header) + counts.tobytes() + points.tobytes()
+
+def unpackGroups(data):
+    ### Inverse of packGroups, returns None for data of another format
+    if data[:4] != magic:
+        return None
+    version, nGroups = struct.unpack_from('<II', data, 4)
+    if version != formatVersion:
+        return None
+    offset = 12
+    table = []
+    for g in range(nGroups):
+        layer, datatype, nPolys, nameLength = struct.unpack_from('<iiIH',
+                                                                data, offset)
+        offset += 14
+        kind = data[offset:offset + nameLength].decode('utf-8')
+        offset += nameLength
+        table.append((kind, layer, datatype, nPolys))
+    nPolys = int(sum([t[3] for t in table]))
+    counts = frombuffer(data, dtype = '<u4', count = nPolys, offset = offset)
+    offset += 4*nPolys
+    points = frombuffer(data, dtype = '<f8', offset = offset).reshape(-1, 2)
+    ends = cumsum(counts)
+    starts = ends - counts
+    groups = []
+    p = 0
+    for kind, layer, datatype, n in table:
+        polygons = [points[starts[i]:ends[i]].copy() for i in range(p, p + n)]
+        groups.append((kind, layer, datatype, polygons))
+        p += n
+    return groups
+
+
+class GeometryCache:
+    """ Size-bounded on-disk cache of component polygons
+    directory - where the entries are stored, created if needed
+    maxBytes - total size of the entries kept, least recently used entries
+        are removed past it
+    """
+    def __init__(self, directory, maxBytes = 256*1024*1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        # Running size of the entries, set by trim and grown by put. Other
+        # processes sharing the directory are only seen at the next trim
+        self.total = 0
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.trim()
+
+    def key(self, data):
+        ### Key of a parameter structure, see hashKey
+        return hashKey(data)
+
+    def filename(self, key):
+        return os.path.join(self.directory, key + '.gdsc')
+
+    def get(self, key):
+        ### Cached groups of key (see packGroups) or None
+        name = self.filename(key)
+        try:
+            with open(name, 'rb') as f:
+                groups = unpackGroups(f.read())
+        except (IOError, OSError, struct.error, ValueError):
+            groups = None
+        if groups is None:
+            self.misses += 1
+            return None
+        # Entries are aged by their modification time
+        os.utime(name, None)
+        self.hits += 1
+        return groups
+
+    def put(self, key, groups):
+        ### Stores the groups of key, the cache is trimmed to maxBytes once
+        ### the running size goes past it
+        name = self.filename(key)
+        data = packGroups(groups)
+        temp = name + '.tmp%d' % os.getpid()
+        with open(temp, 'wb') as f:
+            f.write(data)
+        try:
+            self.total -= os.stat(name).st_size
+        except OSError:
+            pass
+        os.replace(temp, name)
+        self.total += len(data)
+        if self.total > self.maxBytes:
+            # Down to 90% so a full cache is not scanned on every put
+            self.trim(0.9*self.maxBytes)
+
+    def entries(self):
+        ### (modification time, size, filename) of all entries
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.gdsc'):
+                path = os.path.join(self.directory, name)
+                try:
+                    info = os.stat(path)
+                except OSError:
+                    continue
+                found.append((info.st_mtime, info.st_size, path))
+        return found
+
+    def size(self):
+        ### Total size of the entries in bytes
+        return int(sum([e[1] for e in self.entries()]))
+
+    def trim(self, limit = None):
+        ### Removes the least recently used entries past limit (maxBytes by
+        ### default)
+        if limit is None:
+            limit = self.maxBytes
+        found = sorted(self.entries())
+        total = sum([e[1] for e in found])
+        for mtime, size, path in found:
+            if total <= limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+        self.total = total
+
+    def clear(self):
+        ### Removes all entries
+        for mtime, size, path in self.entries():
+            os.remove(path)
+        self.total = 0
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,339 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS Design Rule Checker
+Checks gdslib cells for minimum widths, minimum spacings between layers,
+polygons outside the chip boundary and acute angles
+
+Usage:
+    violations = gdsDRC.checkDesign(device)     # defaultRules
+    violations = gdsDRC.checkDesign(device, {'minWidth': {6: 4},
+                        'minSpacing': {(6, 5): 20, (6, 6): 10},
+                        'boundary': [1, 2], 'minAngle': 30})
+    gdsDRC.drcReport(violations)
+    device.add(gdsDRC.drcMarkers(violations))
+
+Every violation is a dictionary with the rule name, the layers involved, the
+measured value, the rule value and the location of the violation
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import gdspy
+import gdslib
+
+# Rules used when checkDesign is given none, layers follow the dated scripts:
+# 1/2 boundaries, 5 feedline, 6 resonators. No angle rule, the tapers and
+# openGap fillets have acute corners by design, and no rule on the stitch
+# keep-out paths (8), which overlap the resonators on purpose
+defaultRules = {
+    'minWidth': {5: 2, 6: 2},
+    'minSpacing': {(6, 5): 2, (6, 6): 2},
+    'boundary': [1, 2],
+}
+# Polygons thinner than this (twice the area over the perimeter) are the
+# zero width pieces openGap leaves (CPWPath of width 1e-9) and are skipped
+# by all checks but the boundary
+sliverWidth = 1e-6
+# Vertices sharper than this (degrees) are tips, widths measured in the
+# narrow wedge that ends in one are left to the angle rule. The openGapFillet
+# pads leave such tips where a fillet arc meets a straight edge
+tipAngle = 30
+
+def checkDesign(cellName, rules = None, pitch = 500):
+    ### Runs all rules on a cell (or anything gdslib.polygonsOf takes with
+    ### layers, see gdslib.SpatialIndex.add)
+    ### rules - dictionary with any of
+    ###   'minWidth': {layer: width}
+    ###   'minSpacing': {(layer, otherLayer): distance}, same layer pairs skip
+    ###   touching polygons (pieces of one path), different layers also
+    ###   flag overlaps
+    ###   'boundary': boundary layers, every other polygon has to sit inside
+    ###   the bounding box of one of them
+    ###   'minAngle': smallest interior angle in degrees
+    ###   'angleLayers': layers checked for angles, all if not given
+    ###   'sliver': polygons thinner than this are skipped by the width,
+    ###   spacing and angle checks, sliverWidth if not given
+    ###   'tipAngle': width checks skip wedges ending in a vertex sharper
+    ###   than this (degrees), tipAngle if not given
+    ### pitch - bucket size of the spatial index used to find neighbours
+    ### Returns the list of violations
+    if rules is None:
+        rules = defaultRules
+    index = gdslib.SpatialIndex(pitch)
+    index.add(cellName)
+    violations = []
+    for layer, width in rules.get('minWidth', {}).items():
+        violations.extend(checkWidth(index, layer, width,
+                rules.get('sliver', sliverWidth), rules.get('tipAngle', tipAngle)))
+    for (layer, other), distance in rules.get('minSpacing', {}).items():
+        violations.extend(checkSpacing(index, layer, other, distance,
+                                        rules.get('sliver', sliverWidth)))
+    if 'boundary' in rules:
+        violations.extend(checkBoundary(index, rules['boundary']))
+    if 'minAngle' in rules:
+        violations.extend(checkAngles(index, rules['minAngle'],
+                    rules.get('angleLayers'), rules.get('sliver', sliverWidth)))
+    return violations
+
+def layerIds(index, layer):
+    ### Ids of the polygons of a SpatialIndex on layer
+    return flatnonzero(index.specs[:index.count, 0] == layer)
+
+def edgesOf(polygon):
+    ### Start and end points of the edges of a polygon, zero length edges
+    ### (repeated vertices) removed
+    polygon = asarray(polygon, dtype = float)
+    nxt = roll(polygon, -1, axis = 0)
+    keep = ((nxt - polygon)**2).sum(axis = 1) > 1e-18
+    polygon = polygon[keep]
+    return polygon, roll(polygon, -1, axis = 0)
+
+def signedArea(polygon):
+    ### Shoelace area, positive for counterclockwise polygons
+    x, y = asarray(polygon, dtype = float).T
+    return 0.5*(dot(x, roll(y, -1)) - dot(y, roll(x, -1)))
+
+def isSliver(polygon, sliver):
+    ### True for a polygon thinner than sliver: twice its area over its
+    ### perimeter, the width of a long thin strip
+    start, stop = edgesOf(polygon)
+    perimeter = sqrt(((stop - start)**2).sum(axis = 1)).sum()
+    return perimeter == 0 or 2*abs(signedArea(start))/perimeter < sliver
+
+def interiorAngles(points, nxt):
+    ### Interior angles (degrees) at the vertices of a polygon given by the
+    ### start and end points of its edges (see edgesOf)
+    prv = roll(points, 1, axis = 0)
+    a = prv - points
+    b = nxt - points
+    turn = sign(signedArea(points))*(b[:, 0]*a[:, 1] - b[:, 1]*a[:, 0])
+    angle = degrees(arctan2(abs(a[:, 0]*b[:, 1] - a[:, 1]*b[:, 0]),
+                            (a*b).sum(axis = 1)))
+    # Reflex vertices turn the other way and are never acute
+    angle[turn < 0] = 360 - angle[turn < 0]
+    return angle
+
+def isTip(start, stop, a, b, width, tips):
+    ### True when facing edges a and b are the two sides of a wedge ending
+    ### in a tip: one of the vertex chains between them holds a vertex in
+    ### tips and all its vertices are closer than width to edge a or b
+    n = len(start)
+    for chain in (arange(a + 1, b + 1), (arange(b + 1, a + n + 1) % n)):
+        if not tips[chain].any():
+            continue
+        points = start[chain]
+        near = minimum(pointSegment(points, start[[a]], stop[[a]]),
+                       pointSegment(points, start[[b]], stop[[b]]))
+        if (near < width).all():
+            return True
+    return False
+
+def violation(rule, layers, value, limit, location):
+    ### One violation record
+    return {'rule': rule, 'layers': layers, 'value': float(value),
+            'limit': float(limit), 'location': [float(location[0]),
+                                                float(location[1])]}
+
+def checkWidth(index, layer, width, sliver = sliverWidth, tipAngle = tipAngle):
+    ### Polygons of layer narrower than width: pairs of facing edges of one
+    ### polygon, with the polygon between them, closer than width
+    ### Polygons thinner than sliver are skipped (see isSliver), as are
+    ### wedges ending in a vertex sharper than tipAngle degrees (see isTip)
+    found = []
+    for i in layerIds(index, layer):
+        if isSliver(index.polygons[i], sliver):
+            continue
+        start, stop = edgesOf(index.polygons[i])
+        n = len(start)
+        if n < 3:
+            continue
+        delta = stop - start
+        # Inward normals
+        normal = sign(signedArea(start))*transpose([-delta[:, 1], delta[:, 0]])
+        mid = (start + stop)/2.
+        # Edge j lies on the inner side of edge i and runs against it
+        ahead = ((mid[newaxis, :, :] - mid[:, newaxis, :])
+                                    *normal[:, newaxis, :]).sum(axis = 2) > 0
+        facing = dot(delta, delta.T) < 0
+        near = arange(n)
+        adjacent = (abs(near[:, newaxis] - near[newaxis, :]) <= 1) \
+                        | (abs(near[:, newaxis] - near[newaxis, :]) == n - 1)
+        pairs = ahead & ahead.T & facing & ~adjacent & overlapping(start, stop)
+        a, b = nonzero(triu(pairs))
+        if len(a) == 0:
+            continue
+        # Facing edges of a simple polygon do not cross, their distance is
+        # the smallest endpoint to edge distance
+        dist = minimum(minimum(pointSegment(start[a], start[b], stop[b]),
+                               pointSegment(stop[a], start[b], stop[b])),
+                       minimum(pointSegment(start[b], start[a], stop[a]),
+                               pointSegment(stop[b], start[a], stop[a])))
+        tips = interiorAngles(start, stop) < tipAngle
+        for k in argsort(dist):
+            if dist[k] >= width - 1e-9:
+                break
+            if not isTip(start, stop, a[k], b[k], width, tips):
+                found.append(violation('minWidth', [layer], dist[k], width,
+                                            (mid[a[k]] + mid[b[k]])/2.))
+                break
+    return found
+
+def pointSegment(points, start, stop):
+    ### Distances of points [N][2] to the segments start-stop [N][2], pair
+    ### by pair
+    delta = stop - start
+    lengthSq = maximum((delta**2).sum(axis = 1), 1e-18)
+    t = clip(((points - start)*delta).sum(axis = 1)/lengthSq, 0, 1)
+    return sqrt(((start + t[:, newaxis]*delta - points)**2).sum(axis = 1))
+
+def overlapping(start, stop):
+    ### [N][N] True where the projection of edge j onto edge i overlaps edge i
+    delta = stop - start
+    lengthSq = maximum((delta**2).sum(axis = 1), 1e-18)[:, newaxis]
+    t0 = ((start[newaxis, :, :] - start[:, newaxis, :])
+                            *delta[:, newaxis, :]).sum(axis = 2)/lengthSq
+    t1 = ((stop[newaxis, :, :] - start[:, newaxis, :])
+                            *delta[:, newaxis, :]).sum(axis = 2)/lengthSq
+    return (minimum(t0, t1) < 1 - 1e-9) & (maximum(t0, t1) > 1e-9)
+
+def closestEdges(one, two, margin = None):
+    ### Distance between two polygons and the midpoint between their closest
+    ### edges, distance 0 if they overlap
+    ### margin - only measure edges within margin of the bounding box of the
+    ### other polygon, inf is returned when there are none
+    a0, a1 = edgesOf(one)
+    b0, b1 = edgesOf(two)
+    if gdslib.insidePolygon(a0[:1], two)[0]:
+        return 0., a0[0]
+    if gdslib.insidePolygon(b0[:1], one)[0]:
+        return 0., b0[0]
+    if margin is not None:
+        keepA = edgesNear(a0, a1, b0, margin)
+        keepB = edgesNear(b0, b1, a0, margin)
+        if not keepA.any() or not keepB.any():
+            return inf, (a0[0] + b0[0])/2.
+        a0, a1, b0, b1 = a0[keepA], a1[keepA], b0[keepB], b1[keepB]
+    dist = gdslib.segmentDistances(a0, a1, b0, b1)
+    i, j = unravel_index(argmin(dist), dist.shape)
+    return dist[i, j], (a0[i] + a1[i] + b0[j] + b1[j])/4.
+
+def edgesNear(start, stop, points, margin):
+    ### Edges start-stop whose bounding boxes are within margin of the
+    ### bounding box of points
+    lo = points.min(axis = 0) - margin
+    hi = points.max(axis = 0) + margin
+    return (minimum(start, stop) <= hi).all(axis = 1) \
+                & (maximum(start, stop) >= lo).all(axis = 1)
+
+def checkSpacing(index, layer, other, distance, sliver = sliverWidth):
+    ### Polygons of layer closer than distance to polygons of other
+    ### Candidates come from the spatial index, only polygons whose
+    ### bounding boxes are within distance are measured. Polygons thinner
+    ### than sliver are skipped (see isSliver)
+    found = []
+    same = layer == other
+    slivers = {}
+    def skip(k):
+        if k not in slivers:
+            slivers[k] = isSliver(index.polygons[k], sliver)
+        return slivers[k]
+    for i in layerIds(index, layer):
+        if skip(i):
+            continue
+        polygon = index.polygons[i]
+        box = [polygon.min(axis = 0), polygon.max(axis = 0)]
+        for j in index.queryBox(box, [other], margin = distance):
+            if (same and j <= i) or skip(j):
+                continue
+            dist, location = closestEdges(polygon, index.polygons[j], distance)
+            if same:
+                # Touching polygons, or polygons only a removed sliver
+                # apart, are pieces of the same path
+                bad = maximum(sliver, 1e-9) <= dist < distance - 1e-9
+            else:
+                bad = dist < distance - 1e-9 or dist < 1e-9
+            if not bad:
+                continue
+            found.append(violation('minSpacing', [layer, other], dist,
+                                                        distance, location))
+    return found
+
+def checkBoundary(index, boundaryLayers):
+    ### Polygons that are not inside the bounding box of any polygon on the
+    ### boundary layers (paths drawn along the boundary count as their box)
+    boxes = []
+    for layer in boundaryLayers:
+        ids = layerIds(index, layer)
+        if len(ids) > 0:
+            b = index.boxes[ids]
+            boxes.append(concatenate([b[:, :2].min(axis = 0),
+                                      b[:, 2:].max(axis = 0)]))
+    if len(boxes) == 0:
+        return []
+    boxes = array(boxes)
+    found = []
+    ids = arange(index.count)
+    ids = ids[~isin(index.specs[:index.count, 0], boundaryLayers)]
+    b = index.boxes[ids]
+    inside = (b[:, newaxis, 0] >= boxes[newaxis, :, 0] - 1e-9) \
+            & (b[:, newaxis, 1] >= boxes[newaxis, :, 1] - 1e-9) \
+            & (b[:, newaxis, 2] <= boxes[newaxis, :, 2] + 1e-9) \
+            & (b[:, newaxis, 3] <= boxes[newaxis, :, 3] + 1e-9)
+    for i in ids[~inside.any(axis = 1)]:
+        box = index.boxes[i]
+        # How far the polygon sticks out of the closest boundary box
+        out = maximum(maximum(boxes[:, :2] - box[:2], box[2:] - boxes[:, 2:]),
+                                                            0).max(axis = 1)
+        found.append(violation('boundary', [int(index.specs[i, 0])],
+                    out.min(), 0, (box[:2] + box[2:])/2.))
+    return found
+
+def checkAngles(index, minAngle, layers = None, sliver = sliverWidth):
+    ### Vertices with an interior angle below minAngle degrees, polygons
+    ### thinner than sliver are skipped (see isSliver)
+    found = []
+    ids = arange(index.count)
+    if layers is not None:
+        ids = ids[isin(index.specs[:index.count, 0], layers)]
+    for i in ids:
+        if isSliver(index.polygons[i], sliver):
+            continue
+        points, nxt = edgesOf(index.polygons[i])
+        if len(points) < 3:
+            continue
+        angle = interiorAngles(points, nxt)
+        for k in flatnonzero(angle < minAngle - 1e-6):
+            found.append(violation('minAngle', [int(index.specs[i, 0])],
+                                            angle[k], minAngle, points[k]))
+    return found
+
+def drcReport(violations, printReport = True):
+    ### Table of the number of violations per rule and layers and the worst
+    ### value of each. Returns the lines of the table
+    groups = {}
+    for v in violations:
+        key = (v['rule'], tuple(v['layers']))
+        groups.setdefault(key, []).append(v['value'])
+    lines = ['%-12s %-10s %8s %12s' % ('rule', 'layers', 'count', 'worst')]
+    for (rule, layers), values in sorted(groups.items()):
+        worst = max(values) if rule == 'boundary' else min(values)
+        lines.append('%-12s %-10s %8d %12.4g' % (rule,
+                    '/'.join([str(l) for l in layers]), len(values), worst))
+    if len(violations) == 0:
+        lines.append('no violations')
+    if printReport:
+        for line in lines:
+            print(line)
+    return lines
+
+def drcMarkers(violations, size = 20, layer = 63, datatype = 0):
+    ### Squares of side size around every violation, to look at them in
+    ### gdspy.LayoutViewer or a GDS viewer
+    polygons = []
+    for v in violations:
+        x, y = v['location']
+        polygons.append([(x - size/2., y - size/2.), (x + size/2., y - size/2.),
+                         (x + size/2., y + size/2.), (x - size/2., y + size/2.)])
+    return gdspy.PolygonSet(polygons, layer, datatype)
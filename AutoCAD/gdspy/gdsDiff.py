@@ -0,0 +1,169 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS Geometric Diff
+Compares the geometry of two layouts layer by layer: every polygon is
+snapped to the database grid, its winding and start vertex are normalized
+and it is hashed, so the comparison is a multiset difference of hashes and
+stays near linear on full-chip files
+
+Usage:
+    changes = gdsDiff.diffLayouts('2016Mar29_Resonators.gds',
+                                  '2016Mar29_Resonators_with_stitch.gds')
+    gdsDiff.diffReport(changes)
+    xor = gdsDiff.xorCell(changes, 'DIFF')          # changed area per layer
+
+Layouts are GDS file names (read with gdsReader, top cell flattened) or
+anything gdslib.polygonSpecs takes (gdspy cells, references, polygon sets).
+A polygon present in both layouts with the same shape and a different
+position is reported as moved. The same area fractured differently shows
+up as added and removed polygons, its XOR is empty
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import hashlib
+import gdspy
+import gdslib
+import gdsReader
+
+def canonicalPolygon(points, grid):
+    ### Polygon snapped to grid as int64 [N][2]: repeated and closing
+    ### vertices removed, counterclockwise, starting at its lowest (x, y)
+    ### vertex
+    p = around(asarray(points, dtype = float)/grid).astype(int64)
+    keep = (p != roll(p, -1, axis = 0)).any(axis = 1)
+    p = p[keep]
+    if len(p) < 3:
+        return p
+    x = p[:, 0].astype(float)
+    y = p[:, 1].astype(float)
+    if dot(x, roll(y, -1)) - dot(y, roll(x, -1)) < 0:
+        p = p[::-1]
+    start = lexsort((p[:, 1], p[:, 0]))[0]
+    return roll(p, -start, axis = 0)
+
+def polygonKeys(p):
+    ### Hash of a canonical polygon and of its shape (position removed)
+    whole = hashlib.sha1(p.tobytes()).digest()
+    shape = hashlib.sha1((p - p[0]).tobytes()).digest() if len(p) > 0 else whole
+    return whole, shape
+
+def layoutPolygons(layout, cell = None):
+    ### Polygons of a layout per (layer, datatype)
+    ### layout - GDS file name (cell, or the top cell, is flattened; cell
+    ### is required when the file has several top cells) or anything
+    ### gdslib.polygonSpecs takes
+    bySpec = {}
+    if isinstance(layout, str):
+        with gdsReader.GdsReader(layout) as gds:
+            if cell is None:
+                tops = gds.topCells()
+                if len(tops) != 1:
+                    raise ValueError('[GDSDIFF] ' + layout + ' has top cells '
+                        + ', '.join(tops) + ', give the cell to compare.')
+                cell = tops[0]
+            for spec in gds.layerSpecs():
+                polys = gds.flatPolygonList(cell, spec[0], spec[1])
+                if len(polys) > 0:
+                    bySpec[spec] = polys
+        return bySpec
+    for points, spec in gdslib.polygonSpecs(layout):
+        bySpec.setdefault(tuple(spec), []).append(asarray(points))
+    return bySpec
+
+def diffPolygons(old, new, grid = 1e-3):
+    ### Differences between two lists of polygons of one layer
+    ### Returns {'same': count, 'added': [polygons], 'removed': [polygons],
+    ### 'moved': [(old polygon, new polygon, [dx, dy])],
+    ### 'degenerate': [old count, new count]}, degenerate polygons have less
+    ### than 3 vertices once snapped to grid (e.g. the 1e-9 wide openGap
+    ### pieces) and are left out of the other counts
+    degenerate = [0, 0]
+    def table(polys, side):
+        entries = {}
+        for poly in polys:
+            p = canonicalPolygon(poly, grid)
+            if len(p) < 3:
+                degenerate[side] += 1
+                continue
+            whole, shape = polygonKeys(p)
+            entries.setdefault(whole, []).append((shape, p))
+        return entries
+    before = table(old, 0)
+    after = table(new, 1)
+    same = 0
+    removed = []
+    added = []
+    for key in set(before) | set(after):
+        a = before.get(key, [])
+        b = after.get(key, [])
+        same += minimum(len(a), len(b))
+        removed += a[len(b):]
+        added += b[len(a):]
+    # Same shape in another place is a move
+    byShape = {}
+    for shape, p in removed:
+        byShape.setdefault(shape, []).append(p)
+    moved = []
+    stillAdded = []
+    for shape, p in added:
+        candidates = byShape.get(shape)
+        if candidates:
+            # Closest removed copy of the shape
+            d = [((c[0] - p[0])**2).sum() for c in candidates]
+            q = candidates.pop(int(argmin(d)))
+            moved.append((q*grid, p*grid, list((p[0] - q[0])*grid)))
+        else:
+            stillAdded.append(p*grid)
+    stillRemoved = [p*grid for polys in byShape.values() for p in polys]
+    return {'same': int(same), 'added': stillAdded, 'removed': stillRemoved,
+                                    'moved': moved, 'degenerate': degenerate}
+
+def diffLayouts(old, new, oldCell = None, newCell = None, grid = 1e-3):
+    ### Layer by layer diff of two layouts (see layoutPolygons and
+    ### diffPolygons), grid is the snapping grid in user units (1 nm for um
+    ### layouts). Returns a dictionary indexed by (layer, datatype)
+    before = layoutPolygons(old, oldCell)
+    after = layoutPolygons(new, newCell)
+    changes = {}
+    for spec in sorted(set(before) | set(after)):
+        changes[spec] = diffPolygons(before.get(spec, []), after.get(spec, []),
+                                                                        grid)
+    return changes
+
+def diffReport(changes, printReport = True):
+    ### Table of unchanged, added, removed and moved polygons per layer and
+    ### of the degenerate polygons (old/new) left out, returns its lines
+    lines = ['%-10s %10s %10s %10s %10s %12s' % ('layer', 'same', 'added',
+                                        'removed', 'moved', 'degenerate')]
+    for spec, c in sorted(changes.items()):
+        lines.append('%-10s %10d %10d %10d %10d %12s' % ('%d/%d' % spec,
+                    c['same'], len(c['added']), len(c['removed']),
+                    len(c['moved']), '%d/%d' % tuple(c['degenerate'])))
+    if printReport:
+        for line in lines:
+            print(line)
+    return lines
+
+def xorCell(changes, cellName, layerOffset = 100):
+    ### Cell with the XOR of the changed polygons of every layer on layer
+    ### + layerOffset (same datatype). Only changed polygons go through
+    ### gdspy.boolean, so where a changed polygon overlaps an unchanged one
+    ### the overlap shows up although the area is covered in both layouts
+    cell = gdspy.Cell(cellName)
+    for (layer, datatype), c in sorted(changes.items()):
+        old = c['removed'] + [m[0] for m in c['moved']]
+        new = c['added'] + [m[1] for m in c['moved']]
+        if len(old) + len(new) == 0:
+            continue
+        spec = {'layer': layer + layerOffset, 'datatype': datatype}
+        if len(old) == 0 or len(new) == 0:
+            cell.add(gdspy.PolygonSet(old + new, **spec))
+            continue
+        result = gdspy.boolean([gdspy.PolygonSet(old), gdspy.PolygonSet(new)],
+                                    lambda a, b: (a > 0) != (b > 0), **spec)
+        if result is not None:
+            cell.add(result)
+    return cell
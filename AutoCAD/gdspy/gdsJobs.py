@@ -0,0 +1,228 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS EM Job Queue
+Runs Sonnet projects (.son) through a solver command with asyncio, at most
+limit at a time, so a batch of sweep variants keeps all solver seats busy.
+Hung runs are killed after a timeout and failed runs are retried, the logs
+every run leaves in sondata/<project>/ are added to a gdsSonLog store
+
+Usage:
+    python gdsJobs.py variants/*.son --limit 4 --timeout 3600 --retries 1
+                                                --store sonnet_store
+    python gdsJobs.py variants/*.son --solver "em -N {project}"
+    results = gdsJobs.runJobs(glob.glob('variants/*.son'), limit = 4,
+                    timeout = 3600, store = gdsSonLog.LogStore('store'))
+    results = gdsJobs.runJobs(projects, solver = gdsJobs.fakeSolver(0.1))
+
+The solver is a list of command arguments, '{project}' is replaced by the
+path of the project. The default runs Sonnet's em in batch mode.
+fakeSolver() returns a command running this file as a stand-in solver: it
+waits, then appends a run with a Lorentzian S21 response over the
+frequency band of the project to its sondata logs, in the format Sonnet
+writes them, so queues and log stores can be tried without a license
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import argparse
+import asyncio
+import datetime
+import os
+import re
+import shlex
+import sys
+import time
+import gdsSonLog
+
+# Sonnet batch analysis of one project
+emSolver = ['em', '-v', '{project}']
+
+def fakeSolver(delay = 0.1, failures = 0, resonance = None):
+    ### Command of the stand-in solver
+    ### delay - seconds every run takes
+    ### failures - number of first runs of each project that fail
+    ### resonance - resonance frequency (GHz), middle of the band if None
+    command = [sys.executable, os.path.abspath(__file__), '--fake',
+               '--delay', repr(delay), '--failures', str(failures)]
+    if resonance is not None:
+        command += ['--resonance', repr(resonance)]
+    return command + ['{project}']
+
+def logDirectory(project):
+    ### sondata/<project name>/ next to the project, where Sonnet logs go
+    name = os.path.splitext(os.path.basename(project))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(project)), 'sondata',
+                                                                        name)
+
+async def runJob(project, solver, timeout, retries):
+    ### Runs one project until it succeeds or retries are used up
+    ### Returns {'project', 'status' ('done', 'failed' or 'timeout'),
+    ### 'attempts', 'returncode', 'elapsed', 'output'}
+    command = [a.replace('{project}', project) for a in solver]
+    result = {'project': project, 'attempts': 0, 'returncode': None}
+    start = time.time()
+    for attempt in range(retries + 1):
+        result['attempts'] = attempt + 1
+        process = await asyncio.create_subprocess_exec(*command,
+                            stdout = asyncio.subprocess.PIPE,
+                            stderr = asyncio.subprocess.STDOUT,
+                            cwd = os.path.dirname(os.path.abspath(project)))
+        try:
+            output, _ = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            result['status'] = 'timeout'
+            result['output'] = 'killed after %g s' % timeout
+            continue
+        result['returncode'] = process.returncode
+        lines = output.decode('utf-8', 'replace').strip().splitlines()
+        result['output'] = '\n'.join(lines[-20:])
+        if process.returncode == 0:
+            result['status'] = 'done'
+            break
+        result['status'] = 'failed'
+    result['elapsed'] = time.time() - start
+    return result
+
+async def jobQueue(projects, solver = emSolver, limit = 1, timeout = None,
+                                retries = 0, store = None, callback = None):
+    ### Runs all projects with limit workers taking them from a queue
+    ### store - gdsSonLog.LogStore the logs of every finished job are
+    ### scanned into, callback(result) is called after every job
+    ### Returns the results of runJob in the order of projects
+    queue = asyncio.Queue()
+    for i, project in enumerate(projects):
+        queue.put_nowait((i, project))
+    results = [None]*len(projects)
+
+    async def worker():
+        while not queue.empty():
+            i, project = queue.get_nowait()
+            result = await runJob(project, solver, timeout, retries)
+            if store is not None and os.path.isdir(logDirectory(project)):
+                store.scan(logDirectory(project), save = False)
+            results[i] = result
+            if callback is not None:
+                callback(result)
+            queue.task_done()
+
+    await asyncio.gather(*[worker() for i in range(int(maximum(1, limit)))])
+    if store is not None:
+        store.save()
+    return results
+
+def runJobs(projects, solver = emSolver, limit = 1, timeout = None,
+                                retries = 0, store = None, callback = None):
+    ### Blocking jobQueue
+    return asyncio.run(jobQueue(projects, solver, limit, timeout, retries,
+                                                            store, callback))
+
+def jobReport(results, printReport = True):
+    ### One line per job, returns the lines
+    lines = ['%-32s %-8s %8s %10s' % ('project', 'status', 'attempts',
+                                                                'time [s]')]
+    for r in results:
+        lines.append('%-32s %-8s %8d %10.2f' % (os.path.basename(r['project']),
+                                    r['status'], r['attempts'], r['elapsed']))
+    if printReport:
+        for line in lines:
+            print(line)
+    return lines
+
+def fakeRun(project, delay, failures, resonance):
+    ### The stand-in solver: appends one run to the logs of project
+    ### Returns the exit code
+    directory = logDirectory(project)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    errorsLog = os.path.join(directory, 'log_errors.log')
+    runs = 0
+    if os.path.exists(errorsLog):
+        with open(errorsLog) as f:
+            runs = len([line for line in f if line.startswith('Run ')])
+    band = [5., 7.]
+    with open(project, errors = 'replace') as f:
+        for line in f:
+            match = re.match(r'\s*ABS_ENTRY\s+(\S+)\s+(\S+)', line)
+            if match:
+                band = [float(match.group(1)), float(match.group(2))]
+    started = datetime.datetime.today()
+    time.sleep(delay)
+    ended = datetime.datetime.today()
+    stamp = '%a %b %d %H:%M:%S %Y'
+    header = ['Run %d:  %s.  fake.1.0.' % (runs + 1, started.strftime(stamp)),
+              '        Em version 0.0 (%s) on %s local.' % (sys.platform,
+                                    os.uname()[1] if hasattr(os, 'uname')
+                                                            else 'localhost'),
+              '', '  Project:  %s.' % os.path.abspath(project), '']
+    failed = runs < failures
+    if failed:
+        end = 'Analysis failed due to error %s.' % ended.strftime(stamp)
+        response = ['    Post-Analysis:', '      One or more errors detected.']
+        errors = ['    Pre-Analysis:', '', '      Sonnet Error EF0000:',
+                  '      Failure requested from the stand-in solver.',
+                  '      Date: %s' % ended.strftime(stamp), '',
+                  '    Post-Analysis:',
+                  '      Errors detected: 1    Warnings detected: 0.']
+        timing = []
+    else:
+        end = 'Analysis completed %s.' % ended.strftime(stamp)
+        f0 = (band[0] + band[1])/2. if resonance is None else resonance
+        frequencies = linspace(band[0], band[1], 101)
+        # Notch of a resonator hanging off a feedline, Q = 10^4, Qc = 2 10^4
+        s21 = 1 - 0.5/(1 + 2j*1e4*(frequencies/f0 - 1))
+        s11 = 1 - abs(s21)
+        response = ['    Frequency:  %.7g GHZ' % band[0],
+                    '      De-embedded S-Parameters. 50.0 Ohm Port '
+                                                            'Terminations.',
+                    '      Magnitude/Angle. Touchstone Format. '
+                                                    '(S11 S21 S12 S22).']
+        for f, s, r in zip(frequencies, s21, s11):
+            response.append('        %.7f %.6f 0 %.6f %.3f %.6f %.3f %.6f 0'
+                    % (f, r, abs(s), angle(s, deg = True), abs(s),
+                                                    angle(s, deg = True), r))
+        errors = ['    Post-Analysis:',
+                  '      Errors detected: 0    Warnings detected: 0.']
+        seconds = (ended - started).total_seconds()
+        timing = ['    Frequency:  %.7g GHZ' % band[0],
+                  '      Matrix fill time:  %.3f seconds.' % seconds,
+                  '', '    Post-Analysis:',
+                  '      Total time for %d frequencies:  %.3f seconds.'
+                                            % (len(frequencies), seconds)]
+    for name, body in (('log_response.log', response),
+                       ('log_timing.log', timing), ('log_errors.log', errors)):
+        with open(os.path.join(directory, name), 'a') as f:
+            f.write('\n'.join(header + body + ['', end, '', '']) + '\n')
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = 'EM job queue')
+    parser.add_argument('projects', nargs = '+', help = 'Sonnet projects')
+    parser.add_argument('--limit', type = int, default = 1,
+                                            help = 'jobs running at once')
+    parser.add_argument('--timeout', type = float, help = 'seconds per run')
+    parser.add_argument('--retries', type = int, default = 0)
+    parser.add_argument('--store', help = 'gdsSonLog store directory')
+    parser.add_argument('--solver', help = "solver command line, "
+                                    "'{project}' is replaced by the project")
+    # The stand-in solver (fakeSolver)
+    parser.add_argument('--fake', action = 'store_true', help = argparse.SUPPRESS)
+    parser.add_argument('--delay', type = float, default = 0.1,
+                                                    help = argparse.SUPPRESS)
+    parser.add_argument('--failures', type = int, default = 0,
+                                                    help = argparse.SUPPRESS)
+    parser.add_argument('--resonance', type = float, help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.fake:
+        sys.exit(fakeRun(args.projects[0], args.delay, args.failures,
+                                                            args.resonance))
+    store = gdsSonLog.LogStore(args.store) if args.store else None
+    solver = shlex.split(args.solver) if args.solver else emSolver
+    results = runJobs(args.projects, solver, args.limit,
+                                        args.timeout, args.retries, store)
+    jobReport(results)
+    if store is not None:
+        store.report()
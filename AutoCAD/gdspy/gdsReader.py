@@ -0,0 +1,315 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS Memory-Mapped Reader
+Reads existing GDSII files without loading them through gdspy: the file is
+memory mapped, one pass over the record headers builds an index of cells,
+elements, layers and byte offsets, and polygons are decoded on demand into
+NumPy arrays a whole layer at a time
+
+Usage:
+    with gdsReader.GdsReader('2016Mar29_Resonators.gds') as gds:
+        print(gds.cellNames())
+        print(gds.layerStats())
+        resonators = gds.polygons(6)                  # list of [N][2] arrays
+        flat = gds.flatPolygons('2016Mar29_Resonators', 7)
+
+Coordinates are in the user units of the file (um for files written by
+gdspy with unit = 1.0e-6)
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import mmap
+import struct
+
+# Element kinds, the GDSII record types that start them
+BOUNDARY = 0x08
+PATH = 0x09
+SREF = 0x0A
+AREF = 0x0B
+TEXT = 0x0C
+BOX = 0x2D
+
+def real8ToFloat(data):
+    ### GDSII 8 byte real (excess 64, base 16) to float
+    sign = -1 if data[0] & 0x80 else 1
+    exponent = (data[0] & 0x7F) - 64
+    mantissa = int.from_bytes(data[1:8], 'big')
+    return sign*mantissa/float(2**56)*16.**exponent
+
+def byteRanges(starts, lengths):
+    ### Indices of the bytes [start, start + length) of every range
+    lengths = asarray(lengths, dtype = int64)
+    total = int(lengths.sum())
+    if total == 0:
+        return zeros(0, dtype = int64)
+    ends = cumsum(lengths)
+    idx = ones(total, dtype = int64)
+    idx[0] = starts[0]
+    # Jump from the end of each range to the start of the next
+    idx[ends[:-1]] = asarray(starts[1:], dtype = int64) \
+                    - asarray(starts[:-1], dtype = int64) - lengths[:-1] + 1
+    return cumsum(idx)
+
+
+class GdsReader:
+    """ Memory-mapped GDSII file with a lazy element index
+    filename - GDSII file to read
+    """
+    def __init__(self, filename):
+        self.filename = filename
+        self.file = open(filename, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access = mmap.ACCESS_READ)
+        self.bytes = frombuffer(self.data, dtype = uint8)
+        self.indexed = False
+        self.unit = 1.0
+        self.precision = 1.0e-9
+        self.libName = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self.bytes = None
+        if self.data is not None:
+            self.data.close()
+            self.file.close()
+        self.data = None
+
+    def index(self):
+        ### Walks the record headers once and builds the element tables:
+        ### kind, layer, datatype, cell, byte offset and point count of the
+        ### XY data of every element, plus the references of every cell
+        if self.indexed:
+            return
+        data = self.data
+        size = len(data)
+        unpack = struct.unpack_from
+        cells = []
+        kinds = []
+        layers = []
+        datatypes = []
+        owners = []
+        offsets = []
+        counts = []
+        refs = []
+        kind = None
+        layer = datatype = 0
+        xyOffset = xyCount = 0
+        ref = None
+        pos = 0
+        while pos + 4 <= size:
+            length, rtype = unpack('>HH', data, pos)
+            if length < 4:
+                break
+            record = rtype >> 8
+            if record == BOUNDARY and pos + 24 <= size:
+                # Fast path for BOUNDARY, LAYER, DATATYPE, XY, ENDEL as
+                # written by gdspy: one unpack for the whole element header
+                head = unpack('>4xHHhHHhHH', data, pos)
+                end = pos + 16 + head[6]
+                if head[1] == 0x0D02 and head[4] == 0x0E02 \
+                        and head[7] == 0x1003 and end + 4 <= size \
+                        and unpack('>HH', data, end) == (4, 0x1100):
+                    kinds.append(BOUNDARY)
+                    layers.append(head[2])
+                    datatypes.append(head[5])
+                    owners.append(len(cells) - 1)
+                    offsets.append(pos + 20)
+                    counts.append((head[6] - 4)//8)
+                    pos = end + 4
+                    continue
+            if record in (BOUNDARY, PATH, SREF, AREF, TEXT, BOX):
+                kind = record
+                layer = datatype = 0
+                xyOffset = xyCount = 0
+                if record in (SREF, AREF):
+                    ref = {'cell': len(cells) - 1, 'kind': record, 'name': None,
+                           'columns': 1, 'rows': 1, 'reflect': False,
+                           'magnification': 1.0, 'rotation': 0.0}
+            elif record == 0x0D:
+                layer = unpack('>h', data, pos + 4)[0]
+            elif record in (0x0E, 0x16, 0x2E):
+                datatype = unpack('>h', data, pos + 4)[0]
+            elif record == 0x10:
+                xyOffset = pos + 4
+                xyCount = (length - 4)//8
+            elif record == 0x11:
+                if kind in (SREF, AREF):
+                    ref['xy'] = array(unpack('>%di' % (2*xyCount), data,
+                                                    xyOffset)).reshape(-1, 2)
+                    refs.append(ref)
+                else:
+                    kinds.append(kind)
+                    layers.append(layer)
+                    datatypes.append(datatype)
+                    owners.append(len(cells) - 1)
+                    offsets.append(xyOffset)
+                    counts.append(xyCount)
+                kind = None
+            elif record == 0x12:
+                ref['name'] = data[pos + 4:pos + length].rstrip(b'\0') \
+                                                            .decode('ascii')
+            elif record in (0x13, 0x1A, 0x1B, 0x1C) and kind not in (SREF, AREF):
+                # Transforms of TEXT elements
+                pass
+            elif record == 0x13:
+                ref['columns'], ref['rows'] = unpack('>hh', data, pos + 4)
+            elif record == 0x1A:
+                ref['reflect'] = unpack('>H', data, pos + 4)[0] & 0x8000 != 0
+            elif record == 0x1B:
+                ref['magnification'] = real8ToFloat(data[pos + 4:pos + 12])
+            elif record == 0x1C:
+                ref['rotation'] = real8ToFloat(data[pos + 4:pos + 12])
+            elif record == 0x06:
+                cells.append(data[pos + 4:pos + length].rstrip(b'\0')
+                                                            .decode('ascii'))
+            elif record == 0x02:
+                self.libName = data[pos + 4:pos + length].rstrip(b'\0') \
+                                                            .decode('ascii')
+            elif record == 0x03:
+                self.unit = real8ToFloat(data[pos + 4:pos + 12])
+                self.precision = real8ToFloat(data[pos + 12:pos + 20])
+            elif record == 0x04:
+                break
+            pos += length
+        self.cells = cells
+        self.cellIds = dict((name, i) for i, name in enumerate(cells))
+        self.kinds = array(kinds, dtype = int16)
+        self.layers = array(layers, dtype = int16)
+        self.datatypes = array(datatypes, dtype = int16)
+        self.owners = array(owners, dtype = int32)
+        self.offsets = array(offsets, dtype = int64)
+        self.counts = array(counts, dtype = int64)
+        self.refs = refs
+        self.indexed = True
+
+    def cellNames(self):
+        ### Names of the cells in the file
+        self.index()
+        return list(self.cells)
+
+    def topCells(self):
+        ### Cells no other cell refers to
+        self.index()
+        referred = set([ref['name'] for ref in self.refs])
+        return [name for name in self.cells if name not in referred]
+
+    def layerSpecs(self):
+        ### Sorted list of the (layer, datatype) of the polygons in the file
+        self.index()
+        shapes = (self.kinds == BOUNDARY) | (self.kinds == BOX)
+        specs = set(zip(self.layers[shapes].tolist(),
+                        self.datatypes[shapes].tolist()))
+        return sorted(specs)
+
+    def select(self, layer = None, datatype = None, cell = None):
+        ### Ids of the BOUNDARY/BOX elements on layer/datatype (all if None)
+        ### in cell (a name, all cells if None)
+        self.index()
+        keep = (self.kinds == BOUNDARY) | (self.kinds == BOX)
+        if layer is not None:
+            keep &= self.layers == layer
+        if datatype is not None:
+            keep &= self.datatypes == datatype
+        if cell is not None:
+            keep &= self.owners == self.cellIds[cell]
+        return flatnonzero(keep)
+
+    def layerStats(self, cell = None):
+        ### Polygon and vertex counts per (layer, datatype) straight from the
+        ### index, nothing is decoded
+        ids = self.select(cell = cell)
+        stats = {}
+        for spec in set(zip(self.layers[ids].tolist(),
+                            self.datatypes[ids].tolist())):
+            mine = ids[(self.layers[ids] == spec[0])
+                            & (self.datatypes[ids] == spec[1])]
+            stats[spec] = {'polygons': len(mine),
+                           'vertices': int((self.counts[mine] - 1).sum())}
+        return stats
+
+    def decode(self, ids):
+        ### Points of elements ids in one vectorized gather
+        ### Returns (points [M][2] in user units, start index of every
+        ### polygon in points [len(ids) + 1]). The closing vertex GDSII
+        ### repeats is dropped
+        ids = asarray(ids, dtype = int64)
+        counts = self.counts[ids] - 1
+        idx = byteRanges(self.offsets[ids], 8*counts)
+        raw = self.bytes[idx].view('>i4').reshape(-1, 2)
+        points = raw.astype(float)*self.unit
+        starts = concatenate([[0], cumsum(counts)]).astype(int64)
+        return points, starts
+
+    def polygons(self, layer = None, datatype = None, cell = None):
+        ### List of [N][2] arrays of the polygons on layer/datatype in cell
+        ### (not flattened, see flatPolygons)
+        points, starts = self.decode(self.select(layer, datatype, cell))
+        return [points[starts[i]:starts[i + 1]] for i in range(len(starts) - 1)]
+
+    def boundingBox(self, layer = None, datatype = None, cell = None):
+        ### [[xmin, ymin], [xmax, ymax]] of the polygons selected, None if
+        ### there are none
+        points, starts = self.decode(self.select(layer, datatype, cell))
+        if len(points) == 0:
+            return None
+        return [list(points.min(axis = 0)), list(points.max(axis = 0))]
+
+    def placements(self, ref):
+        ### Affine transforms (2x2 matrix, offset) of every instance of a
+        ### reference, GDSII order: reflect about x, magnify, rotate, move
+        theta = radians(ref['rotation'])
+        m = ref['magnification']
+        matrix = m*array([[cos(theta), -sin(theta)], [sin(theta), cos(theta)]])
+        if ref['reflect']:
+            matrix = matrix.dot(array([[1., 0.], [0., -1.]]))
+        xy = ref['xy']*self.unit
+        origin = xy[0]
+        if ref['kind'] == SREF:
+            return matrix, origin[newaxis, :]
+        cols, rows = ref['columns'], ref['rows']
+        colStep = (xy[1] - origin)/float(cols)
+        rowStep = (xy[2] - origin)/float(rows)
+        c, r = meshgrid(arange(cols), arange(rows))
+        offsets = origin + c.ravel()[:, newaxis]*colStep \
+                         + r.ravel()[:, newaxis]*rowStep
+        return matrix, offsets
+
+    def flatPolygons(self, cell, layer = None, datatype = None,
+                                                        maxDepth = None):
+        ### Polygons of cell with the references below it resolved, as one
+        ### (points, starts) pair (see decode), instances of a referenced
+        ### cell are placed with a single broadcast per reference
+        self.index()
+        points, starts = self.decode(self.select(layer, datatype, cell))
+        pieces = [points]
+        counts = [diff(starts)]
+        if maxDepth is None or maxDepth > 0:
+            depth = None if maxDepth is None else maxDepth - 1
+            cellId = self.cellIds[cell]
+            for ref in self.refs:
+                if ref['cell'] != cellId or ref['name'] not in self.cellIds:
+                    continue
+                sub, subStarts = self.flatPolygons(ref['name'], layer,
+                                                            datatype, depth)
+                if len(sub) == 0:
+                    continue
+                matrix, offsets = self.placements(ref)
+                moved = sub.dot(matrix.T)
+                placed = moved[newaxis, :, :] + offsets[:, newaxis, :]
+                pieces.append(placed.reshape(-1, 2))
+                counts.append(tile(diff(subStarts), len(offsets)))
+        counts = concatenate(counts)
+        return concatenate(pieces), concatenate([[0], cumsum(counts)]) \
+                                                            .astype(int64)
+
+    def flatPolygonList(self, cell, layer = None, datatype = None):
+        ### flatPolygons as a list of [N][2] arrays
+        points, starts = self.flatPolygons(cell, layer, datatype)
+        return [points[starts[i]:starts[i + 1]] for i in range(len(starts) - 1)]
@@ -0,0 +1,181 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS Headless Renderer
+Rasterizes a cell to a PNG file without a display, as a batch replacement
+for the gdspy.LayoutViewer() previews at the end of the design scripts
+
+Usage:
+    gdsRender.renderCell(device, deviceName + '.png')          # 2000 px wide
+    gdsRender.renderCell(device, 'chip.png', pixelSize = 1,    # 1 um pixels
+                         layers = [5, 6, 7], colors = {7: '#808080'})
+
+Polygons are filled with a vectorized even-odd scanline fill: the crossings
+of every edge with the pixel rows it spans are computed in one pass, sorted
+per polygon and row, and paired into spans. The image is rendered and
+written in bands of tileRows rows, so memory is set by the image width and
+not by its height. Every layer is blended on the background with its
+colour and its outline is drawn solid
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import struct
+import zlib
+import gdspy
+import gdslib
+
+# Layer colours, layer n gets palette[n % len(palette)] unless given
+palette = ['#ff6ef0', '#6ef0ff', '#f0ff6e', '#ffbf6e', '#6eff8c', '#8c6eff',
+           '#ff6e6e', '#6ebfff', '#c0c0c0', '#ff9ed0', '#9eff9e', '#d09eff']
+# Background colour of the LayoutViewer
+background = '#202020'
+
+def rgb(color):
+    ### '#rrggbb' or (r, g, b) with 0-255 components to a float array
+    if isinstance(color, str):
+        color = color.lstrip('#')
+        color = [int(color[i:i + 2], 16) for i in (0, 2, 4)]
+    return array(color, dtype = float32)
+
+def layerEdges(polygons):
+    ### Edges of a list of polygons as arrays x0, y0, x1, y1 and the index
+    ### of their polygon. Horizontal edges never cross a scanline and are
+    ### dropped
+    counts = array([len(p) for p in polygons], dtype = int64)
+    if len(counts) == 0:
+        return [zeros(0)]*4 + [zeros(0, dtype = int64)]
+    points = concatenate([asarray(p, dtype = float) for p in polygons])
+    owner = repeat(arange(len(polygons)), counts)
+    # Next vertex of each vertex, wrapping around within its polygon
+    nxt = arange(len(points)) + 1
+    ends = cumsum(counts)
+    nxt[ends - 1] = ends - counts
+    x0, y0 = points[:, 0], points[:, 1]
+    x1, y1 = points[nxt, 0], points[nxt, 1]
+    keep = y0 != y1
+    return x0[keep], y0[keep], x1[keep], y1[keep], owner[keep]
+
+def coverage(edges, top, left, pixelSize, row0, rows, width):
+    ### Boolean [rows][width] of the pixels whose center is inside one of
+    ### the polygons (even-odd per polygon, union over polygons), rows
+    ### counted from the top of the image, row0 first
+    x0, y0, x1, y1, owner = edges
+    # Scanline coordinate u: pixel row r has its center at u = r
+    u0 = (top - y0)/pixelSize - 0.5
+    u1 = (top - y1)/pixelSize - 0.5
+    first = maximum(ceil(minimum(u0, u1)), row0).astype(int64)
+    stop = minimum(ceil(maximum(u0, u1)), row0 + rows).astype(int64)
+    n = maximum(stop - first, 0)
+    mask = zeros((rows, width), dtype = bool)
+    total = int(n.sum())
+    if total == 0:
+        return mask
+    # One crossing per (edge, row)
+    e = repeat(arange(len(n)), n)
+    r = first[e] + arange(total) - repeat(cumsum(n) - n, n)
+    t = (r - u0[e])/(u1[e] - u0[e])
+    v = (x0[e] + t*(x1[e] - x0[e]) - left)/pixelSize - 0.5
+    order = lexsort((v, r, owner[e]))
+    r = r[order][0::2] - row0
+    start = clip(ceil(v[order][0::2]), 0, width).astype(int64)
+    end = clip(ceil(v[order][1::2]), 0, width).astype(int64)
+    size = rows*(width + 1)
+    counts = bincount(r*(width + 1) + start, minlength = size) \
+                - bincount(r*(width + 1) + end, minlength = size)
+    return cumsum(counts.reshape(rows, width + 1), axis = 1)[:, :width] > 0
+
+def outline(mask):
+    ### Pixels of mask with a neighbour outside of it, mask has one halo row
+    ### above and below
+    inner = mask[1:-1].copy()
+    inner[:, 1:-1] &= mask[:-2, 1:-1] & mask[2:, 1:-1] \
+                    & mask[1:-1, :-2] & mask[1:-1, 2:]
+    return mask[1:-1] & ~inner
+
+def pngChunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data \
+                + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+def colorTable(colors, alpha, outlines = True):
+    ### RGB colour of every pixel code of renderCell: bit k set if layer k
+    ### covers the pixel, bits above the layers hold the last layer whose
+    ### outline is on the pixel + 1 (0 for none). Layers are blended in order
+    ### on the background, an outline resets the pixel to its layer colour
+    n = len(colors)
+    codes = arange((n + 1 if outlines else 1) << n)
+    top = codes >> n
+    colors = array(colors, dtype = float32).reshape(-1, 3)
+    table = empty((len(codes), 3), dtype = float32)
+    table[:] = rgb(background)
+    if outlines and n > 0:
+        table[top > 0] = colors[top[top > 0] - 1]
+    for k in range(n):
+        blend = ((codes >> k) & 1 == 1) & (k >= top)
+        table[blend] = table[blend]*(1 - alpha) + colors[k]*alpha
+    return around(table).astype(uint8)
+
+def renderCell(cell, filename, width = 2000, pixelSize = None, box = None,
+                layers = None, colors = None, alpha = 0.35, outlines = True,
+                                                            tileRows = 256):
+    ### Writes a PNG of cell (anything gdslib.polygonSpecs takes)
+    ### width - image width in pixels, or pixelSize - pixel size in user units
+    ### box - [[xmin, ymin], [xmax, ymax]] to render, the bounding box of
+    ### the cell if None
+    ### layers - layers to draw, in drawing order (all, by number, if None)
+    ### colors - {layer: colour} overriding palette
+    ### alpha - opacity of the layer fills, outlines are opaque
+    ### Returns the image size (width, height)
+    byLayer = {}
+    for points, spec in gdslib.polygonSpecs(cell):
+        if layers is None or spec[0] in layers:
+            byLayer.setdefault(spec[0], []).append(points)
+    if box is None:
+        allPoints = concatenate([concatenate(p) for p in byLayer.values()])
+        box = [allPoints.min(axis = 0), allPoints.max(axis = 0)]
+    (xmin, ymin), (xmax, ymax) = box
+    if pixelSize is None:
+        pixelSize = (xmax - xmin)/float(width)
+    width = int(ceil((xmax - xmin)/pixelSize))
+    height = int(ceil((ymax - ymin)/pixelSize))
+    order = list(layers) if layers is not None else sorted(byLayer)
+    edges = [(layerEdges(byLayer[l]), rgb((colors or {}).get(l,
+                    palette[l % len(palette)]))) for l in order if l in byLayer]
+    if len(edges) > 16:
+        raise ValueError('[GDSRENDER] At most 16 layers can be drawn at once.')
+    # Row range of every edge, to pick the edges of a band quickly
+    spans = []
+    for e, color in edges:
+        u0 = (ymax - e[1])/pixelSize - 0.5
+        u1 = (ymax - e[3])/pixelSize - 0.5
+        spans.append((minimum(u0, u1), maximum(u0, u1)))
+    lut = colorTable([color for e, color in edges], alpha, outlines)
+    with open(filename, 'wb') as f:
+        f.write(b'\x89PNG\r\n\x1a\n')
+        f.write(pngChunk(b'IHDR', struct.pack('>IIBBBBB', width, height,
+                                                            8, 2, 0, 0, 0)))
+        compressor = zlib.compressobj(6)
+        for row0 in range(0, height, tileRows):
+            rows = minimum(tileRows, height - row0)
+            # Per pixel: fill bit of every layer, plus the last outlined
+            # layer + 1 above them (colorTable)
+            code = zeros((rows, width), dtype = int32)
+            for k, ((e, color), (lo, hi)) in enumerate(zip(edges, spans)):
+                near = (hi >= row0 - 1) & (lo < row0 + rows + 1)
+                band = [a[near] for a in e]
+                # One halo row on each side for the outlines
+                mask = coverage(band, ymax, xmin, pixelSize, row0 - 1,
+                                                            rows + 2, width)
+                code |= mask[1:-1].astype(int32) << k
+                if outlines:
+                    code[outline(mask)] = (k + 1) << len(edges)
+            image = lut[code]
+            raw = zeros((rows, 1 + 3*width), dtype = uint8)
+            raw[:, 1:] = image.reshape(rows, -1)
+            data = compressor.compress(raw.tobytes())
+            if len(data) > 0:
+                f.write(pngChunk(b'IDAT', data))
+        f.write(pngChunk(b'IDAT', compressor.flush()))
+        f.write(pngChunk(b'IEND', b''))
+    return width, height
@@ -0,0 +1,481 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS Sonnet Log Store
+Parses the logs Sonnet writes to sondata/<project>/ (log_response.log,
+log_timing.log, log_errors.log and log_composite.log, the subsection runs
+included) and Touchstone output files into columnar tables keyed by
+project, so the runs of a sweep can be compared without opening files
+
+Usage:
+    store = gdsSonLog.LogStore('sonnet_store')
+    store.scan('..')                        # new and changed files only
+    runs = store.table('runs')              # {column: array}
+    print(runs['project'][runs['totalTime'] > 600])
+    store.saveCSV('sonnet_tables')          # runs.csv, messages.csv, ...
+
+Tables:
+    runs - one row per run of a project: start, end and status, Em version
+           and host, number of frequencies, subsections, memory, errors and
+           warnings and the solver times summed over frequencies (s)
+    messages - Sonnet errors and warnings of every run, code and text
+    responses - one row per frequency and parameter of the network data in
+                log_response.log and in Touchstone files (run 0)
+
+Logs are read line by line, one run at a time. The store keeps the
+modification time and size of every file it parsed with the records it
+got from it in <directory>/index.json, and only reads files again when
+they changed
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import csv
+import datetime
+import json
+import os
+import re
+
+# Logs of a project, log_composite.log holds all of them and is only read
+# when they are missing
+logNames = ('log_response.log', 'log_timing.log', 'log_errors.log')
+compositeName = 'log_composite.log'
+# Columns of the tables, in order. Timing columns found in the logs that
+# are not listed here are appended to the runs table
+runColumns = ['project', 'run', 'started', 'ended', 'status', 'signal',
+              'version', 'platform', 'host', 'projectFile', 'frequencies',
+              'subsectioningFrequency', 'eeff', 'subsections', 'cmCells',
+              'memory', 'threads', 'errors', 'warnings', 'wallTime',
+              'totalTime', 'subsectioning', 'waveguideMode',
+              'fourierTransform', 'coupling', 'loss', 'matrixFill',
+              'matrixSolve', 'deembedding', 'directory']
+messageColumns = ['project', 'run', 'started', 'kind', 'code', 'frequency',
+                  'text', 'directory']
+responseColumns = ['project', 'run', 'started', 'source', 'frequency',
+                   'parameter', 'format', 'a', 'b', 'directory']
+# Frequency units to GHz
+frequencyUnits = {'HZ': 1e-9, 'KHZ': 1e-6, 'MHZ': 1e-3, 'GHZ': 1., 'THZ': 1e3}
+touchstoneFormats = {'MA': 'Magnitude/Angle', 'RI': 'Real/Imaginary',
+                     'DB': 'DB/Angle'}
+
+number = r'[-+]?\d+(?:\.\d*)?(?:[eE][-+]?\d+)?'
+dateText = r'\w{3} \w{3} +\d+ \d+:\d+:\d+ \d{4}'
+runLine = re.compile(r'^Run (\d+):\s+(' + dateText + ')')
+versionLine = re.compile(r'Em version (\S+) \((.*?)\) on (\S+)')
+projectLine = re.compile(r'^\s*Project:\s+(.*?)\.?\s*$')
+endLine = re.compile(r'^Analysis (\w+)\D*?(' + dateText + r')'
+                                                r'(?: with signal (\d+))?')
+frequencyLine = re.compile(r'^\s*Frequency:\s+(' + number + r')\s*(\w+)')
+subsectioningLine = re.compile(r'Subsectioning at (' + number + r')\s*(\w+) '
+                                        r'with Eeff of (' + number + ')')
+requiresLine = re.compile(r'Circuit requires (\d+) subsections '
+                                        r'\((\d+) CM Cells\) and (\d+) MB')
+threadsLine = re.compile(r'using (\d+) thread')
+timeLine = re.compile(r'^\s*([A-Z][A-Za-z -]*?) time:\s+(\S.*?)\.?\s*$')
+deembeddingLine = re.compile(r'^\s*De-embedding time.*:\s*$')
+subtotalLine = re.compile(r'^\s*Total:\s+(\S.*?)\.?\s*$')
+totalLine = re.compile(r'Total time for (\d+) frequenc\w*:\s+(\S.*?)\.?\s*$')
+messageLine = re.compile(r'Sonnet (Error|Warning) (\w+):')
+countLine = re.compile(r'Errors detected: (\d+)\s+Warnings detected: (\d+)')
+formatLine = re.compile(r'(Magnitude/Angle|Real/Imaginary|DB/Angle)\..*'
+                                            r'\(([A-Z]\d+(?: [A-Z]\d+)*)\)')
+durationPart = re.compile(r'([.\d]+)\s*(hour|hr|h|minute|min|m|second|sec|s)')
+
+def parseDate(text):
+    ### Sonnet log date to 'YYYY-MM-DD HH:MM:SS'
+    text = ' '.join(text.split())
+    return datetime.datetime.strptime(text, '%a %b %d %H:%M:%S %Y') \
+                                                .strftime('%Y-%m-%d %H:%M:%S')
+
+def parseDuration(text):
+    ### Seconds of a Sonnet duration ('23 seconds', '1 minute 5 seconds',
+    ### '1:02:03'), None if there is no number in text
+    if re.match(r'^\s*\d+(:\d+)+', text):
+        seconds = 0.
+        for part in text.split()[0].split(':'):
+            seconds = seconds*60 + float(part)
+        return seconds
+    scale = {'h': 3600., 'm': 60., 's': 1.}
+    parts = durationPart.findall(text)
+    if len(parts) == 0:
+        return None
+    return float(sum([float(value)*scale[unit[0]] for value, unit in parts]))
+
+def camelCase(name):
+    ### 'Matrix fill' to 'matrixFill'
+    words = re.split(r'[\s-]+', name.strip())
+    return words[0].lower() + ''.join([w.capitalize() for w in words[1:]])
+
+def splitRuns(lines):
+    ### Yields (run number, start date, lines of the run) of a log, reading
+    ### lines one run at a time
+    header = None
+    body = []
+    for line in lines:
+        match = runLine.match(line)
+        if match:
+            if header is not None:
+                yield header[0], header[1], body
+            header = (int(match.group(1)), parseDate(match.group(2)))
+            body = []
+        elif header is not None:
+            body.append(line.rstrip('\r\n'))
+    if header is not None:
+        yield header[0], header[1], body
+
+def parseRun(lines):
+    ### Run fields, messages and responses of the lines of one run
+    ### Fields found in none of the lines are left out, so the records of
+    ### the logs of one run can be merged
+    run = {}
+    messages = []
+    responses = []
+    times = {}
+    frequency = None
+    frequencies = 0
+    message = None
+    deembedding = False
+    names = None
+    rowFormat = None
+    row = []
+    for line in lines:
+        if message is not None:
+            # Message text runs up to its date or a blank line
+            if line.strip() == '' or line.strip().startswith('Date:'):
+                message['text'] = ' '.join(message['text'])
+                messages.append(message)
+                message = None
+            else:
+                message['text'].append(line.strip())
+            continue
+        if names is not None:
+            tokens = line.split()
+            try:
+                values = [float(t) for t in tokens]
+            except ValueError:
+                values = None
+            if values is not None and len(values) > 0:
+                row += values
+                if len(row) >= 1 + 2*len(names):
+                    for k, name in enumerate(names):
+                        responses.append({'source': 'log',
+                                    'frequency': row[0], 'parameter': name,
+                                    'format': rowFormat, 'a': row[1 + 2*k],
+                                    'b': row[2 + 2*k]})
+                    row = []
+                continue
+            if len(tokens) > 0 and tokens[0].startswith('!'):
+                continue
+            names = None
+            row = []
+        match = versionLine.search(line)
+        if match:
+            run['version'], run['platform'], run['host'] = match.groups()
+            continue
+        match = projectLine.match(line)
+        if match and 'projectFile' not in run:
+            run['projectFile'] = match.group(1)
+            continue
+        match = endLine.match(line)
+        if match:
+            run['status'] = match.group(1)
+            run['ended'] = parseDate(match.group(2))
+            if match.group(3) is not None:
+                run['signal'] = int(match.group(3))
+            continue
+        match = frequencyLine.match(line)
+        if match:
+            frequency = float(match.group(1)) \
+                        *frequencyUnits.get(match.group(2).upper(), 1.)
+            frequencies += 1
+            continue
+        match = subsectioningLine.search(line)
+        if match:
+            run['subsectioningFrequency'] = float(match.group(1)) \
+                        *frequencyUnits.get(match.group(2).upper(), 1.)
+            run['eeff'] = float(match.group(3))
+            continue
+        match = requiresLine.search(line)
+        if match:
+            run['subsections'] = maximum(run.get('subsections', 0),
+                                                        int(match.group(1)))
+            run['cmCells'] = maximum(run.get('cmCells', 0), int(match.group(2)))
+            run['memory'] = maximum(run.get('memory', 0), int(match.group(3)))
+            continue
+        match = threadsLine.search(line)
+        if match:
+            run['threads'] = int(match.group(1))
+            continue
+        if deembeddingLine.match(line):
+            deembedding = True
+            continue
+        match = subtotalLine.match(line)
+        if match and deembedding:
+            seconds = parseDuration(match.group(1))
+            if seconds is not None:
+                times['deembedding'] = times.get('deembedding', 0) + seconds
+            deembedding = False
+            continue
+        match = totalLine.search(line)
+        if match:
+            run['frequencies'] = int(match.group(1))
+            run['totalTime'] = parseDuration(match.group(2))
+            continue
+        match = timeLine.match(line)
+        if match:
+            seconds = parseDuration(match.group(2))
+            if seconds is not None:
+                key = camelCase(match.group(1))
+                times[key] = times.get(key, 0) + seconds
+            continue
+        match = messageLine.search(line)
+        if match:
+            message = {'kind': match.group(1).lower(), 'code': match.group(2),
+                       'frequency': frequency, 'text': []}
+            continue
+        match = countLine.search(line)
+        if match:
+            run['errors'] = maximum(run.get('errors', 0), int(match.group(1)))
+            run['warnings'] = maximum(run.get('warnings', 0),
+                                                        int(match.group(2)))
+            continue
+        match = formatLine.search(line)
+        if match:
+            rowFormat = match.group(1)
+            names = match.group(2).split()
+            row = []
+    if message is not None:
+        message['text'] = ' '.join(message['text'])
+        messages.append(message)
+    run.update(times)
+    if frequencies > 0 and 'frequencies' not in run:
+        run['frequencies'] = frequencies
+    # NumPy scalars of maximum to plain numbers for the index
+    for key, value in run.items():
+        if isinstance(value, generic):
+            run[key] = value.item()
+    return run, messages, responses
+
+def parseLog(filename):
+    ### Records of a Sonnet log: {'runs': [...], 'messages': [...],
+    ### 'responses': [...]}, every record has the run number and start date
+    records = {'runs': [], 'messages': [], 'responses': []}
+    with open(filename, 'r', errors = 'replace') as f:
+        for number, started, lines in splitRuns(f):
+            run, messages, responses = parseRun(lines)
+            key = {'run': number, 'started': started}
+            run.update(key)
+            records['runs'].append(run)
+            for record in messages + responses:
+                record.update(key)
+            records['messages'] += messages
+            records['responses'] += responses
+    return records
+
+def parseTouchstone(filename):
+    ### Records of a Touchstone file (.s2p, ...) as responses of run 0
+    ports = int(re.search(r'\.[sSyYzZ](\d+)[pP]$', filename).group(1))
+    unit, kind, fmt = 'GHZ', 'S', 'MA'
+    values = []
+    with open(filename, 'r', errors = 'replace') as f:
+        for line in f:
+            line = line.split('!')[0].strip()
+            if line.startswith('#'):
+                for token in line[1:].upper().split():
+                    if token in frequencyUnits:
+                        unit = token
+                    elif token in ('S', 'Y', 'Z'):
+                        kind = token
+                    elif token in touchstoneFormats:
+                        fmt = token
+            elif line != '':
+                values += [float(t) for t in line.split()]
+    if ports == 2:
+        # Two ports are written column first
+        names = [kind + '11', kind + '21', kind + '12', kind + '22']
+    else:
+        names = [kind + '%d%d' % (i + 1, j + 1) for i in range(ports)
+                                                        for j in range(ports)]
+    width = 1 + 2*len(names)
+    values = array(values[:len(values)//width*width]).reshape(-1, width)
+    responses = []
+    for row in values:
+        for k, name in enumerate(names):
+            responses.append({'run': 0, 'started': '', 'source': 'touchstone',
+                    'frequency': row[0]*frequencyUnits[unit], 'parameter': name,
+                    'format': touchstoneFormats[fmt], 'a': row[1 + 2*k],
+                    'b': row[2 + 2*k]})
+    return {'runs': [], 'messages': [], 'responses': responses}
+
+def columnArray(values):
+    ### Column of a table: int if no number is missing, float with nan for
+    ### missing numbers, str otherwise
+    numbers = [v for v in values if v is not None]
+    if len(numbers) > 0 and all([isinstance(v, (int, float)) and
+                            not isinstance(v, type(True)) for v in numbers]):
+        if len(numbers) == len(values) and all([isinstance(v, int)
+                                                        for v in numbers]):
+            return array(values, dtype = int64)
+        return array([nan if v is None else v for v in values], dtype = float)
+    return array(['' if v is None else str(v) for v in values], dtype = str)
+
+class LogStore:
+    """ Parsed Sonnet logs and Touchstone files under one or more roots
+    directory - where the index (and the tables saved by saveCSV, by
+    default) are kept, created if missing
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        self.indexFile = os.path.join(directory, 'index.json')
+        self.index = {}
+        if os.path.exists(self.indexFile):
+            with open(self.indexFile) as f:
+                self.index = json.load(f)
+
+    def save(self):
+        with open(self.indexFile, 'w') as f:
+            json.dump(self.index, f)
+
+    def sources(self, root):
+        ### [(file, project, kind)] of the logs and Touchstone files under
+        ### root, the project of a log is the name of its directory
+        found = []
+        for directory, dirs, files in os.walk(root):
+            dirs.sort()
+            project = os.path.basename(os.path.normpath(directory))
+            logs = [n for n in logNames if n in files]
+            if len(logs) == 0 and compositeName in files:
+                logs = [compositeName]
+            for name in logs:
+                found.append((os.path.join(directory, name), project, 'log'))
+            for name in sorted(files):
+                if re.search(r'\.[sSyYzZ]\d+[pP]$', name):
+                    found.append((os.path.join(directory, name),
+                                        os.path.splitext(name)[0], 'touchstone'))
+        return found
+
+    def scan(self, root, save = True):
+        ### Parses the files under root that are new or changed since the
+        ### last scan and drops the files that were removed
+        ### Returns the list of files parsed
+        parsed = []
+        present = set()
+        for filename, project, kind in self.sources(root):
+            key = os.path.abspath(filename)
+            present.add(key)
+            stat = os.stat(filename)
+            entry = self.index.get(key)
+            if entry is not None and entry['mtime'] == stat.st_mtime \
+                                            and entry['size'] == stat.st_size:
+                continue
+            if kind == 'log':
+                records = parseLog(filename)
+            else:
+                records = parseTouchstone(filename)
+            self.index[key] = {'mtime': stat.st_mtime, 'size': stat.st_size,
+                            'project': project, 'records': records}
+            parsed.append(filename)
+        prefix = os.path.join(os.path.abspath(root), '')
+        for key in list(self.index):
+            if key.startswith(prefix) and key not in present:
+                del self.index[key]
+        if save:
+            self.save()
+        return parsed
+
+    def records(self, name, project = None):
+        ### Records of a table as dictionaries. The runs of the logs of one
+        ### directory are merged by run number and start date
+        merged = {}
+        rows = []
+        for key in sorted(self.index):
+            entry = self.index[key]
+            if project is not None and entry['project'] != project:
+                continue
+            base = {'project': entry['project'],
+                    'directory': os.path.dirname(key)}
+            for record in entry['records'][name]:
+                if name == 'runs':
+                    runKey = (base['directory'], record['run'],
+                                                            record['started'])
+                    if runKey not in merged:
+                        merged[runKey] = dict(base)
+                        rows.append(merged[runKey])
+                    merged[runKey].update(record)
+                else:
+                    row = dict(base)
+                    row.update(record)
+                    rows.append(row)
+        if name == 'runs':
+            for row in rows:
+                if row.get('ended') and row.get('started'):
+                    ended = datetime.datetime.strptime(row['ended'],
+                                                        '%Y-%m-%d %H:%M:%S')
+                    started = datetime.datetime.strptime(row['started'],
+                                                        '%Y-%m-%d %H:%M:%S')
+                    row['wallTime'] = (ended - started).total_seconds()
+        return rows
+
+    def columns(self, name, rows):
+        columns = {'runs': runColumns, 'messages': messageColumns,
+                                        'responses': responseColumns}[name]
+        extra = sorted(set([k for row in rows for k in row]) - set(columns))
+        return columns + extra
+
+    def table(self, name, project = None):
+        ### Columnar table {column: array} ('runs', 'messages' or
+        ### 'responses'), of one project if given
+        rows = self.records(name, project)
+        return dict((c, columnArray([row.get(c) for row in rows]))
+                                            for c in self.columns(name, rows))
+
+    def saveCSV(self, directory = None, project = None):
+        ### Writes runs.csv, messages.csv and responses.csv
+        ### Returns the file names
+        if directory is None:
+            directory = self.directory
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        filenames = []
+        for name in ('runs', 'messages', 'responses'):
+            rows = self.records(name, project)
+            columns = self.columns(name, rows)
+            filename = os.path.join(directory, name + '.csv')
+            with open(filename, 'w', newline = '') as f:
+                writer = csv.writer(f)
+                writer.writerow(columns)
+                for row in rows:
+                    writer.writerow(['' if row.get(c) is None else row.get(c)
+                                                            for c in columns])
+            filenames.append(filename)
+        return filenames
+
+    def saveNpz(self, filename, project = None):
+        ### Writes all tables to one .npz, arrays named table.column
+        arrays = {}
+        for name in ('runs', 'messages', 'responses'):
+            for column, values in self.table(name, project).items():
+                arrays[name + '.' + column] = values
+        savez(filename, **arrays)
+
+    def report(self, project = None, printReport = True):
+        ### One line per run: project, status, frequencies, subsections,
+        ### errors and times, returns the lines
+        runs = self.records('runs', project)
+        lines = ['%-24s %4s %-10s %6s %8s %6s %6s %10s' % ('project', 'run',
+                    'status', 'freqs', 'subsect', 'errors', 'warns',
+                                                                'time [s]')]
+        for r in runs:
+            time = r.get('totalTime', r.get('wallTime'))
+            lines.append('%-24s %4d %-10s %6s %8s %6s %6s %10s' % (
+                    r['project'][:24], r['run'], r.get('status', '?'),
+                    r.get('frequencies', ''), r.get('subsections', ''),
+                    r.get('errors', ''), r.get('warnings', ''),
+                    '' if time is None else '%.1f' % time))
+        if printReport:
+            for line in lines:
+                print(line)
+        return lines
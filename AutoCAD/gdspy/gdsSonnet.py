@@ -0,0 +1,174 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS Sonnet Exporter
+Writes a Sonnet project (.son) with its GEO block straight from a cell
+instead of going through a GDS export and an xgeom import
+
+Usage:
+    gdsSonnet.writeSonnet(device, deviceName + '.son', cellSize = 1,
+                          ports = [[1275, 150], [8725, 150]])
+    gdsSonnet.writeSonnet(device, 'feedline.son', layers = {5: 0},
+                          frequencies = [5, 7])
+
+Before writing, the layers that are not simulated are dropped (boundaries,
+labels, stitch grids and keep-outs of the dated scripts by default), every vertex is
+snapped to the Sonnet cell grid, and the polygons of each layer are merged
+with one gdspy.boolean. Repeated and collinear vertices the snapping leaves
+behind are removed. The project comes out with far fewer polygons and
+vertices than a GDS import, and they are aligned to the subsection grid
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import datetime
+import gdspy
+import gdslib
+
+# Layers of the dated scripts that are not simulated: boundaries (1-3),
+# labels (4), stitch grids (7) and stitch keep-out paths (8)
+skipLayers = (1, 2, 3, 4, 7, 8)
+# Dielectric stack from the top: (thickness, er, name, loss tangent)
+defaultStack = [(1000, 1., 'Air', 0), (500, 11.9, 'Silicon (intrinsic)', 5e-6)]
+
+def snapPolygon(points, origin, cellSize):
+    ### Vertices snapped to the cell grid with repeated and collinear
+    ### vertices removed, None if nothing with an area is left
+    p = around((asarray(points, dtype = float) - origin)/cellSize)
+    keep = (p != roll(p, 1, axis = 0)).any(axis = 1)
+    p = p[keep]
+    while len(p) >= 3:
+        before = roll(p, 1, axis = 0)
+        after = roll(p, -1, axis = 0)
+        cross = (p[:, 0] - before[:, 0])*(after[:, 1] - p[:, 1]) \
+              - (p[:, 1] - before[:, 1])*(after[:, 0] - p[:, 0])
+        if (cross != 0).all():
+            break
+        if (cross == 0).all():
+            # Snapped onto a line
+            return None
+        # Drop one vertex of each collinear run per pass so runs shrink
+        # without removing both ends of a spike
+        drop = (cross == 0) & ~roll(cross == 0, 1)
+        p = p[~drop]
+        keep = (p != roll(p, 1, axis = 0)).any(axis = 1)
+        p = p[keep]
+    if len(p) < 3:
+        return None
+    area = dot(p[:, 0], roll(p[:, 1], -1)) - dot(p[:, 1], roll(p[:, 0], -1))
+    if area == 0:
+        return None
+    return p*cellSize + origin
+
+def simulatedPolygons(cell, layers = None, origin = (0, 0), cellSize = 1,
+                                                    merge = True, eps = 1e-10):
+    ### Polygons to simulate per Sonnet level {level: [polygons]}
+    ### layers - {GDS layer: Sonnet level}, all layers not in skipLayers go
+    ### to level 0 if None
+    origin = asarray(origin, dtype = float)
+    byLevel = {}
+    for points, spec in gdslib.polygonSpecs(cell):
+        if layers is None:
+            if spec[0] in skipLayers:
+                continue
+            level = 0
+        elif spec[0] in layers:
+            level = layers[spec[0]]
+        else:
+            continue
+        snapped = snapPolygon(points, origin, cellSize)
+        if snapped is not None:
+            byLevel.setdefault(level, []).append(snapped)
+    if merge:
+        for level, polys in byLevel.items():
+            merged = gdspy.boolean([gdspy.PolygonSet(polys)],
+                        lambda inside: inside > 0, max_points = 0, eps = eps)
+            merged = [] if merged is None else merged.polygons
+            # Intersections of merged edges can fall off the grid again
+            snapped = [snapPolygon(p, origin, cellSize) for p in merged]
+            byLevel[level] = [p for p in snapped if p is not None]
+    return byLevel
+
+def nearestEdge(polygons, point):
+    ### (polygon index, vertex index) of the edge whose midpoint is closest
+    ### to point, the edge goes from that vertex to the next
+    best = None
+    for i, p in enumerate(polygons):
+        mid = (p + roll(p, -1, axis = 0))/2.
+        d = ((mid - point)**2).sum(axis = 1)
+        j = int(argmin(d))
+        if best is None or d[j] < best[0]:
+            best = (d[j], i, j)
+    return best[1], best[2]
+
+def writeSonnet(cell, filename, layers = None, box = None, cellSize = 1,
+                stack = None, ports = None, frequencies = None, merge = True,
+                                                    metal = -1, eps = 1e-10):
+    ### Writes cell (anything gdslib.polygonSpecs takes) as a Sonnet project
+    ### layers - {GDS layer: Sonnet metal level}, see simulatedPolygons
+    ### box - [[xmin, ymin], [xmax, ymax]] of the Sonnet box, the bounding
+    ### box of the whole cell if None, rounded out to whole cells
+    ### cellSize - Sonnet cell size (um), vertices are snapped to it
+    ### stack - dielectric layers from the top, (thickness, er, name, loss
+    ### tangent), defaultStack if None
+    ### ports - [[x, y], ...] standard ports, each on the polygon edge whose
+    ### midpoint is closest, numbered in order
+    ### frequencies - [start, stop] (GHz) of an adaptive sweep
+    ### metal - Sonnet metal type of the polygons, -1 is lossless
+    ### Returns the number of polygons and vertices written
+    if stack is None:
+        stack = defaultStack
+    if box is None:
+        box = gdslib.boundingBox(gdslib.polygonsOf(cell))
+    lower = floor(asarray(box[0], dtype = float)/cellSize)*cellSize
+    upper = ceil(asarray(box[1], dtype = float)/cellSize)*cellSize
+    size = upper - lower
+    byLevel = simulatedPolygons(cell, layers, lower, cellSize, merge, eps)
+    # Sonnet coordinates run from the top left corner of the box, y down
+    def sonnet(p):
+        return transpose([p[:, 0] - lower[0], upper[1] - p[:, 1]])
+    polygons = []
+    for level in sorted(byLevel):
+        for p in byLevel[level]:
+            polygons.append((level, sonnet(p)))
+    now = datetime.datetime.today().strftime('%m/%d/%Y %H:%M:%S')
+    lines = ['FTYP SONPROJ 15 ! Sonnet Project File', 'VER 16.52', 'HEADER',
+             'DAT ' + now, 'BUILT_BY_CREATED gdslib 16.52 ' + now,
+             'BUILT_BY_SAVED gdslib 16.52', 'MDATE ' + now, 'HDATE ' + now,
+             'END HEADER', 'DIM', 'FREQ GHZ', 'IND NH', 'LNG UM', 'ANG DEG',
+             'CON /OH', 'CAP PF', 'RES OH', 'END DIM', 'FREQ']
+    if frequencies is not None:
+        lines.append('ABS_ENTRY %.15g %.15g' % tuple(frequencies))
+    lines += ['END FREQ', 'CONTROL', 'ABS', 'OPTIONS  -d ', 'SPEED 0',
+              'CACHE_ABS 1', 'TARG_ABS 300', 'Q_ACC N', 'END CONTROL', 'GEO',
+              'TMET "Lossless" 0 SUP 0 0 0 0', 'BMET "Lossless" 0 SUP 0 0 0 0',
+              'BOX %d %.15g %.15g %d %d 20 0' % (len(stack) - 1, size[0],
+                    size[1], 2*int(round(size[0]/cellSize)),
+                                            2*int(round(size[1]/cellSize)))]
+    for layer in stack:
+        thickness, er, name = layer[:3]
+        loss = layer[3] if len(layer) > 3 else 0
+        lines.append('      %.15g %.15g 1 %.15g 0 0 0 "%s"' % (thickness, er,
+                                                                loss, name))
+    # Debug ids of the polygons start at 1, as in the xgeom exports
+    for number, point in enumerate(ports or []):
+        i, j = nearestEdge([p for level, p in polygons],
+                                    sonnet(asarray([point], dtype = float))[0])
+        p = polygons[i][1]
+        mid = (p[j] + p[(j + 1) % len(p)])/2.
+        lines += ['POR1 STD', 'POLY %d 1' % (i + 1), '%d' % j,
+                  '%d 50 0 0 0 %.15g %.15g' % (number + 1, mid[0], mid[1])]
+    lines += ['LORGN 0 %.15g U ' % size[1], 'NUM %d' % len(polygons)]
+    vertices = 0
+    for i, (level, p) in enumerate(polygons):
+        lines.append('%d %d %d N %d 1 1 100 100 0 0 0 Y' % (level, len(p) + 1,
+                                                                metal, i + 1))
+        for x, y in concatenate([p, p[:1]]):
+            lines.append('%.15g %.15g' % (x, y))
+        lines.append('END')
+        vertices += len(p)
+    lines.append('END GEO')
+    with open(filename, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return len(polygons), vertices
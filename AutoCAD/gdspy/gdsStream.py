@@ -0,0 +1,271 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS Streaming Writer
+Writes a GDSII library while the layout is generated instead of keeping
+every cell in memory until gdspy.gds_print
+
+Usage:
+    stream = gdsStream.GdsStream('wafer.gds')
+    stream.beginCell('wafer')
+    cpw = gdslib.CPWPath(10, 5, layer = 6, cellName = stream)
+    ...
+    cpw.end()                             # polygons go straight to the file
+    gdslib.stitchGrid(stream, box)        # AREF records, unit cell at endCell
+    stream.endCell()
+    stream.close()
+
+A GdsStream can be given to anything in gdslib that takes a cellName. The
+polygons added to it are written as BOUNDARY records right away, references
+as SREF/AREF records. Cells referenced by them are written after the
+current cell ends, since GDSII structures cannot be nested. Boolean
+operations queued on the stream are resolved and written by endCell. The
+file is written through a buffer of bufferSize bytes, so peak memory is set
+by the largest single component and not by the layout
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import datetime
+import struct
+import gdspy
+import gdslib
+
+def record(kind, data = b''):
+    ### GDSII record: length, record type and data (padded to even length)
+    if len(data) % 2:
+        data += b'\0'
+    return struct.pack('>HH', 4 + len(data), kind) + data
+
+def real8(value):
+    ### GDSII 8 byte real (excess 64, base 16)
+    if value == 0:
+        return b'\0'*8
+    sign = 0
+    if value < 0:
+        sign = 0x80
+        value = -value
+    exponent = int(floor(log2(value)*0.25))
+    mantissa = int(value*16.**(14 - exponent) + 0.5)
+    while mantissa >= 2**56:
+        exponent += 1
+        mantissa = int(value*16.**(14 - exponent) + 0.5)
+    return struct.pack('>B7s', sign | (exponent + 64),
+                                mantissa.to_bytes(7, 'big'))
+
+def dateWords():
+    ### Modification and access time words of BGNLIB/BGNSTR
+    now = datetime.datetime.today()
+    words = [now.year, now.month, now.day, now.hour, now.minute, now.second]
+    return struct.pack('>12h', *(words + words))
+
+def nameBytes(name):
+    return name.encode('ascii')
+
+def boundaryRecords(points, layer, datatype, multiplier):
+    ### BOUNDARY element of one polygon, closed and scaled to database units
+    points = asarray(points, dtype = float)
+    if len(points) > 8190:
+        raise ValueError('[GDSSTREAM] Polygons with more than 8190 vertices '
+                                        'are not supported by the GDSII format.')
+    xy = empty((len(points) + 1, 2), dtype = '>i4')
+    xy[:-1] = around(points*multiplier)
+    xy[-1] = xy[0]
+    return b''.join([record(0x0800), record(0x0D02, struct.pack('>h', layer)),
+                     record(0x0E02, struct.pack('>h', datatype)),
+                     record(0x1003, xy.tobytes()), record(0x1100)])
+
+def transformRecords(rotation, magnification, xReflection):
+    ### STRANS, MAG and ANGLE records of a reference (empty if not needed)
+    if rotation is None and magnification is None and not xReflection:
+        return b''
+    word = 0x8000 if xReflection else 0
+    values = b''
+    if magnification is not None:
+        values += record(0x1B05, real8(magnification))
+    if rotation is not None:
+        values += record(0x1C05, real8(rotation))
+    return record(0x1A01, struct.pack('>H', word)) + values
+
+
+class GdsStream:
+    """ GDSII library written to disk as elements are added
+    outfile - file name or file object opened in binary mode
+    name - library name
+    unit, precision - as gdspy.gds_print
+    bufferSize - bytes buffered before they are written to the file
+    """
+    def __init__(self, outfile, name = 'library', unit = 1.0e-6,
+                            precision = 1.0e-9, bufferSize = 1024*1024):
+        if isinstance(outfile, str):
+            self.file = open(outfile, 'wb')
+            self.ownFile = True
+        else:
+            self.file = outfile
+            self.ownFile = False
+        self.multiplier = unit/precision
+        self.bufferSize = bufferSize
+        self.buffer = []
+        self.buffered = 0
+        self.bytesWritten = 0
+        self.elementCount = 0
+        # Current cell, cells written so far and cells waiting to be written
+        self.name = None
+        self.written = set()
+        self.pending = {}
+        self.write(record(0x0002, struct.pack('>h', 600))
+                + record(0x0102, dateWords())
+                + record(0x0206, nameBytes(name))
+                + record(0x0305, real8(precision/unit) + real8(precision)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def write(self, data):
+        ### Buffers data and flushes the buffer once it holds bufferSize bytes
+        self.buffer.append(data)
+        self.buffered += len(data)
+        if self.buffered >= self.bufferSize:
+            self.flush()
+
+    def flush(self):
+        self.file.write(b''.join(self.buffer))
+        self.bytesWritten += self.buffered
+        self.buffer = []
+        self.buffered = 0
+
+    def beginCell(self, name):
+        ### Starts a structure, the previous one has to be ended first
+        if self.name is not None:
+            raise ValueError('[GDSSTREAM] Cell ' + self.name + ' is still open.')
+        if name in self.written:
+            raise ValueError('[GDSSTREAM] Cell ' + name + ' was already written.')
+        self.name = name
+        self.written.add(name)
+        self.pending.pop(name, None)
+        self.write(record(0x0502, dateWords()) + record(0x0606, nameBytes(name)))
+
+    def endCell(self):
+        ### Ends the current structure and writes the cells it referenced
+        ### Boolean operations queued on it (mask, union, deferBooleans) are
+        ### resolved first, resolveBooleans would run after it is closed
+        queue = gdslib.BooleanQueue.queues.get(self.name)
+        if queue is not None and queue.cellName is self:
+            del gdslib.BooleanQueue.queues[self.name]
+            queue.resolve()
+        self.write(record(0x0700))
+        self.name = None
+        while len(self.pending) > 0:
+            name, cell = self.pending.popitem()
+            self.writeCell(cell)
+
+    def checkOpen(self):
+        if self.name is None:
+            raise ValueError('[GDSSTREAM] Elements need an open cell, '
+                                                        'see beginCell.')
+
+    def boundary(self, points, layer = 0, datatype = 0):
+        ### Writes one polygon
+        self.checkOpen()
+        self.write(boundaryRecords(points, layer, datatype, self.multiplier))
+        self.elementCount += 1
+
+    def sref(self, cellName, origin = (0, 0), rotation = None,
+                                    magnification = None, xReflection = False):
+        ### Writes a reference to cellName (a gdspy.Cell or the name of a
+        ### cell written to this stream)
+        self.checkOpen()
+        name = self.referTo(cellName)
+        xy = array([origin], dtype = float)*self.multiplier
+        self.write(record(0x0A00) + record(0x1206, nameBytes(name))
+                + transformRecords(rotation, magnification, xReflection)
+                + record(0x1003, around(xy).astype('>i4').tobytes())
+                + record(0x1100))
+        self.elementCount += 1
+
+    def aref(self, cellName, columns, rows, spacing, origin = (0, 0),
+                    rotation = None, magnification = None, xReflection = False):
+        ### Writes an array reference to cellName, same arguments as
+        ### gdspy.CellArray
+        self.checkOpen()
+        name = self.referTo(cellName)
+        x2 = origin[0] + columns*spacing[0]
+        y3 = origin[1] + rows*spacing[1]
+        if xReflection:
+            y3 = 2*origin[1] - y3
+        corners = array([origin, (x2, origin[1]), (origin[0], y3)], dtype = float)
+        if rotation is not None:
+            # Lattice vectors rotate about the origin of the array
+            theta = radians(rotation)
+            rel = corners[1:] - corners[0]
+            corners[1:] = corners[0] + transpose([
+                                rel[:, 0]*cos(theta) - rel[:, 1]*sin(theta),
+                                rel[:, 0]*sin(theta) + rel[:, 1]*cos(theta)])
+        self.write(record(0x0B00) + record(0x1206, nameBytes(name))
+                + transformRecords(rotation, magnification, xReflection)
+                + record(0x1302, struct.pack('>2h', columns, rows))
+                + record(0x1003, around(corners*self.multiplier).astype('>i4')
+                                                                    .tobytes())
+                + record(0x1100))
+        self.elementCount += 1
+
+    def referTo(self, cellName):
+        ### Name of a referenced cell, gdspy cells not written yet are queued
+        if isinstance(cellName, gdspy.Cell):
+            if cellName.name not in self.written:
+                self.pending[cellName.name] = cellName
+            return cellName.name
+        return cellName
+
+    def add(self, element):
+        ### Writes an element or a list of elements: gdspy polygons, polygon
+        ### sets, paths, references and labels, CPWPaths or vertex arrays
+        self.checkOpen()
+        if isinstance(element, list) and len(element) > 0 \
+                and not isinstance(element[0], (list, tuple, ndarray)):
+            for item in element:
+                self.add(item)
+        elif isinstance(element, gdspy.CellArray):
+            self.aref(element.ref_cell, element.columns, element.rows,
+                element.spacing, element.origin, element.rotation,
+                element.magnification, element.x_reflection)
+        elif isinstance(element, gdspy.CellReference):
+            self.sref(element.ref_cell, element.origin, element.rotation,
+                element.magnification, element.x_reflection)
+        elif isinstance(element, gdspy.Label):
+            self.write(element.to_gds(self.multiplier))
+            self.elementCount += 1
+        else:
+            for points, spec in gdslib.polygonSpecs(element, 0, 0):
+                self.boundary(points, spec[0], spec[1])
+        return self
+
+    def writeCell(self, cell):
+        ### Writes a whole gdspy.Cell as its own structure, its references
+        ### stay references
+        self.beginCell(cell.name)
+        for element in cell.elements:
+            self.add(element)
+        for label in cell.labels:
+            self.add(label)
+        self.endCell()
+
+    def close(self):
+        ### Ends the open cell, writes the pending cells and the end of the
+        ### library
+        if self.file is None:
+            return
+        if self.name is not None:
+            self.endCell()
+        while len(self.pending) > 0:
+            name, cell = self.pending.popitem()
+            self.writeCell(cell)
+        self.write(record(0x0400))
+        self.flush()
+        if self.ownFile:
+            self.file.close()
+        self.file = None
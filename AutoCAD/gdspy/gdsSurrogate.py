@@ -0,0 +1,244 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS Frequency Surrogate
+Interpolates simulated resonance frequencies over the geometry parameters
+(widths, capDist, couplingDist, ...) of the variants already simulated, so
+design iterations can look frequencies up instead of running Sonnet again
+
+Usage:
+    store = gdsSonLog.LogStore('sonnet_store')
+    store.scan('sweep')
+    f0 = gdsSurrogate.resonances(store)                 # {project: GHz}
+    X, y = gdsSurrogate.sweepSamples(results, f0, ['widths', 'capDist'])
+    model = gdsSurrogate.FrequencySurrogate(X, y, names = ['widths',
+                                                               'capDist'])
+    p = model.predict([[10, 50], [12, 55]])
+    p['frequency'], p['uncertainty'], p['outside']
+
+Models are radial basis function interpolants (thin plate spline with a
+linear tail by default) or least squares polynomials on the parameters
+scaled to [0, 1]. The uncertainty is the leave-one-out error of the fit,
+computed in closed form (Rippa's formula for the RBF, the hat matrix for
+polynomials), grown with the distance to the nearest sample in units of
+the typical sample spacing. Designs outside the sampled box, or further
+than twice that spacing from every sample, are flagged as outside
+With a baseline (for instance the ereff = (1 + er)/2 estimate of the
+scripts) the model fits the ratio of the simulated frequency to it
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import itertools
+
+def resonance(frequency, a, b, fmt = 'Magnitude/Angle'):
+    ### Frequency of the minimum of |S21|, refined by a parabola through the
+    ### three samples around it (in dB)
+    frequency = asarray(frequency, dtype = float)
+    a, b = asarray(a, dtype = float), asarray(b, dtype = float)
+    if fmt == 'Real/Imaginary':
+        db = 20*log10(maximum(hypot(a, b), 1e-300))
+    elif fmt == 'DB/Angle':
+        db = a
+    else:
+        db = 20*log10(maximum(a, 1e-300))
+    order = argsort(frequency)
+    frequency, db = frequency[order], db[order]
+    i = int(argmin(db))
+    if i == 0 or i == len(db) - 1:
+        return float(frequency[i])
+    f, d = frequency[i - 1:i + 2], db[i - 1:i + 2]
+    denominator = (f[0] - f[1])*(f[0] - f[2])*(f[1] - f[2])
+    p = (f[2]*(d[1] - d[0]) + f[1]*(d[0] - d[2]) + f[0]*(d[2] - d[1])) \
+                                                                /denominator
+    q = (f[2]**2*(d[0] - d[1]) + f[1]**2*(d[2] - d[0])
+                                    + f[0]**2*(d[1] - d[2]))/denominator
+    if p <= 0:
+        return float(frequency[i])
+    return float(clip(-q/(2*p), f[0], f[2]))
+
+def resonances(store, parameter = 'S21', project = None):
+    ### {project: resonance frequency (GHz)} of the last run with responses
+    ### of every project in a gdsSonLog.LogStore
+    table = store.table('responses', project)
+    found = {}
+    if len(table['project']) == 0:
+        return found
+    pick = table['parameter'] == parameter
+    keys = sorted(set(zip(table['project'][pick], table['started'][pick],
+                                                        table['run'][pick])))
+    for name, started, run in keys:
+        rows = pick & (table['project'] == name) \
+                & (table['started'] == started) & (table['run'] == run)
+        found[str(name)] = resonance(table['frequency'][rows],
+                table['a'][rows], table['b'][rows], table['format'][rows][0])
+    return found
+
+def sweepSamples(results, frequencies, names):
+    ### Samples (X [n][len(names)], y [n]) of the variants of a gdsSweep run
+    ### with a frequency in frequencies ({cell or project: frequency})
+    X, y = [], []
+    for r in results:
+        if r.get('error') is None and r['cell'] in frequencies:
+            X.append([float(r['params'][n]) for n in names])
+            y.append(frequencies[r['cell']])
+    return array(X, dtype = float).reshape(-1, len(names)), array(y)
+
+def thinPlate(r):
+    return where(r > 0, r**2*log(where(r > 0, r, 1)), 0.)
+
+def cubic(r):
+    return r**3
+
+def gaussian(r, scale = 0.3):
+    return exp(-(r/scale)**2)
+
+def multiquadric(r, scale = 0.3):
+    return sqrt(1 + (r/scale)**2)
+
+kernels = {'thinplate': thinPlate, 'cubic': cubic, 'gaussian': gaussian,
+           'multiquadric': multiquadric}
+
+def distances(a, b):
+    ### Euclidean distances [len(a)][len(b)] between two sets of points
+    d = (a**2).sum(axis = 1)[:, newaxis] + (b**2).sum(axis = 1)[newaxis, :] \
+                                                            - 2*dot(a, b.T)
+    return sqrt(maximum(d, 0))
+
+def monomials(X, degree):
+    ### Columns of all monomials of X up to degree, constant first
+    n, d = X.shape
+    columns = [ones(n)]
+    for k in range(1, degree + 1):
+        for powers in itertools.combinations_with_replacement(range(d), k):
+            columns.append(prod(X[:, list(powers)], axis = 1))
+    return transpose(array(columns))
+
+class FrequencySurrogate:
+    """ Interpolation model of frequencies over geometry parameters
+    X - [n][d] parameters of the simulated designs, y - [n] frequencies,
+    at least d + 2 samples so the leave-one-out error is defined
+    kind - 'rbf' or 'poly'
+    kernel - RBF kernel name (kernels), degree - polynomial degree of the
+    'poly' model or of the tail of the RBF (-1 for none)
+    smoothing - added to the RBF diagonal, 0 interpolates the samples
+    baseline - function of X [m][d] giving an estimate of the frequency,
+    the model then fits y/baseline(X)
+    names - parameter names, for the report only
+    """
+    def __init__(self, X, y, kind = 'rbf', kernel = 'thinplate', degree = 1,
+                        smoothing = 0., baseline = None, names = None):
+        X = asarray(X, dtype = float)
+        self.X = X.reshape(len(X), -1)
+        self.y = asarray(y, dtype = float)
+        if len(self.X) < self.X.shape[1] + 2:
+            raise ValueError('[GDSSURROGATE] %d samples of %d parameters, '
+                'at least %d are needed.' % (len(self.X), self.X.shape[1],
+                                                        self.X.shape[1] + 2))
+        self.kind = kind
+        self.kernel = kernel
+        self.degree = degree
+        self.smoothing = smoothing
+        self.baseline = baseline
+        self.names = names
+        self.low = self.X.min(axis = 0)
+        self.span = self.X.max(axis = 0) - self.low
+        self.span[self.span == 0] = 1.
+        self.Xs = self.scale(self.X)
+        target = self.y
+        if baseline is not None:
+            target = self.y/asarray(baseline(self.X), dtype = float)
+        if kind == 'rbf':
+            self.fitRBF(target)
+        elif kind == 'poly':
+            self.fitPoly(target)
+        else:
+            raise ValueError('[GDSSURROGATE] Unknown model kind %s.' % kind)
+        if baseline is not None:
+            self.loo = self.loo*asarray(baseline(self.X), dtype = float)
+        self.looRMS = sqrt(mean(self.loo**2))
+        # Typical spacing: median distance of a sample to its nearest one
+        if len(self.Xs) > 1:
+            d = distances(self.Xs, self.Xs)
+            fill_diagonal(d, inf)
+            self.spacing = median(d.min(axis = 1))
+        else:
+            self.spacing = 1.
+        if self.spacing == 0:
+            self.spacing = 1.
+
+    def scale(self, X):
+        return (X - self.low)/self.span
+
+    def fitRBF(self, target):
+        n = len(self.Xs)
+        K = kernels[self.kernel](distances(self.Xs, self.Xs))
+        K = K + self.smoothing*eye(n)
+        P = monomials(self.Xs, self.degree) if self.degree >= 0 \
+                                                    else zeros((n, 0))
+        m = P.shape[1]
+        A = zeros((n + m, n + m))
+        A[:n, :n] = K
+        A[:n, n:] = P
+        A[n:, :n] = P.T
+        inverse = linalg.pinv(A)
+        coefficients = dot(inverse, concatenate([target, zeros(m)]))
+        self.weights = coefficients[:n]
+        self.tail = coefficients[n:]
+        # Rippa: leave-one-out residual = weight / diagonal of the inverse
+        self.loo = self.weights/diag(inverse)[:n]
+
+    def fitPoly(self, target):
+        P = monomials(self.Xs, self.degree)
+        coefficients, res, rank, sv = linalg.lstsq(P, target, rcond = None)
+        self.coefficients = coefficients
+        hat = diag(dot(P, dot(linalg.pinv(dot(P.T, P)), P.T)))
+        residual = target - dot(P, coefficients)
+        self.loo = residual/maximum(1 - hat, 1e-12)
+
+    def evaluate(self, Xs):
+        if self.kind == 'poly':
+            return dot(monomials(Xs, self.degree), self.coefficients)
+        value = dot(kernels[self.kernel](distances(Xs, self.Xs)),
+                                                                self.weights)
+        if len(self.tail) > 0:
+            value += dot(monomials(Xs, self.degree), self.tail)
+        return value
+
+    def predict(self, X, margin = 0.):
+        ### Frequencies of designs X [m][d] (or one design [d])
+        ### margin - fraction of the sampled range a design may lie outside
+        ### of it without being flagged
+        ### Returns {'frequency', 'uncertainty', 'outside', 'nearest'} arrays,
+        ### nearest is the distance to the closest sample in sample spacings
+        X = asarray(X, dtype = float)
+        single = X.ndim == 1
+        X = X.reshape(-1, self.X.shape[1])
+        Xs = self.scale(X)
+        value = self.evaluate(Xs)
+        if self.baseline is not None:
+            value = value*asarray(self.baseline(X), dtype = float)
+        nearest = distances(Xs, self.Xs).min(axis = 1)/self.spacing
+        uncertainty = self.looRMS*(1 + nearest)
+        outside = ((Xs < -margin) | (Xs > 1 + margin)).any(axis = 1) \
+                                                            | (nearest > 2)
+        result = {'frequency': value, 'uncertainty': uncertainty,
+                  'outside': outside, 'nearest': nearest}
+        if single:
+            result = dict((k, v[0]) for k, v in result.items())
+        return result
+
+    def report(self, printReport = True):
+        ### Samples, ranges and leave-one-out errors, returns the lines
+        names = self.names or ['p%d' % i for i in range(self.X.shape[1])]
+        lines = ['%s model (%s), %d samples, leave-one-out RMS %.4g, '
+                 'max %.4g' % (self.kind, self.kernel if self.kind == 'rbf'
+                                else 'degree %d' % self.degree, len(self.y),
+                                        self.looRMS, abs(self.loo).max())]
+        for name, low, span in zip(names, self.low, self.span):
+            lines.append('    %-16s %12.6g to %12.6g' % (name, low, low + span))
+        if printReport:
+            for line in lines:
+                print(line)
+        return lines
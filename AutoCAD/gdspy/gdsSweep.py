@@ -0,0 +1,147 @@
+# Author: Michael T. Fang <mfang@caltech.edu>
+
+""" Python GDS Parametric Sweep Runner
+Builds the variants of one design in a pool of worker processes, every
+variant in its own cell namespace and GDS file
+
+Usage:
+    def resonatorChip(cellName, frequencies, widths):
+        origins = [[1500 + 2500*(i % 3), 1900 + 1100*(i//3)] for i in range(9)]
+        gdslib.resonatorArray(cellName, frequencies, widths, widths/2., 50,
+                                                                    origins)
+
+    if __name__ == '__main__':
+        results = gdsSweep.runSweep(resonatorChip,
+                    {'frequencies': [linspace(6E9, 6.05E9, 9) + df
+                                        for df in arange(50)*100E6],
+                     'widths': [5, 10]}, outDir = 'sweep')
+        gdsSweep.sweepReport(results)
+
+The design function is called as design(cellName, **parameters) and has to
+be defined at module level so the worker processes can import it
+
+Change Log:
+10/18/2026 - First version
+"""
+
+from numpy import *
+import gdspy
+import gdslib
+import itertools
+import multiprocessing
+import os
+import time
+import traceback
+
+def sweepGrid(grid):
+    ### Expands a parameter grid {name: [values]} into the list of parameter
+    ### dictionaries of every combination. A list of dictionaries is
+    ### returned as it is
+    if isinstance(grid, dict):
+        names = list(grid.keys())
+        return [dict(zip(names, values))
+                    for values in itertools.product(*[grid[n] for n in names])]
+    return list(grid)
+
+def freshNamespace():
+    ### Forgets all cells and the per-cell state of gdslib, so a worker can
+    ### build the next variant with the same cell names
+    gdspy.Cell.cell_dict.clear()
+    gdslib.BooleanQueue.queues.clear()
+    gdslib.SpatialIndex.indexes.clear()
+    gdslib.resetArcReport()
+
+def buildVariant(task):
+    ### Worker of runSweep: builds one variant and writes its GDS file
+    ### Returns the metrics of the variant, with the traceback under 'error'
+    ### if the design failed
+    design, params, number, cellName, outfile, unit, precision = task
+    result = {'variant': number, 'cell': cellName, 'file': outfile,
+              'params': params, 'buildTime': 0., 'writeTime': 0.,
+              'polygons': 0, 'vertices': 0, 'fileSize': 0, 'error': None}
+    try:
+        freshNamespace()
+        start = time.time()
+        cell = gdspy.Cell(cellName)
+        design(cell, **params)
+        gdslib.resolveBooleans()
+        result['buildTime'] = time.time() - start
+        polygons = cell.get_polygons()
+        result['polygons'] = len(polygons)
+        result['vertices'] = int(sum([len(p) for p in polygons]))
+        start = time.time()
+        gdslib.gdsPrint(outfile, unit = unit, precision = precision)
+        result['writeTime'] = time.time() - start
+        result['fileSize'] = os.path.getsize(outfile)
+    except Exception:
+        result['error'] = traceback.format_exc()
+    freshNamespace()
+    return result
+
+def runSweep(design, grid, outDir = '.', name = 'variant', processes = None,
+                                        unit = 1.0e-6, precision = 1.0e-9):
+    ### Builds every variant of grid (see sweepGrid) with design and writes
+    ### outDir/name_<n>.gds for each of them
+    ### processes - number of workers, None for one per core, 1 builds the
+    ### variants one after the other in this process
+    ### Scripts using processes > 1 on Windows need an
+    ### if __name__ == '__main__': guard
+    ### Returns the list of metrics of the variants in grid order
+    if not os.path.isdir(outDir):
+        os.makedirs(outDir)
+    tasks = []
+    for number, params in enumerate(sweepGrid(grid)):
+        cellName = '%s_%d' % (name, number)
+        tasks.append((design, params, number, cellName,
+                    os.path.join(outDir, cellName + '.gds'), unit, precision))
+    if processes == 1:
+        # Keep the cells of the calling script
+        saved = [dict(d) for d in (gdspy.Cell.cell_dict,
+                gdslib.BooleanQueue.queues, gdslib.SpatialIndex.indexes,
+                gdslib.arcStats)]
+        results = [buildVariant(task) for task in tasks]
+        for d, copy in zip((gdspy.Cell.cell_dict, gdslib.BooleanQueue.queues,
+                gdslib.SpatialIndex.indexes, gdslib.arcStats), saved):
+            d.update(copy)
+        return results
+    pool = multiprocessing.Pool(processes)
+    try:
+        results = pool.map(buildVariant, tasks, chunksize = 1)
+    finally:
+        pool.close()
+        pool.join()
+    return results
+
+def sweepReport(results, printReport = True):
+    ### Table of the metrics of a sweep, returns its lines
+    lines = ['%-16s %10s %10s %10s %12s %12s' % ('cell', 'build [s]',
+                    'write [s]', 'polygons', 'vertices', 'size [B]')]
+    for r in results:
+        if r['error'] is not None:
+            lines.append('%-16s failed: %s' % (r['cell'],
+                                    r['error'].strip().splitlines()[-1]))
+            continue
+        lines.append('%-16s %10.3f %10.3f %10d %12d %12d' % (r['cell'],
+                    r['buildTime'], r['writeTime'], r['polygons'],
+                    r['vertices'], r['fileSize']))
+    if printReport:
+        for line in lines:
+            print(line)
+    return lines
+
+def sweepCSV(results, filename):
+    ### Writes the metrics and the scalar parameters of a sweep to a CSV file
+    names = []
+    for r in results:
+        for key, value in r['params'].items():
+            if ndim(value) == 0 and key not in names:
+                names.append(key)
+    columns = ['variant', 'cell', 'file', 'buildTime', 'writeTime', 'polygons',
+                                                'vertices', 'fileSize', 'error']
+    with open(filename, 'w') as f:
+        f.write(','.join(columns + names) + '\n')
+        for r in results:
+            row = [str(r[c]) for c in columns[:-1]]
+            row.append('' if r['error'] is None else 'failed')
+            row += [str(r['params'].get(n, '')) for n in names]
+            f.write(','.join(row) + '\n')
@@ -6,50 +6,248 @@ Library for creating geometries commonly found in superconducting circuits
 Change Log:
 2/22/2016 - Fixed bug in meander function where meanders would be written with
 incorrect lengths
+10/18/2026 - Meanders are solved in closed form (meanderPlan) instead of
+polling the path length after every segment. Added meanderBoundingBox
+10/18/2026 - Added resonatorArray and batchRoute to build many resonators at
+once from NumPy parameter arrays
+10/18/2026 - Added stitchGrid, which draws stitch grids as a unit cell and
+CellArrays with exclusion zones
+10/18/2026 - Bend point counts can be picked from a chip-wide sagitta
+tolerance (setArcTolerance), arcReport gives the vertices saved
+10/18/2026 - CPWPath can emit padding/clearance layers from the same route
+(offsetLayers, addOffsetLayer) instead of replaying it with a 1e-9 width
+10/18/2026 - CPWPath records its route (ops, replay). Lazy paths only track
+position, direction and length until end() builds the polygons
+10/18/2026 - Boolean operations can be queued per cell (BooleanQueue) and
+resolved with one gdspy.boolean per layer before writing (gdsPrint)
+10/18/2026 - mask and useAsMask can subtract tile by tile in a process pool
+(tiledMask)
+10/18/2026 - Uniform grid SpatialIndex per cell with box, point, polygon and
+nearest queries, kept up to date as gdslib adds polygons
+10/18/2026 - Lazy CPWPaths load their polygons from an on-disk geometry cache
+when their route was built before (setGeometryCache, gdsCache)
+10/18/2026 - cellName can also be a gdsStream.GdsStream, which writes the
+polygons to the GDS file as they are added
+10/18/2026 - Opt-in per-primitive counters of calls, time, polygons and
+vertices per layer (setProfiling, profileReport, profileJSON)
+10/18/2026 - resonatorArray takes the resonator lengths, e.g. from the
+conformal mapping formulas of gdsCPW
+10/18/2026 - Added meanderExtent and solveMeanders, which pick the bend radius
+and straight length of many meanders to fit their footprints
+10/18/2026 - Lazy CPWPaths give dir() as gdspy would and place openGapFillet
+like eager ones after angled bends, checkLazy compares the two modes
+10/18/2026 - arcPoints keeps the sagitta within tolerance when gdspy splits a
+bend past 199 points and arcReport counts the split polygons (arcPieces)
+10/18/2026 - gridMask finds every cell an outline crosses, including cells
+an edge only clips at a corner, so stitchGrid never covers excluded geometry
+10/18/2026 - Geometry change: meanders with initialAngle 'l', 'r' or an angle
+that are too short for a full turn now end on their partial arc. The loop
+version dropped it and drew only the straight, so such meanders came out
+shorter than lengthTotal. The dated designs only use 'll' and 'rr' and are
+unchanged. geometryVersion is 2, so cached paths are rebuilt
 
 """
 
 # Written using gdspy 0.7.1 and numpy 1.10.1
 from numpy import *
 import gdspy
+import json
+import time
 
 print('Using gdspy module version ' + gdspy.__version__)
 
+# Chip-wide maximum sagitta (chord error) of bends, set with setArcTolerance
+# None draws every bend with a fixed number of points
+arcTolerance = None
+# Default number of points of a bend polygon
+arcFixedPoints = 100
+# Vertices used by bends so far, see arcReport
+arcStats = {'bends': 0, 'vertices': 0, 'fixedVertices': 0}
+# Cache of component polygons (see gdsCache.GeometryCache), set with
+# setGeometryCache. Lazy CPWPaths look their polygons up in it at end()
+geometryCache = None
+# Bump when a change to gdslib alters the polygons it draws, so cached
+# geometry of older versions is not reused
+geometryVersion = 2
+# Per-primitive counters (see setProfiling and profileReport). Off by default,
+# profiled functions then only check this flag
+profiling = False
+profileStats = {}
+
+def profiled(func):
+    ### Decorator counting calls, wall time, polygons and vertices of a
+    ### gdslib primitive while profiling is on
+    def call(*args, **kwargs):
+        if not profiling:
+            return func(*args, **kwargs)
+        return profileCall(func, args, kwargs)
+    call.__name__ = func.__name__
+    call.__qualname__ = func.__qualname__
+    call.__doc__ = func.__doc__
+    call.__wrapped__ = func
+    return call
+
+def profileTargets(args, kwargs):
+    ### Paths and cells a profiled call may add polygons to, with their
+    ### current sizes
+    paths = []
+    cells = []
+    for obj in list(args) + list(kwargs.values()):
+        if isinstance(obj, CPWPath):
+            paths += [obj.path] + [o['path'] for o in obj.offsetLayers]
+            obj = obj.cellName
+        elif isinstance(obj, BooleanQueue):
+            obj = obj.cellName
+        if isinstance(getattr(obj, 'elements', None), list):
+            cells.append(obj)
+    return [(p, len(p.polygons)) for p in paths if p is not None], \
+           [(c, len(c.elements)) for c in cells]
+
+def profileCall(func, args, kwargs):
+    ### Runs func and adds its time and the polygons it drew to profileStats
+    ### Counts are inclusive: a meander also counts as straights and bends
+    paths, cells = profileTargets(args, kwargs)
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    specs = []
+    drawn = []
+    if len(args) > 0 and isinstance(args[0], CPWPath):
+        # Paths created by the call (start, materialize) count from zero
+        before = dict((id(p), n) for p, n in paths)
+        cpw = args[0]
+        drawn = [p for p in [cpw.path] + [o['path'] for o in cpw.offsetLayers]
+                                                            if p is not None]
+        for p in drawn:
+            n = before.get(id(p), 0)
+            specs += list(zip(p.polygons[n:], zip(p.layers[n:],
+                                                        p.datatypes[n:])))
+    for cell, n in cells:
+        for element in cell.elements[n:]:
+            # Paths added by end() were counted as they were drawn
+            if not [p for p in drawn if p is element]:
+                specs += polygonSpecs(element)
+    if len(specs) == 0 and isinstance(result, (gdspy.Polygon,
+                                                        gdspy.PolygonSet)):
+        specs = polygonSpecs(result)
+    name = func.__qualname__
+    stats = profileStats.get(name)
+    if stats is None:
+        stats = {'calls': 0, 'time': 0., 'polygons': 0, 'vertices': 0,
+                                                                'layers': {}}
+        profileStats[name] = stats
+    stats['calls'] += 1
+    stats['time'] += elapsed
+    for poly, spec in specs:
+        counts = stats['layers'].setdefault(tuple(spec), [0, 0])
+        counts[0] += 1
+        counts[1] += len(poly)
+        stats['polygons'] += 1
+        stats['vertices'] += len(poly)
+    return result
+
 class CPWPath:
     """ Create a new CPW object
     width - center conductor width
     gap - distance between center condctor and ground plane
     layer - specify layer of CPW object
     datatype -  GDS datatype (0-255)
+    offsetLayers - list of (layer, bias) or (layer, bias, datatype) derived
+        from the same route, see addOffsetLayer
+    lazy - only record the route and track its position, direction and length
+        analytically. Polygons are built at end() (see materialize)
+    deferBooleans - queue the boolean operations of openGapFillet on the
+        BooleanQueue of cellName instead of running them immediately
     """
-    def __init__(self, width, gap, layer = 0, datatype = 0, cellName = None):
+    def __init__(self, width, gap, layer = 0, datatype = 0, cellName = None,
+                    offsetLayers = None, lazy = False, deferBooleans = False):
+        self.deferBooleans = deferBooleans
         self.width = width
         self.gap = gap
+        self.startWidth = width
+        self.startGap = gap
+        # Recorded route, a list of (method name, arguments...)
+        self.ops = []
+        self.recordOps = True
+        self.lazy = lazy
+        # Analytic state of lazy routes
+        self.lazyPos = [0, 0]
+        self.lazyHeading = 0
+        self.lazyDirection = '+x'
+        self.lazyLength = 0
         self.initalDirection = '+x'
         self.initalOrientation = False
         self.path = None
         self.spec = {'layer': layer, 'datatype': datatype}
         self.cellName = cellName
+        self.offsetLayers = []
+        if offsetLayers is not None:
+            for offsetLayer in offsetLayers:
+                self.addOffsetLayer(*offsetLayer)
 
+    def addOffsetLayer(self, layer, bias, datatype = 0):
+        ### Derive a padding/clearance layer from the same route: a solid strip
+        ### covering the whole CPW (width + 2*gap) grown by bias on each side
+        ### Must be called before start()
+        self.offsetLayers.append({'spec': {'layer': layer, 'datatype': datatype},
+                                                    'bias': bias, 'path': None})
+
+    @profiled
     def start(self, start = [0, 0], direction = None):
         ### Start a CPW path specified by start coordinates and a direction
         ### direction: {+x, -x, +y, -y} or angle (in radians)
         if direction is not None:
             # Get direction from CPW class
             self.initalDirection = direction
+        self.startWidth = self.width
+        self.startGap = self.gap
+        self.record(('start', [start[0], start[1]], direction))
+        if self.lazy:
+            return
         # Define the distance
         d = self.width + self.gap
         self.path = gdspy.Path(self.gap,(start[0],start[1]),number_of_paths = 2,
                                                             distance=d)
+        for offset in self.offsetLayers:
+            offset['path'] = gdspy.Path(self.width + 2*self.gap
+                                    + 2*offset['bias'], (start[0], start[1]))
 
+    @profiled
     def end(self):
+        ### Adds the CPW to cellName. Lazy paths build their polygons here or
+        ### load them from the geometry cache (see setGeometryCache)
         cellName = self.cellName
+        if self.lazy and self.path is None:
+            key = self.cacheKey()
+            groups = None if key is None else geometryCache.get(key)
+            if groups is not None:
+                self.loadGroups(groups)
+            elif key is not None:
+                # Collect the pads openGapFillet adds while materializing
+                collector = CellCollector()
+                self.cellName = collector
+                self.materialize()
+                self.cellName = cellName
+                for element in collector.elements:
+                    cellName.add(element)
+                    updateIndex(cellName, element)
+                geometryCache.put(key, self.cacheGroups(collector.elements))
+            else:
+                self.materialize()
         cellName.add(self.path)
+        updateIndex(cellName, self.path)
+        for offset in self.offsetLayers:
+            cellName.add(offset['path'])
+            updateIndex(cellName, offset['path'])
         # addPolyToCell(gdspy.PolygonSet(self.path.polygons), cellName)
 
+    @profiled
     def straight(self, distance, widthEnd = None, gapEnd = None):
         ### Draw a straight CPW segment in the direction following the last path
         ### Tapers can be created by specifying a termination width and gap
+        self.record(('straight', distance, widthEnd, gapEnd))
+        if self.lazy:
+            return
         spec = self.spec
         if self.initalOrientation is False:
             direction = self.initalDirection
@@ -72,10 +270,17 @@ class CPWPath:
         distanceEnd = widthEnd + gapEnd
         # Add segment
         self.path.segment(distance, direction, final_distance = distanceEnd, final_width = gapEnd, **spec)
+        for offset in self.offsetLayers:
+            offset['path'].segment(distance, direction, final_width = widthEnd
+                            + 2*gapEnd + 2*offset['bias'], **offset['spec'])
 
+    @profiled
     def openGap(self, distance, widthEnd = None, gapEnd = None):
         ### Draw a straight CPW gap segment in the direction following the last path
         ### Tapers can be created by specifying a termination width and gap
+        self.record(('openGap', distance, widthEnd, gapEnd))
+        if self.lazy:
+            return
         if self.initalOrientation is False:
             direction = self.initalDirection
             self.initalOrientation = True
@@ -109,10 +314,17 @@ class CPWPath:
                                             final_width = totalWidthEnd/2, **spec)
         self.path.segment(-1E-9, direction, final_distance = distanceEnd,
                                             final_width = gapEnd, **spec)
+        for offset in self.offsetLayers:
+            offset['path'].segment(distance, direction, final_width
+                        = totalWidthEnd + 2*offset['bias'], **offset['spec'])
 
+    @profiled
     def openGapFillet(self, distance, gapType, filletRadius = 10, direction = None):
         ### Draw a straight CPW gap segment in the direction following the last path with a fillet
         ### Gap type is either 'beg' or 'end' to specify where fillet goes
+        self.record(('openGapFillet', distance, gapType, filletRadius, direction))
+        if self.lazy:
+            return
         gap = self.gap
         width = self.width
         spec = self.spec
@@ -136,18 +348,15 @@ class CPWPath:
         else:
             theta = direction
 
-        points = self.rectPathPivot(x, y, 0, distance, width + 2*gap, theta)
-        gapPoly = gdspy.Polygon(points, **spec)
-        gapPoly.fillet(filletRadius)
-
-        if gapType == 'beg':
-            points = self.rectPathPivot(x, y, distance - filletRadius, distance, width + 2*gap, theta)
-        elif gapType == 'end':
-            points = self.rectPathPivot(x, y, 0, filletRadius, width + 2*gap, theta)
-        gapPolyNoFillet = gdspy.Polygon(points, **spec)
-
-        union = gdspy.boolean([gapPolyNoFillet, gapPoly],
-            lambda gpnf, gp: gpnf or gp, **spec)
+        queue = booleanQueue(cellName) if self.deferBooleans else None
+        union = self.filletPad(x, y, distance, gapType, filletRadius,
+                                            width + 2*gap, theta, spec, queue)
+        for offset in self.offsetLayers:
+            pad = self.filletPad(x, y, distance, gapType, filletRadius,
+                width + 2*gap + 2*offset['bias'], theta, offset['spec'], queue)
+            if pad is not None:
+                cellName.add(pad)
+                updateIndex(cellName, pad)
 
         # Correct for path offset
         if direction == '+x':
@@ -165,6 +374,9 @@ class CPWPath:
         else:
             self.path.x  = x + sin(theta)*distance
             self.path.y  = y + cos(theta)*distance
+        for offset in self.offsetLayers:
+            offset['path'].x = self.path.x
+            offset['path'].y = self.path.y
 
         # Inner fillet position definitions
         if gapType == 'beg':
@@ -183,13 +395,38 @@ class CPWPath:
         elif gapType == 'end':
             points = self.rectPathPivot(x, y, filletRadius, 2*filletRadius, width, theta)
         rect = gdspy.Polygon(points, **spec)
+        if queue is not None:
+            queue.subtract(rect, rectMask, **spec)
+            return
         subtraction = gdspy.boolean([rectMask, rect],
             lambda rem, re: re and not rem, **spec)
 
         # Add polygons to cell
         cellName.add(subtraction)
         cellName.add(union)
+        updateIndex(cellName, subtraction)
+        updateIndex(cellName, union)
+
+    def filletPad(self, x, y, distance, gapType, filletRadius, totalWidth,
+                                                    theta, spec, queue = None):
+        ### Gap of a launch pad totalWidth wide with the end given by gapType
+        ### ('beg' or 'end') rounded by filletRadius
+        ### With a BooleanQueue the union is queued and None is returned
+        points = self.rectPathPivot(x, y, 0, distance, totalWidth, theta)
+        gapPoly = gdspy.Polygon(points, **spec)
+        gapPoly.fillet(filletRadius)
+
+        if gapType == 'beg':
+            points = self.rectPathPivot(x, y, distance - filletRadius, distance, totalWidth, theta)
+        elif gapType == 'end':
+            points = self.rectPathPivot(x, y, 0, filletRadius, totalWidth, theta)
+        gapPolyNoFillet = gdspy.Polygon(points, **spec)
 
+        if queue is not None:
+            queue.union([gapPolyNoFillet, gapPoly], **spec)
+            return None
+        return gdspy.boolean([gapPolyNoFillet, gapPoly],
+            lambda gpnf, gp: gpnf or gp, **spec)
 
     def rectPathPivot(self, x, y,start, stop, width, theta):
         # Create points for a polygon pivoted around the current path position (x,y)
@@ -205,13 +442,24 @@ class CPWPath:
         points = [(begLeftx, begLefty), (begRightx, begRighty), (endRightx, endRighty), (endLeftx, endLefty)]
         return points
 
-    def bend(self, radius, angle, widthEnd = None, gapEnd = None, bendPoints = 100):
+    @profiled
+    def bend(self, radius, angle, widthEnd = None, gapEnd = None, bendPoints = None):
         ### Add a CPW bend with specified angle and radius
         ### Use 'l' ('r') for right angle ccw (cw) turn
         ### Use 'll'('rr') for 180 degree ccw (cw) turn
         ### Specify widthEnd and gapEnd for a curved taper
-        ### Increase bend points for a smoother bend
+        ### Increase bend points for a smoother bend, by default it is picked
+        ### from the chip-wide arcTolerance (see setArcTolerance)
+        self.record(('bend', radius, angle, widthEnd, gapEnd, bendPoints))
+        if self.lazy:
+            return
         spec = self.spec
+        halfWidth = maximum(self.width, widthEnd or 0)/2. \
+                                            + maximum(self.gap, gapEnd or 0)
+        points = bendPoints
+        if bendPoints is None:
+            bendPoints = int(arcPoints(radius, bendAngle(angle), halfWidth))
+        countArcVertices(bendPoints)
         if widthEnd is None:
             # Get width from CPW class
             widthEnd = self.width
@@ -229,94 +477,1511 @@ class CPWPath:
         # Add turn to path
         self.path.turn(radius, angle, final_width = gapEnd,
             number_of_points = bendPoints, final_distance = distanceEnd, **spec)
+        for offset in self.offsetLayers:
+            if points is None:
+                bendPoints = int(arcPoints(radius, bendAngle(angle),
+                                            halfWidth + offset['bias']))
+            # One solid arc per padding layer
+            countArcVertices(bendPoints, 1)
+            offset['path'].turn(radius, angle, number_of_points = bendPoints,
+                final_width = widthEnd + 2*gapEnd + 2*offset['bias'],
+                                                        **offset['spec'])
 
+    @profiled
     def meander(self, lengthTotal, radius, straightLength, initialAngle = 'll'
-                                                            , bendPoints = 100):
-        spec = self.spec
-        prevLen = self.len()
-        while lengthTotal - (radius*pi + straightLength) > (self.len() - prevLen):
-            self.straight(straightLength)
-            self.bend(radius, initialAngle, bendPoints = bendPoints)
-            if initialAngle is 'll':
-                initialAngle = 'rr'
-            elif initialAngle is 'rr':
-                initialAngle = 'll'
-            elif initialAngle is 'l':
-                initialAngle = 'rr'
-            elif initialAngle is 'r':
-                initialAngle = 'll'
-            elif initialAngle % (2*pi) < pi:
-                initialAngle = 'rr'
-            elif initialAngle % (2*pi) > pi:
-                initialAngle = 'll'
+                                                            , bendPoints = None):
+        ### Draw a meander of total length lengthTotal from straight segments
+        ### and 180 degree bends. The number of turns, the tail straight and
+        ### the final partial arc are solved in closed form by meanderPlan,
+        ### then all segments are drawn in one batch
+        self.record(('meander', lengthTotal, radius, straightLength,
+                                                    initialAngle, bendPoints))
+        if self.lazy:
+            return
+        self.recordOps = False
+        for op in meanderPlan(lengthTotal, radius, straightLength, initialAngle):
+            if op[0] == 'straight':
+                self.straight(op[1])
             else:
-                initialAngle = 'll'
-        # The tail end of the meander
-        if (lengthTotal -  (self.len() - prevLen)) < straightLength:
-            # Not long enough to finish straight segment
-            self.straight(lengthTotal - (self.len() - prevLen))
-        else: # Can finish straight segment, need to end on a curve
-            self.straight(straightLength)
-            lastAngle = abs((lengthTotal - (self.len() - prevLen))/(radius)) # Angle needed for ending
-            if initialAngle is 'll':
-                lastAngle = lastAngle
-                self.bend(radius, lastAngle, bendPoints = bendPoints)
-            elif initialAngle is 'rr':
-                lastAngle = -lastAngle
-                self.bend(radius, lastAngle, bendPoints = bendPoints)
+                self.bend(op[1], op[2], bendPoints = bendPoints)
+        self.recordOps = True
+
+    def meanderBoundingBox(self, lengthTotal, radius, straightLength,
+                                                        initialAngle = 'll'):
+        ### Bounding box [[xmin, ymin], [xmax, ymax]] of the meander that
+        ### meander() would draw from the current position, including the gaps
+        ### Nothing is drawn
+        ops = meanderPlan(lengthTotal, radius, straightLength, initialAngle)
+        return routeBoundingBox(self.pos(), self.heading(), ops,
+                                                    self.width/2 + self.gap)
 
     def len(self):
         # Pass through length attribute from path object
+        if self.lazy:
+            return self.lazyLength
         return self.path.length
 
     def pos(self):
         # Pass through position attribute from path object
+        if self.lazy:
+            return list(self.lazyPos)
         return [self.path.x, self.path.y]
 
     def dir(self):
-        # Pass through direction attribute from path object
+        # Pass through direction attribute from path object, lazy routes
+        # follow it like gdspy would ({+x, -x, +y, -y} or angle in radians)
+        if self.lazy:
+            return self.lazyDirection
         return self.path.direction
 
-    def useAsMask(self, groundPlane = None):
+    def heading(self):
+        # Direction (in radians) the next segment will be drawn in
+        if self.lazy and self.initalOrientation:
+            return self.lazyHeading
+        if self.initalOrientation is False:
+            return directionToAngle(self.initalDirection)
+        return directionToAngle(self.path.direction)
+
+    @profiled
+    def useAsMask(self, groundPlane = None, tileSize = None, processes = None):
         ### Generates metal from groundPlane using CPW as a negative mask
         ### Make a fake 1000x1000 at origin ground plane if none given
+        ### Give tileSize to subtract tile by tile in parallel (see tiledMask)
         ### Returns resulting object
+        if self.lazy and self.path is None:
+            self.materialize()
         spec = self.spec
         if groundPlane is None:
             groundPlane = gdspy.Rectangle((-500, -500), (500, 500), 0)
         # Create a PolygonSet from CPW path
         cpwPolySet = self.makePolySet(self.path)
+        if tileSize is not None:
+            return tiledMask(cpwPolySet, groundPlane, tileSize,
+                                                    processes = processes, **spec)
         # Apply boolean operation
         return gdspy.boolean([groundPlane, cpwPolySet],
             lambda groundPlane, cpwPolySet: groundPlane and not cpwPolySet, **spec)
 
+    def collisions(self, distance = 0, layers = None):
+        ### Ids of the polygons in the SpatialIndex of the cell closer than
+        ### distance to this CPW (check before end() so it does not find
+        ### itself), e.g. a new resonator against the feedline on layer 5
+        if self.lazy and self.path is None:
+            self.materialize()
+        index = spatialIndex(self.cellName)
+        ids = []
+        for poly in self.path.polygons:
+            ids.extend(index.queryPolygon(poly, distance, layers))
+        return unique(array(ids, dtype = int))
+
+    def record(self, op):
+        ### Adds an operation to the recorded route. Lazy routes also advance
+        ### their position, direction and length analytically
+        if not self.recordOps:
+            return
+        self.ops.append(op)
+        if not self.lazy:
+            return
+        if op[0] == 'start':
+            self.lazyPos = list(op[1])
+            self.lazyLength = 0
+            self.lazyDirection = '+x'
+            self.lazyHeading = 0
+        elif op[0] in ('straight', 'openGap'):
+            self.advance([('straight', op[1])])
+            self.width = self.width if op[2] is None else op[2]
+            self.gap = self.gap if op[3] is None else op[3]
+        elif op[0] == 'bend':
+            self.advance([('bend', op[1], op[2])])
+            self.width = self.width if op[3] is None else op[3]
+            self.gap = self.gap if op[4] is None else op[4]
+        elif op[0] == 'meander':
+            self.advance(meanderPlan(op[1], op[2], op[3], op[4]))
+        elif op[0] == 'openGapFillet':
+            direction = op[4]
+            if direction is None and op[2] == 'beg':
+                direction = self.initalDirection
+            elif direction is None:
+                direction = self.lazyDirection
+            theta = directionToAngle(direction)
+            if isinstance(direction, str):
+                self.lazyPos[0] += cos(theta)*op[1]
+                self.lazyPos[1] += sin(theta)*op[1]
+            else:
+                # Same offset as openGapFillet for angles
+                self.lazyPos[0] += sin(theta)*op[1]
+                self.lazyPos[1] += cos(theta)*op[1]
+
+    def advance(self, ops):
+        ### Moves the analytic position and direction of a lazy route along
+        ### ('straight', length) and ('bend', radius, angle) operations
+        for op in ops:
+            if op[0] == 'straight' and not self.initalOrientation:
+                # Like straight(), the first straight takes the initial
+                # direction, bends before it turn from gdspy's +x
+                self.lazyDirection = self.initalDirection
+                self.lazyHeading = directionToAngle(self.initalDirection)
+                self.initalOrientation = True
+            if op[0] == 'straight':
+                self.lazyPos[0] += cos(self.lazyHeading)*op[1]
+                self.lazyPos[1] += sin(self.lazyHeading)*op[1]
+                self.lazyLength += op[1]
+            else:
+                radius = op[1]
+                angle = bendAngle(op[2])
+                turn = 1 if angle > 0 else -1
+                theta = self.lazyHeading
+                self.lazyPos[0] += turn*radius*(sin(theta + angle) - sin(theta))
+                self.lazyPos[1] += turn*radius*(cos(theta) - cos(theta + angle))
+                self.lazyHeading = theta + angle
+                self.lazyDirection = turnDirection(self.lazyDirection, op[2])
+                self.lazyLength += abs(angle)*radius
+
+    @profiled
+    def materialize(self):
+        ### Builds the polygons of a lazy route by drawing its recorded
+        ### operations. The path is no longer lazy afterwards
+        ops = self.ops
+        self.ops = []
+        self.lazy = False
+        self.width = self.startWidth
+        self.gap = self.startGap
+        self.initalOrientation = False
+        for op in ops:
+            getattr(self, op[0])(*op[1:])
+
+    def replay(self, width = None, gap = None, layer = None, datatype = None,
+                offset = [0, 0], cellName = None, offsetLayers = None,
+                                                                lazy = False):
+        ### Returns a new CPWPath following the recorded route with another
+        ### start width, gap, layer, datatype, offset or padding layers
+        ### Tapers keep the end widths and gaps they were recorded with
+        if width is None:
+            width = self.startWidth
+        if gap is None:
+            gap = self.startGap
+        if layer is None:
+            layer = self.spec['layer']
+        if datatype is None:
+            datatype = self.spec['datatype']
+        if cellName is None:
+            cellName = self.cellName
+        if offsetLayers is None:
+            offsetLayers = [(o['spec']['layer'], o['bias'], o['spec']['datatype'])
+                                                    for o in self.offsetLayers]
+        cpw = CPWPath(width, gap, layer, datatype, cellName, offsetLayers, lazy)
+        for op in self.ops:
+            if op[0] == 'start':
+                cpw.start([op[1][0] + offset[0], op[1][1] + offset[1]], op[2])
+            else:
+                getattr(cpw, op[0])(*op[1:])
+        return cpw
+
+    def cacheKey(self):
+        ### Geometry cache key of the recorded route: operations, start width
+        ### and gap, layers, bend settings and library versions. None when no
+        ### cache is set or booleans are deferred (their results are not part
+        ### of the path)
+        if geometryCache is None or self.deferBooleans:
+            return None
+        return geometryCache.key({'version': geometryVersion,
+            'gdspy': gdspy.__version__, 'width': self.startWidth,
+            'gap': self.startGap, 'spec': [self.spec['layer'],
+            self.spec['datatype']], 'offsets': [[o['spec']['layer'],
+            o['spec']['datatype'], o['bias']] for o in self.offsetLayers],
+            'arcs': [arcTolerance, arcFixedPoints], 'ops': self.ops})
+
+    def cacheGroups(self, extras):
+        ### Polygons of the path, its offset layers and the extra objects it
+        ### added to the cell as (kind, layer, datatype, polygons) groups
+        groups = []
+        parts = [('path', self.path)]
+        parts += [('offset', o['path']) for o in self.offsetLayers]
+        parts += [('extra', obj) for obj in extras]
+        for kind, obj in parts:
+            bySpec = {}
+            for poly, spec in polygonSpecs(obj):
+                bySpec.setdefault(spec, []).append(poly)
+            for spec, polys in bySpec.items():
+                groups.append((kind, spec[0], spec[1], polys))
+        return groups
+
+    def loadGroups(self, groups):
+        ### Inverse of cacheGroups: the path and offset layers become
+        ### PolygonSets and the extra polygons are added to the cell
+        path = []
+        offsets = []
+        for kind, layer, datatype, polys in groups:
+            polySet = gdspy.PolygonSet(polys, layer, datatype)
+            if kind == 'path':
+                path.append(polySet)
+            elif kind == 'offset':
+                offsets.append(polySet)
+            else:
+                self.cellName.add(polySet)
+                updateIndex(self.cellName, polySet)
+        self.path = gdspy.PolygonSet([], **self.spec)
+        for polySet in path:
+            self.path.polygons += polySet.polygons
+            self.path.layers += polySet.layers
+            self.path.datatypes += polySet.datatypes
+        for offset in self.offsetLayers:
+            offset['path'] = gdspy.PolygonSet([], **offset['spec'])
+        for polySet in offsets:
+            for offset in self.offsetLayers:
+                if offset['spec']['layer'] == polySet.layers[0] and \
+                        offset['spec']['datatype'] == polySet.datatypes[0]:
+                    offset['path'].polygons += polySet.polygons
+                    offset['path'].layers += polySet.layers
+                    offset['path'].datatypes += polySet.datatypes
+                    break
+
     def makePolySet(self, path):
         ### Converts a path object to a polyset object
         return gdspy.PolygonSet(self.path.polygons)
 
 
+class CellCollector:
+    """ Stand-in for a cell that only keeps the elements added to it
+    Used to find what a CPWPath adds to its cell while it is drawn
+    """
+    def __init__(self):
+        self.name = None
+        self.elements = []
+
+    def add(self, element):
+        self.elements.append(element)
+
+# Routes of lazyMismatches covering every operation: axis and angle starts,
+# exact and numeric bends, tapers, openGap, meanders and openGapFillet with
+# given, initial and followed directions
+lazyCheckRoutes = [
+    [('start', [0, 0], '+y'), ('straight', 100, None, None),
+     ('bend', 50, 'l', None, None, None), ('straight', 20, 8, 4),
+     ('bend', 50, 'rr', 12, 6, None), ('openGap', 30, None, None),
+     ('openGapFillet', 150, 'end', 10, None)],
+    [('start', [10, -5], None), ('openGapFillet', 150, 'beg', 10, None),
+     ('straight', 100, None, None), ('bend', 80, pi/4, None, None, None),
+     ('straight', 50, None, None), ('openGapFillet', 150, 'end', 10, None)],
+    [('start', [0, 0], pi/6), ('straight', 100, None, None),
+     ('bend', 40, 'r', None, None, None), ('openGap', 20, 14, 8),
+     ('openGapFillet', 150, 'end', 10, '-x'),
+     ('openGapFillet', 150, 'end', 10, pi/3)],
+    [('start', [0, 0], '-x'), ('bend', 30, 'l', None, None, None),
+     ('straight', 60, None, None), ('bend', 30, -pi/2, None, None, None),
+     ('meander', 2500, 50, 200, 'll', None),
+     ('openGapFillet', 150, 'end', 10, None)],
+    [('start', [0, 0], '+x'), ('straight', 100, None, None),
+     ('meander', 1800, 40, 150, 'rr', None), ('straight', 10, None, None),
+     ('bend', 40, 'll', None, None, None)],
+]
+
+def lazyMismatches(ops, width = 10, gap = 6, tolerance = 1e-6):
+    ### Draws a recorded route (ops of CPWPath.ops) eagerly and lazily and
+    ### compares pos() and dir() after every operation
+    ### Returns [(index, op, eager (pos, dir), lazy (pos, dir))] of the
+    ### operations after which they differ
+    saved = dict(arcStats)
+    eager = CPWPath(width, gap, cellName = CellCollector())
+    lazy = CPWPath(width, gap, cellName = CellCollector(), lazy = True)
+    mismatches = []
+    for i, op in enumerate(ops):
+        for cpw in (eager, lazy):
+            getattr(cpw, op[0])(*op[1:])
+        one = (eager.pos(), eager.dir())
+        two = (lazy.pos(), lazy.dir())
+        same = hypot(one[0][0] - two[0][0], one[0][1] - two[0][1]) < tolerance
+        if isinstance(one[1], str) or isinstance(two[1], str):
+            same = same and one[1] == two[1]
+        else:
+            turn = (one[1] - two[1]) % (2*pi)
+            same = same and minimum(turn, 2*pi - turn) < tolerance
+        if not same:
+            mismatches.append((i, op, one, two))
+    arcStats.update(saved)
+    return mismatches
+
+def checkLazy(routes = None, printReport = True):
+    ### lazyMismatches of every route (lazyCheckRoutes by default)
+    ### Returns the number of mismatches
+    if routes is None:
+        routes = lazyCheckRoutes
+    count = 0
+    for k, ops in enumerate(routes):
+        for i, op, one, two in lazyMismatches(ops):
+            count += 1
+            if printReport:
+                print('route %d op %d %s: eager %s %s, lazy %s %s' % (k, i,
+                                op[0], one[0], one[1], two[0], two[1]))
+    if printReport:
+        print('%d mismatches in %d routes' % (count, len(routes)))
+    return count
+
+def directionToAngle(direction):
+    ### Converts a direction {+x, -x, +y, -y} or angle (in radians) to radians
+    if direction == '+x':
+        return 0
+    elif direction == '+y':
+        return pi/2
+    elif direction == '-x':
+        return pi
+    elif direction == '-y':
+        return -pi/2
+    return direction
+
+def turnDirection(direction, angle):
+    ### Direction of a gdspy.Path after turn(): stays one of {+x, -x, +y, -y}
+    ### for a {l, r, ll, rr} turn from one of them, an angle otherwise
+    if isinstance(direction, str) and isinstance(angle, str):
+        return ['+x', '+y', '-x', '-y'][int(round((directionToAngle(direction)
+                                        + bendAngle(angle))/(pi/2))) % 4]
+    return directionToAngle(direction) + bendAngle(angle)
+
+def bendAngle(angle):
+    ### Converts a bend angle {l, r, ll, rr} or angle (in radians) to radians
+    ### Positive angles are ccw turns
+    if angle == 'l':
+        return pi/2
+    elif angle == 'r':
+        return -pi/2
+    elif angle == 'll':
+        return pi
+    elif angle == 'rr':
+        return -pi
+    return angle
+
+def meanderPlan(lengthTotal, radius, straightLength, initialAngle = 'll'):
+    ### Solves a meander of total length lengthTotal in closed form
+    ### Returns the segments as a list of operations
+    ### ('straight', length) and ('bend', radius, angle)
+    ### The first turn uses initialAngle, the following full turns alternate
+    ### between 'rr' and 'll', and the meander ends on a straight shorter than
+    ### straightLength or on a partial arc, also when initialAngle is 'l',
+    ### 'r' or an angle and there is no full turn (the arc used to be dropped)
+    turnLength = radius*pi + straightLength
+    firstLength = radius*abs(bendAngle(initialAngle)) + straightLength
+    # Sign of the first turn, +1 for ccw
+    if initialAngle in ('ll', 'l'):
+        sign = 1
+    elif initialAngle in ('rr', 'r'):
+        sign = -1
+    elif initialAngle % (2*pi) < pi:
+        sign = 1
+    else:
+        sign = -1
+    # Number of full turns that fit before the tail
+    if lengthTotal - turnLength > 0:
+        nTurns = 1 + int(ceil(maximum(0, lengthTotal - turnLength
+                                                - firstLength)/turnLength))
+        lengthSoFar = firstLength + (nTurns - 1)*turnLength
+    else:
+        nTurns = 0
+        lengthSoFar = 0
+    ops = []
+    for i in range(nTurns):
+        ops.append(('straight', straightLength))
+        if i == 0:
+            ops.append(('bend', radius, initialAngle))
+        elif sign*(-1)**i > 0:
+            ops.append(('bend', radius, 'll'))
+        else:
+            ops.append(('bend', radius, 'rr'))
+    # The tail end of the meander
+    lengthLeft = lengthTotal - lengthSoFar
+    if lengthLeft < straightLength:
+        # Not long enough to finish straight segment
+        ops.append(('straight', lengthLeft))
+    else: # Can finish straight segment, need to end on a curve
+        ops.append(('straight', straightLength))
+        lastAngle = abs((lengthLeft - straightLength)/radius)
+        if lastAngle > 0:
+            ops.append(('bend', radius, sign*(-1)**nTurns*lastAngle))
+    return ops
+
+def meanderExtent(lengthTotal, radius, straightLength, halfWidth = 0):
+    ### Size (along, across) of the meander meanderPlan draws with
+    ### initialAngle 'll' or 'rr': along the first straight and across the
+    ### turns, including halfWidth on each side. Works on arrays, nothing is
+    ### drawn
+    lengthTotal, radius, straightLength, halfWidth = [asarray(v, dtype = float)
+            for v in (lengthTotal, radius, straightLength, halfWidth)]
+    turnLength = pi*radius + straightLength
+    nTurns = where(lengthTotal - turnLength > 0, 1 + ceil(maximum(0,
+                    lengthTotal - 2*turnLength)/turnLength), 0)
+    lengthLeft = lengthTotal - nTurns*turnLength
+    tailStraight = minimum(lengthLeft, straightLength)
+    tailAngle = where(lengthLeft < straightLength, 0,
+                                    (lengthLeft - straightLength)/radius)
+    # The tail runs forward after an even number of turns, back otherwise,
+    # and may end on an arc of up to pi
+    reach = tailStraight + (radius + halfWidth)*sin(minimum(tailAngle, pi/2))
+    even = nTurns % 2 == 0
+    low = minimum(where(nTurns >= 2, -radius - halfWidth, 0),
+                                where(even, 0, straightLength - reach))
+    high = maximum(where(nTurns >= 1, straightLength + radius + halfWidth, 0),
+                                where(even, reach, straightLength))
+    c = cos(tailAngle)
+    top = 2*radius*nTurns + maximum(halfWidth,
+                                    radius*(1 - c) + halfWidth*abs(c))
+    return high - low, top + halfWidth
+
+def solveMeanders(lengthTotal, footprint, halfWidth, radii = None,
+                    minStraight = 50, straightSteps = 8, minSpacing = 0):
+    ### Meander parameters fitting every target length in its footprint
+    ### lengthTotal - [N] meander lengths, footprint - [N][2] (along, across)
+    ### sizes available (see meanderExtent), halfWidth - width/2 + gap
+    ### radii - candidate bend radii (default 20 to 300 in steps of 10),
+    ### minSpacing - smallest ground between neighbouring straights
+    ### All candidates (radius, straightLength) are checked at once with
+    ### meanderExtent. The largest radius that fits is chosen, then the
+    ### longest straight
+    ### Returns a dictionary of [N] arrays: radius, straightLength, turns,
+    ### tailStraight, tailAngle, along, across and fits (False where nothing
+    ### fits, the other values are then those of the smallest candidate)
+    lengthTotal = atleast_1d(asarray(lengthTotal, dtype = float))
+    footprint = asarray(footprint, dtype = float).reshape(-1, 2)
+    lengthTotal, along, across, halfWidth = broadcast_arrays(lengthTotal,
+                        footprint[:, 0], footprint[:, 1], halfWidth)
+    if radii is None:
+        radii = arange(20, 301, 10)
+    radii = asarray(radii, dtype = float)
+    # Candidates [N][radius][straight], straights up to the longest that
+    # fits along
+    r = radii[newaxis, :, newaxis]
+    longest = along[:, newaxis] - 2*halfWidth[:, newaxis] - 2*radii
+    steps = linspace(1, minStraight/maximum(longest, minStraight),
+                                                straightSteps, axis = -1)
+    straight = maximum(longest, minStraight)[:, :, newaxis]*steps
+    longest = longest[:, :, newaxis]
+    sizeAlong, sizeAcross = meanderExtent(lengthTotal[:, newaxis, newaxis],
+                            r, straight, halfWidth[:, newaxis, newaxis])
+    fits = (sizeAlong <= along[:, newaxis, newaxis] + 1e-9) \
+            & (sizeAcross <= across[:, newaxis, newaxis] + 1e-9) \
+            & (longest >= minStraight) \
+            & (2*r - 2*halfWidth[:, newaxis, newaxis] >= minSpacing)
+    # Flattened candidate order: larger radius first, then longer straight
+    nRadii = len(radii)
+    order = (nRadii - 1 - arange(nRadii))[:, newaxis]*straightSteps \
+                                                    + arange(straightSteps)
+    rank = where(fits, order[newaxis], nRadii*straightSteps)
+    best = rank.reshape(len(lengthTotal), -1).argmin(axis = 1)
+    i, j = best//straightSteps, best % straightSteps
+    rows = arange(len(lengthTotal))
+    found = fits[rows, i, j]
+    # Smallest radius and straight when nothing fits
+    i = where(found, i, 0)
+    j = where(found, j, straightSteps - 1)
+    radius = radii[i]
+    straightLength = straight[rows, i, j]
+    sizeAlong, sizeAcross = meanderExtent(lengthTotal, radius,
+                                                straightLength, halfWidth)
+    turnLength = pi*radius + straightLength
+    turns = where(lengthTotal - turnLength > 0, 1 + ceil(maximum(0,
+                lengthTotal - 2*turnLength)/turnLength), 0).astype(int)
+    lengthLeft = lengthTotal - turns*turnLength
+    return {'radius': radius, 'straightLength': straightLength,
+            'turns': turns, 'tailStraight': minimum(lengthLeft, straightLength),
+            'tailAngle': where(lengthLeft < straightLength, 0,
+                                    (lengthLeft - straightLength)/radius),
+            'along': sizeAlong, 'across': sizeAcross, 'fits': found}
+
+def meanderArguments(solution, i, initialAngle = 'll'):
+    ### Arguments (radius, straightLength, initialAngle) of CPWPath.meander
+    ### for resonator i of a solveMeanders solution
+    return float(solution['radius'][i]), \
+                float(solution['straightLength'][i]), initialAngle
+
+def routeBoundingBox(start, direction, ops, halfWidth = 0):
+    ### Bounding box [[xmin, ymin], [xmax, ymax]] of a route given as a list
+    ### of ('straight', length) and ('bend', radius, angle) operations
+    ### starting at start towards direction (see directionToAngle)
+    ### halfWidth is half of the full CPW width (width/2 + gap)
+    x, y = start
+    theta = directionToAngle(direction)
+    xs = [x - sin(theta)*halfWidth, x + sin(theta)*halfWidth]
+    ys = [y + cos(theta)*halfWidth, y - cos(theta)*halfWidth]
+    for op in ops:
+        if op[0] == 'straight':
+            x = x + cos(theta)*op[1]
+            y = y + sin(theta)*op[1]
+        else:
+            radius = op[1]
+            angle = bendAngle(op[2])
+            turn = 1 if angle > 0 else -1
+            cx = x - turn*sin(theta)*radius
+            cy = y + turn*cos(theta)*radius
+            phi0 = theta - turn*pi/2
+            phi1 = phi0 + angle
+            # Extreme points of the outer edge of the arc along the axes
+            quarters = arange(ceil(minimum(phi0, phi1)/(pi/2)),
+                                floor(maximum(phi0, phi1)/(pi/2)) + 1)*pi/2
+            xs.extend(cx + (radius + halfWidth)*cos(quarters))
+            ys.extend(cy + (radius + halfWidth)*sin(quarters))
+            theta = theta + angle
+            x = cx + radius*cos(phi1)
+            y = cy + radius*sin(phi1)
+        xs.extend([x - sin(theta)*halfWidth, x + sin(theta)*halfWidth])
+        ys.extend([y + cos(theta)*halfWidth, y - cos(theta)*halfWidth])
+    return [[min(xs), min(ys)], [max(xs), max(ys)]]
+
+def setArcTolerance(tolerance, fixedPoints = 100):
+    ### Sets the chip-wide maximum sagitta (distance between an arc and its
+    ### chords, same units as the layout) used to pick the number of points
+    ### of every bend from its radius and angle
+    ### tolerance None goes back to fixedPoints points per bend polygon
+    global arcTolerance, arcFixedPoints
+    arcTolerance = tolerance
+    arcFixedPoints = fixedPoints
+    resetArcReport()
+
+def arcPoints(radius, angle, halfWidth = 0, tolerance = None,
+                                                        maxPoints = 199):
+    ### Number of points of a CPW bend polygon (both edges) so that its outer
+    ### edge, at radius + halfWidth, stays within tolerance of the true arc
+    ### once split in pieces of at most maxPoints points (see arcPieces)
+    ### Works on arrays. Uses arcTolerance if tolerance is not given
+    if tolerance is None:
+        tolerance = arcTolerance
+    if tolerance is None:
+        return full(shape(radius), arcFixedPoints, dtype = int) \
+                            if ndim(radius) else arcFixedPoints
+    outer = asarray(radius) + asarray(halfWidth)
+    # Largest angle a single chord may span
+    step = 2*arccos(clip(1 - tolerance/outer, -1, 1))
+    segments = maximum(ceil(abs(asarray(angle))/step), 1).astype(int)
+    # Spread the segments over the fewest equal pieces that fit maxPoints,
+    # so that splitting the polygon does not drop any of them
+    pieces = ceil(segments/float(maxPoints//2 - 1))
+    return (2*pieces*(ceil(segments/pieces) + 1)).astype(int)
+
+def arcPieces(points, maxPoints = 199):
+    ### Polygons and points per polygon of an arc of points points, split
+    ### like gdspy.Path.arc does past maxPoints. Works on arrays
+    points = maximum(asarray(points), 3)
+    pieces = ceil(points/float(maxPoints)).astype(int)
+    return pieces, points//pieces
+
+def countArcVertices(bendPoints, paths = 2):
+    ### Adds the polygons and vertices of bends drawn with bendPoints points
+    ### (one number or one per bend) and paths gap arcs each to arcStats
+    pieces, points = arcPieces(bendPoints)
+    fixedPieces, fixedPoints = arcPieces(arcFixedPoints)
+    arcStats['bends'] += int(paths*sum(pieces))
+    arcStats['vertices'] += int(paths*sum(pieces*points))
+    arcStats['fixedVertices'] += int(paths*size(pieces)*fixedPieces*fixedPoints)
+
+def setGeometryCache(cache):
+    ### Sets the cache lazy CPWPaths load their polygons from at end(), a
+    ### gdsCache.GeometryCache or None to build everything
+    global geometryCache
+    geometryCache = cache
+
+def arcReport(printReport = True):
+    ### Vertices used by bend polygons since the last reset, compared to
+    ### drawing them all with arcFixedPoints points
+    report = dict(arcStats)
+    report['saved'] = report['fixedVertices'] - report['vertices']
+    if printReport:
+        print('Bend polygons: %d, vertices: %d (%d with %d points per bend), '
+              'saved: %d' % (report['bends'], report['vertices'],
+              report['fixedVertices'], arcFixedPoints, report['saved']))
+    return report
+
+def resetArcReport():
+    ### Clears the bend vertex counters
+    for key in arcStats:
+        arcStats[key] = 0
+
+def setProfiling(on = True):
+    ### Turns the per-primitive counters on or off (see profileReport)
+    global profiling
+    profiling = on
+
+def resetProfile():
+    ### Clears the per-primitive counters
+    profileStats.clear()
+
+def profileReport(printReport = True, byLayer = False):
+    ### Calls, time, polygons and vertices per primitive since the last
+    ### reset, slowest first, optionally split by (layer, datatype)
+    ### Returns the lines of the table
+    lines = ['%-30s %8s %10s %10s %12s' % ('primitive', 'calls', 'time [s]',
+                                                    'polygons', 'vertices')]
+    for name, stats in sorted(profileStats.items(),
+                                        key = lambda item: -item[1]['time']):
+        lines.append('%-30s %8d %10.4f %10d %12d' % (name, stats['calls'],
+                    stats['time'], stats['polygons'], stats['vertices']))
+        if byLayer:
+            for spec, counts in sorted(stats['layers'].items()):
+                lines.append('%-30s %8s %10s %10d %12d' % ('  layer %d/%d'
+                                % spec, '', '', counts[0], counts[1]))
+    if printReport:
+        for line in lines:
+            print(line)
+    return lines
+
+def profileJSON(filename = None):
+    ### Per-primitive counters as a JSON-ready dictionary, written to
+    ### filename if given
+    data = {}
+    for name, stats in profileStats.items():
+        data[name] = dict(stats)
+        data[name]['layers'] = dict(('%d/%d' % spec, {'polygons': counts[0],
+                    'vertices': counts[1]}) for spec, counts
+                                                    in stats['layers'].items())
+    if filename is not None:
+        with open(filename, 'w') as f:
+            json.dump(data, f, indent = 1, sort_keys = True)
+    return data
+
+# Segment kinds used by the batch route functions
+STRAIGHT = 0
+BEND = 1
+OPENGAP = 2
+
+def quarterWaveLength(frequency, er = 11.9):
+    ### Length (in um) of a lambda/4 resonator at frequency (in Hz)
+    ### ereff = (1 + er)/2, [1] Eq. 2.30 in the dated scripts
+    ### [1] Coplanar Waveguide Circuits, Components, and Systems by Rainee Simons
+    c = 3E8
+    ereff = (1 + er)/2.
+    return c/sqrt(ereff)/4./asarray(frequency)*1E6
+
+def batchRoute(origins, headings, owner, kinds, lengths, radii, angles,
+                                            widths, gaps, bendPoints = None):
+    ### Computes the polygons of many CPW routes at once
+    ### Every segment of every route is one row of a segment table:
+    ###   owner - index of the route the segment belongs to (grouped, in order)
+    ###   kinds - STRAIGHT, BEND or OPENGAP
+    ###   lengths - length of STRAIGHT and OPENGAP segments
+    ###   radii, angles - radius and angle (in radians, ccw positive) of bends
+    ### origins ([N][2]), headings (radians), widths and gaps are per route
+    ### bendPoints is per segment, None picks it from arcTolerance
+    ### Positions and directions are found with cumulative sums over the table
+    ### and segments of the same kind are built as stacked arrays
+    ### Returns the list of polygons and the [N][2] end points of the routes
+    owner = asarray(owner)
+    kinds = asarray(kinds)
+    lengths = broadcast_to(asarray(lengths, dtype = float), kinds.shape)
+    radii = broadcast_to(asarray(radii, dtype = float), kinds.shape)
+    angles = where(kinds == BEND, asarray(angles, dtype = float), 0)
+    origins = asarray(origins, dtype = float).reshape(-1, 2)
+    nRoutes = len(origins)
+    # First segment of every route
+    first = minimum(searchsorted(owner, arange(nRoutes)), len(owner) - 1)
+    # Direction at the start of every segment
+    turned = cumsum(angles) - angles
+    heading = broadcast_to(asarray(headings, dtype = float), nRoutes)[owner] \
+                                        + turned - turned[first][owner]
+    # Displacement of every segment, then start points
+    turn = sign(angles)
+    dx = where(kinds == BEND, turn*radii*(sin(heading + angles) - sin(heading)),
+                                                        lengths*cos(heading))
+    dy = where(kinds == BEND, turn*radii*(cos(heading) - cos(heading + angles)),
+                                                        lengths*sin(heading))
+    moved = transpose([cumsum(dx) - dx, cumsum(dy) - dy])
+    points = origins[owner] + moved - moved[first][owner]
+    ends = origins + transpose([bincount(owner, dx, nRoutes),
+                                bincount(owner, dy, nRoutes)])
+    width = broadcast_to(asarray(widths, dtype = float), nRoutes)[owner]
+    gap = broadcast_to(asarray(gaps, dtype = float), nRoutes)[owner]
+    polygons = []
+    # Open gaps are a single rectangle of the full CPW width
+    sel = kinds == OPENGAP
+    polygons.extend(stripPolygons(points[sel], heading[sel], lengths[sel],
+                            zeros(sel.sum()), width[sel]/2 + gap[sel]))
+    # Straights are two gap strips on either side of the center conductor
+    sel = kinds == STRAIGHT
+    for side in (-1, 1):
+        polygons.extend(stripPolygons(points[sel], heading[sel], lengths[sel],
+                side*(width[sel] + gap[sel])/2, gap[sel]/2))
+    # Bends are two gap arcs, stacked by point count
+    sel = kinds == BEND
+    if bendPoints is None:
+        bendPoints = arcPoints(radii[sel], angles[sel], width[sel]/2 + gap[sel])
+    else:
+        bendPoints = broadcast_to(bendPoints, kinds.shape)[sel]
+    countArcVertices(bendPoints)
+    for n in unique(bendPoints):
+        pick = bendPoints == n
+        for side in (-1, 1):
+            polygons.extend(arcPolygons(points[sel][pick], heading[sel][pick],
+                radii[sel][pick], angles[sel][pick],
+                side*(width[sel][pick] + gap[sel][pick])/2,
+                gap[sel][pick]/2, int(n)))
+    return polygons, ends
+
+def stripPolygons(points, headings, lengths, offsets, halfWidths):
+    ### Stacked rectangles starting at points towards headings, shifted to the
+    ### right of the axis by offsets. Returns an array [K][4][2]
+    ### Vertex order follows gdspy.Path.segment
+    along = transpose([cos(headings), sin(headings)])
+    right = transpose([sin(headings), -cos(headings)])
+    ends = points + lengths[:, newaxis]*along
+    inner = (offsets - halfWidths)[:, newaxis]*right
+    outer = (offsets + halfWidths)[:, newaxis]*right
+    return stack([points + inner, points + outer, ends + outer, ends + inner],
+                                                                        axis = 1)
+
+def arcPolygons(points, headings, radii, angles, offsets, halfWidths,
+                                                bendPoints, maxPoints = 199):
+    ### Stacked arc polygons of bends starting at points towards headings
+    ### offsets shift the arc radially from radii (positive is outwards)
+    ### Returns a list of [bendPoints][2] arrays, bends with more than
+    ### maxPoints points are split in pieces like gdspy.Path.arc does
+    turn = sign(angles)
+    centerx = points[:, 0] - turn*sin(headings)*radii
+    centery = points[:, 1] + turn*cos(headings)*radii
+    phi0 = headings - turn*pi/2
+    pieces = int(ceil(bendPoints/float(maxPoints)))
+    bendPoints = bendPoints//pieces
+    nOuter = bendPoints - bendPoints//2
+    nInner = bendPoints//2
+    radius = radii + offsets
+    polygons = []
+    for j in range(pieces):
+        beg = phi0 + angles*j/pieces
+        end = phi0 + angles*(j + 1)/pieces
+        phi = concatenate([beg[:, newaxis] + (end - beg)[:, newaxis]
+                                                * linspace(0, 1, nOuter),
+                           end[:, newaxis] + (beg - end)[:, newaxis]
+                                                * linspace(0, 1, nInner)], axis = 1)
+        rad = concatenate([repeat((radius + halfWidths)[:, newaxis],
+                                                            nOuter, axis = 1),
+                           repeat((radius - halfWidths)[:, newaxis],
+                                                            nInner, axis = 1)],
+                                                                    axis = 1)
+        polygons.extend(stack([centerx[:, newaxis] + rad*cos(phi),
+                               centery[:, newaxis] + rad*sin(phi)], axis = 2))
+    return polygons
+
+@profiled
+def resonatorArray(cellName, frequencies, widths, gaps, capDist, origins,
+            orientations = '+y', er = 11.9, cpwSrtExtend = 200, bendRad = 150,
+            straightLength = 500, bendDir = 'r', meanderDir = 'll',
+            layer = 6, datatype = 0, bendPoints = None, lengths = None):
+    ### Builds a whole array of lambda/4 resonators in one call
+    ### Each resonator follows the dated scripts:
+    ###   openGap(gap), straight(capDist), bend(bendRad, bendDir),
+    ###   straight(cpwSrtExtend), bend(bendRad, bendDir),
+    ###   meander(rest, bendRad, straightLength, meanderDir)
+    ### frequencies, widths, gaps, capDist (coupling distance), origins [N][2],
+    ### orientations, bendDir and meanderDir are broadcast against each other
+    ### lengths - resonator lengths (e.g. from gdsCPW.resonatorLength), used
+    ### instead of quarterWaveLength(frequencies, er) if given
+    ### The resonators are added to cellName as one PolygonSet, which is
+    ### returned
+    if lengths is None:
+        lengths = quarterWaveLength(frequencies, er)
+    frequencies, widths, gaps, capDist, x, y, bendRad, straightLength, \
+        lengths = broadcast_arrays(frequencies, widths, gaps, capDist,
+            asarray(origins, dtype = float)[..., 0],
+            asarray(origins, dtype = float)[..., 1], bendRad, straightLength,
+                                                                    lengths)
+    nRes = frequencies.size
+    frequencies, widths, gaps, capDist, x, y, bendRad, straightLength, \
+        lengths = [asarray(v, dtype = float).ravel() for v in (frequencies,
+            widths, gaps, capDist, x, y, bendRad, straightLength, lengths)]
+    def perResonator(values, convert):
+        if isinstance(values, str) or ndim(values) == 0:
+            return full(nRes, convert(values), dtype = float)
+        return array([convert(v) for v in values], dtype = float)
+    theta = perResonator(orientations, directionToAngle)
+    bendSign = sign(perResonator(bendDir, bendAngle))
+    meanderSign = sign(perResonator(meanderDir, bendAngle))
+    cpwSrtExtend = broadcast_to(cpwSrtExtend, nRes)
+    meanderLen = lengths - gaps - capDist \
+                                            - cpwSrtExtend - pi*bendRad
+    # Meander solved in closed form for all resonators (see meanderPlan)
+    turnLength = pi*bendRad + straightLength
+    nTurns = where(meanderLen - turnLength > 0, 1 + ceil(maximum(0,
+                meanderLen - 2*turnLength)/turnLength), 0).astype(int)
+    lengthLeft = meanderLen - nTurns*turnLength
+    tailStraight = where(lengthLeft < straightLength, lengthLeft,
+                                                            straightLength)
+    tailAngle = where(lengthLeft < straightLength, 0,
+                                    abs((lengthLeft - straightLength)/bendRad))
+    tailSign = meanderSign*(-1)**nTurns
+    # Segment table
+    counts = 5 + 2*nTurns + 1 + (tailAngle > 0)
+    owner = repeat(arange(nRes), counts)
+    k = arange(counts.sum()) - repeat(cumsum(counts) - counts, counts)
+    m = k - 5
+    tail = 2*nTurns[owner]
+    head = minimum(k, 4)
+    kinds = where(k < 5, array([OPENGAP, STRAIGHT, BEND, STRAIGHT, BEND])[head],
+            where((m < tail) & (m % 2 == 1) | (m > tail), BEND, STRAIGHT))
+    lengths = where(k < 5, stack([gaps, capDist, zeros(nRes), cpwSrtExtend,
+                                            zeros(nRes)])[head, owner],
+                where(m < tail, straightLength[owner], tailStraight[owner]))
+    angles = where(k < 5, bendSign[owner]*pi/2,
+                where(m < tail, meanderSign[owner]*(-1.)**(m//2)*pi,
+                                tailSign[owner]*tailAngle[owner]))
+    polygons, ends = batchRoute(transpose([x, y]), theta, owner, kinds,
+                lengths, bendRad[owner], angles, widths, gaps, bendPoints)
+    polySet = gdspy.PolygonSet(polygons, layer, datatype)
+    cellName.add(polySet)
+    updateIndex(cellName, polySet)
+    return polySet
+
+def polygonsOf(obj):
+    ### Returns the list of polygon vertex arrays of obj, which can be a
+    ### Polygon, PolygonSet (Path, Text, ...), Cell, CellReference, CellArray,
+    ### an array-like[N][2] of vertices or a list of any of these
+    if isinstance(obj, gdspy.Polygon):
+        return [obj.points]
+    elif isinstance(obj, gdspy.PolygonSet):
+        return list(obj.polygons)
+    elif isinstance(obj, (gdspy.Cell, gdspy.CellReference, gdspy.CellArray)):
+        return obj.get_polygons()
+    elif isinstance(obj, CPWPath):
+        return list(obj.path.polygons)
+    elif len(obj) > 0 and ndim(obj[0]) == 1 and len(obj[0]) == 2 \
+                                    and not hasattr(obj[0][0], '__len__'):
+        return [asarray(obj, dtype = float)]
+    polygons = []
+    for item in obj:
+        polygons.extend(polygonsOf(item))
+    return polygons
+
+def polygonSpecs(obj, layer = -1, datatype = -1):
+    ### List of (polygon, (layer, datatype)) of obj (see polygonsOf)
+    ### Polygons and PolygonSets keep their own layer and datatype, plain
+    ### vertex arrays get layer and datatype
+    if isinstance(obj, gdspy.Polygon):
+        return [(obj.points, (obj.layer, obj.datatype))]
+    elif isinstance(obj, gdspy.PolygonSet):
+        return list(zip(obj.polygons, zip(obj.layers, obj.datatypes)))
+    elif isinstance(obj, (gdspy.Cell, gdspy.CellReference, gdspy.CellArray)):
+        return [(poly, key) for key, polys in
+                    obj.get_polygons(by_spec = True).items() for poly in polys]
+    elif isinstance(obj, CPWPath):
+        return polygonSpecs(obj.path, layer, datatype)
+    return [(poly, (layer, datatype)) for poly in polygonsOf(obj)]
+
+def insidePolygon(points, polygon):
+    ### Even-odd test of points ([N][2]) against a polygon ([M][2])
+    ### Returns a boolean array of length N
+    px = asarray(points)[:, 0:1]
+    py = asarray(points)[:, 1:2]
+    x1, y1 = asarray(polygon, dtype = float).T
+    x2 = roll(x1, -1)
+    y2 = roll(y1, -1)
+    crosses = (y1 > py) != (y2 > py)
+    with errstate(divide = 'ignore', invalid = 'ignore'):
+        xCross = x1 + (py - y1)*(x2 - x1)/(y2 - y1)
+    return (crosses & (px < xCross)).sum(axis = 1) % 2 == 1
+
+def gridMask(polygons, origin, pitch, shape):
+    ### Marks the cells of a regular grid (cell size pitch, lower left corner
+    ### origin, shape [rows, columns]) touched by any of the polygons
+    ### Returns a boolean array of the given shape
+    nRows, nCols = shape
+    mask = zeros(shape, dtype = bool)
+    for poly in polygons:
+        poly = asarray(poly, dtype = float)
+        # Cells crossed by the outline: every edge is cut where it crosses a
+        # grid line, the pieces between cuts (and the vertices) each lie in
+        # one cell, so cells the edge only clips at a corner are found too
+        nxt = roll(poly, -1, axis = 0)
+        lo = floor((minimum(poly, nxt) - origin)/pitch)
+        hi = ceil((maximum(poly, nxt) - origin)/pitch)
+        cuts = (hi - lo + 1).astype(int)
+        n = len(poly)
+        edges = [arange(n), arange(n)]
+        ts = [zeros(n), ones(n)]
+        for axis in (0, 1):
+            count = cuts[:, axis]
+            edge = repeat(arange(n), count)
+            line = origin[axis] + pitch*(repeat(lo[:, axis], count)
+                    + arange(count.sum()) - repeat(cumsum(count) - count, count))
+            delta = nxt[edge, axis] - poly[edge, axis]
+            with errstate(divide = 'ignore', invalid = 'ignore'):
+                t = (line - poly[edge, axis])/delta
+            pick = (delta != 0) & (t > 0) & (t < 1)
+            edges.append(edge[pick])
+            ts.append(t[pick])
+        edge, t = concatenate(edges), concatenate(ts)
+        # Midpoints between consecutive cuts of the same edge
+        order = lexsort((t, edge))
+        edge, t = edge[order], t[order]
+        same = edge[1:] == edge[:-1]
+        mid = ((t[1:] + t[:-1])/2)[same]
+        edge = edge[1:][same]
+        samples = vstack([poly, poly[edge]
+                                + mid[:, newaxis]*(nxt[edge] - poly[edge])])
+        idx = floor((samples - origin)/pitch).astype(int)
+        keep = (idx[:, 0] >= 0) & (idx[:, 0] < nCols) \
+                & (idx[:, 1] >= 0) & (idx[:, 1] < nRows)
+        mask[idx[keep, 1], idx[keep, 0]] = True
+        # Cells whose centers fall inside the polygon
+        lo = maximum(floor((poly.min(axis = 0) - origin)/pitch).astype(int), 0)
+        hi = minimum(ceil((poly.max(axis = 0) - origin)/pitch).astype(int),
+                                                            [nCols, nRows])
+        if (hi > lo).all():
+            cols, rows = meshgrid(arange(lo[0], hi[0]), arange(lo[1], hi[1]))
+            centers = origin + (transpose([cols.ravel(), rows.ravel()]) + 0.5)*pitch
+            inside = insidePolygon(centers, poly)
+            mask[rows.ravel()[inside], cols.ravel()[inside]] = True
+    return mask
+
+def gridRectangles(free):
+    ### Splits the True cells of a boolean grid into rectangles
+    ### Returns a list of [row, column, rows, columns]
+    rectangles = []
+    active = {}
+    nRows = free.shape[0]
+    for r in range(nRows + 1):
+        runs = set()
+        if r < nRows:
+            edges = flatnonzero(diff(concatenate([[0], free[r].astype(int), [0]])))
+            runs = set(zip(edges[0::2], edges[1::2]))
+        for run in list(active):
+            if run not in runs:
+                start = active.pop(run)
+                rectangles.append([start, run[0], r - start, run[1] - run[0]])
+        for run in runs:
+            if run not in active:
+                active[run] = r
+    return rectangles
+
+@profiled
+def stitchGrid(cellName, box, pitch = 8, lineWidth = 4, layer = 7, datatype = 0,
+                                exclude = None, margin = 0, unitName = None):
+    ### Fills box [[x0, y0], [x1, y1]] with a grid of lines of width lineWidth
+    ### every pitch, drawn as one L-shaped unit cell repeated by CellArrays
+    ### Unit cells touching the objects in exclude (see polygonsOf), grown by
+    ### margin, are left out. The free area is split into rectangles so only a
+    ### handful of CellArrays are needed and the layout stays hierarchical
+    ### Returns the list of CellArrays added to cellName
+    if unitName is None:
+        unitName = 'STITCH_%g_%g_%d_%d' % (pitch, lineWidth, layer, datatype)
+    if unitName in gdspy.Cell.cell_dict:
+        unit = gdspy.Cell.cell_dict[unitName]
+    else:
+        unit = gdspy.Cell(unitName)
+        unit.add(gdspy.Polygon([(0, 0), (pitch, 0), (pitch, lineWidth),
+            (lineWidth, lineWidth), (lineWidth, pitch), (0, pitch)],
+                                                            layer, datatype))
+    origin = array(box[0], dtype = float)
+    nCols = int(round((box[1][0] - box[0][0])/float(pitch)))
+    nRows = int(round((box[1][1] - box[0][1])/float(pitch)))
+    free = ones((nRows, nCols), dtype = bool)
+    if exclude is not None:
+        blocked = gridMask(polygonsOf(exclude), origin, pitch, (nRows, nCols))
+        # Grow the excluded area by margin
+        grow = int(ceil(margin/float(pitch)))
+        grown = blocked.copy()
+        for shift in range(1, grow + 1):
+            grown[shift:, :] |= blocked[:-shift, :]
+            grown[:-shift, :] |= blocked[shift:, :]
+        blocked = grown.copy()
+        for shift in range(1, grow + 1):
+            grown[:, shift:] |= blocked[:, :-shift]
+            grown[:, :-shift] |= blocked[:, shift:]
+        free = ~grown
+    arrays = []
+    for row, col, rows, cols in gridRectangles(free):
+        ref = gdspy.CellArray(unit, cols, rows, (pitch, pitch),
+                                        tuple(origin + pitch*array([col, row])))
+        cellName.add(ref)
+        arrays.append(ref)
+    return arrays
+
+def boundingBox(polygons):
+    ### Bounding box [[xmin, ymin], [xmax, ymax]] of a list of polygons
+    points = vstack([asarray(p, dtype = float).reshape(-1, 2) for p in polygons])
+    return [list(points.min(axis = 0)), list(points.max(axis = 0))]
+
+def boxesOverlap(one, two):
+    ### True if two bounding boxes overlap or touch
+    return one[0][0] <= two[1][0] and two[0][0] <= one[1][0] \
+                and one[0][1] <= two[1][1] and two[0][1] <= one[1][1]
+
+def clusterBoxes(boxes):
+    ### Groups bounding boxes into clusters of (transitively) overlapping
+    ### boxes with a sweep along x. Returns a list of lists of indices
+    parent = list(range(len(boxes)))
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    order = sorted(range(len(boxes)), key = lambda i: boxes[i][0][0])
+    active = []
+    for i in order:
+        active = [j for j in active if boxes[j][1][0] >= boxes[i][0][0]]
+        for j in active:
+            if boxesOverlap(boxes[i], boxes[j]):
+                parent[root(i)] = root(j)
+        active.append(i)
+    clusters = {}
+    for i in order:
+        clusters.setdefault(root(i), []).append(i)
+    return list(clusters.values())
+
 def addPolyToCell(addThis, cell):
         ### cell - specify which GDS cell to add to
         cell.add(addThis)
+        updateIndex(cell, addThis)
 
-def mask(subtractThis, addThis = None, layer = 1, datatype = 1):
+@profiled
+def mask(subtractThis, addThis = None, layer = 1, datatype = 1, cellName = None,
+                                                tileSize = None, processes = None):
     ### Makes a mask from two objects of the type:
     ### Polygon, PolygonSet, CellReference, CellArray,
     ### or an array-like[N][2] of vertices of a polygon.
-    ### cell - specify which GDS cell to add mask to
+    ### cellName - queue the mask on the BooleanQueue of this cell instead,
+    ### it is added to the cell when the queue is resolved and None is returned
+    ### tileSize - subtract tile by tile in parallel (see tiledMask)
     ### Make a fake 1000x1000 at origin ground plane if addThis not given
     spec = {'layer': layer, 'datatype': datatype}
     if addThis is None:
         addThis = gdspy.Rectangle((-500, -500), (500, 500), 0)
+    if tileSize is not None:
+        tiled = tiledMask(subtractThis, addThis, tileSize, processes = processes,
+                                                                        **spec)
+        if cellName is None:
+            return tiled
+        # Already subtracted, queued with nothing to remove so it is added
+        # with the other results of the cell
+        booleanQueue(cellName).subtract(tiled, [], **spec)
+        return None
+    if cellName is not None:
+        booleanQueue(cellName).subtract(addThis, subtractThis, **spec)
+        return None
     # Apply boolean operation and add boolean to cell
     return gdspy.boolean([addThis, subtractThis],
         lambda addThis, subtractThis: addThis and not subtractThis, **spec)
 
-def union(one, two, layer = 1, datatype = 1):
+@profiled
+def tiledMask(subtractThis, addThis, tileSize = 1000, layer = 1, datatype = 1,
+                                                processes = None, eps = 1e-10):
+    ### addThis minus subtractThis (see mask) computed tile by tile
+    ### The bounding box of addThis is split into tileSize squares, each tile
+    ### only receives the polygons whose bounding boxes touch it and the tiles
+    ### are subtracted in a process pool (processes workers, None for one per
+    ### core, 1 to stay in this process). Memory and time per boolean are set
+    ### by the tile size instead of the chip size
+    ### Scripts using processes > 1 on Windows need an
+    ### if __name__ == '__main__': guard
+    ### eps - tolerance of gdspy.boolean, the tile edges add coincident edges
+    ### that can crash boolext at its default of 1e-13
+    ### Returns a PolygonSet with the results of all tiles
+    ground = [asarray(p, dtype = float) for p in polygonsOf(addThis)]
+    cuts = [asarray(p, dtype = float) for p in polygonsOf(subtractThis)]
+    groundBoxes = array([[p.min(axis = 0), p.max(axis = 0)] for p in ground])
+    cutBoxes = array([[p.min(axis = 0), p.max(axis = 0)] for p in cuts]) \
+                                        if len(cuts) > 0 else zeros((0, 2, 2))
+    lo = groundBoxes[:, 0].min(axis = 0)
+    hi = groundBoxes[:, 1].max(axis = 0)
+    nx, ny = maximum(ceil((hi - lo)/float(tileSize)), 1).astype(int)
+    tasks = []
+    for i in range(nx):
+        for j in range(ny):
+            tile = array([lo + tileSize*array([i, j]),
+                          minimum(lo + tileSize*array([i + 1, j + 1]), hi)])
+            # Spatial prefilter on bounding boxes
+            pickGround = flatnonzero((groundBoxes[:, 0] < tile[1]).all(axis = 1)
+                                    & (groundBoxes[:, 1] > tile[0]).all(axis = 1))
+            if len(pickGround) == 0:
+                continue
+            pickCuts = flatnonzero((cutBoxes[:, 0] < tile[1]).all(axis = 1)
+                                    & (cutBoxes[:, 1] > tile[0]).all(axis = 1))
+            tasks.append((tile, [ground[k] for k in pickGround],
+                                            [cuts[k] for k in pickCuts], eps))
+    if processes == 1:
+        results = map(maskTile, tasks)
+    else:
+        import multiprocessing
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(maskTile, tasks, chunksize = 1)
+        finally:
+            pool.close()
+            pool.join()
+    polygons = []
+    for result in results:
+        polygons.extend(result)
+    return gdspy.PolygonSet(polygons, layer, datatype)
+
+def maskTile(task):
+    ### Worker of tiledMask: ground polygons clipped to the tile minus the cuts
+    ### task is (tile [[x0, y0], [x1, y1]], ground polygons, cut polygons, eps)
+    tile, ground, cuts, eps = task
+    (x0, y0), (x1, y1) = tile
+    tilePoly = array([(x0, y0), (x1, y0), (x1, y1), (x0, y1)], dtype = float)
+    nGround = len(ground)
+    def operation(*counts):
+        # Plain loops, the star import shadows any with numpy.any
+        if not counts[0]:
+            return False
+        for k in range(nGround + 1, len(counts)):
+            if counts[k]:
+                return False
+        for k in range(1, nGround + 1):
+            if counts[k]:
+                return True
+        return False
+    result = gdspy.boolean([tilePoly] + list(ground) + list(cuts), operation,
+                                                                    eps = eps)
+    return [] if result is None else result.polygons
+
+@profiled
+def union(one, two, layer = 1, datatype = 1, cellName = None):
     ### Makes a mask from two objects of the type:
     ### Polygon, PolygonSet, CellReference, CellArray,
     ### or an array-like[N][2] of vertices of a polygon.
+    ### cellName - queue the union on the BooleanQueue of this cell instead,
+    ### it is added to the cell when the queue is resolved and None is returned
     spec = {'layer': layer, 'datatype': datatype}
+    if cellName is not None:
+        booleanQueue(cellName).union([one, two], **spec)
+        return None
     # Apply boolean operation and add boolean to cell
     return gdspy.boolean([one, two],
         lambda one, two: one or two, **spec)
+
+
+class BooleanQueue:
+    """ Pending boolean operations of a cell
+    Operations are grouped by (layer, datatype) and resolved in one pass per
+    group: operations whose bounding boxes overlap are clustered and every
+    cluster is resolved with a single gdspy.boolean call, subtractions that
+    do not touch their target skip the boolean altogether and repeated
+    operations are only run once. The result covers
+    the same area as running every operation on its own and adding all
+    results to the cell
+    cellName - cell the results are added to
+    """
+    # Queues of all cells, indexed by cell name
+    queues = {}
+
+    def __init__(self, cellName):
+        self.cellName = cellName
+        self.pending = {}
+
+    def union(self, operands, layer = 0, datatype = 0):
+        ### Queue the union of a list of operands
+        self.pending.setdefault((layer, datatype), []).append(('union',
+                                                            list(operands)))
+
+    def subtract(self, addThis, subtractThis, layer = 0, datatype = 0):
+        ### Queue addThis minus subtractThis (an operand or a list of them)
+        if not isinstance(subtractThis, list):
+            subtractThis = [subtractThis]
+        self.pending.setdefault((layer, datatype), []).append(('subtract',
+                                                    [addThis] + subtractThis))
+
+    @profiled
+    def resolve(self):
+        ### Runs the pending operations, adds the results to the cell (one
+        ### PolygonSet per layer) and returns them as a dictionary indexed by
+        ### (layer, datatype)
+        results = {}
+        for spec, terms in self.pending.items():
+            polygons = []
+            # Repeated operations give the same area, run them once
+            prepared = []
+            seen = set()
+            for term in terms:
+                term = self.prepare(term)
+                key = (term[0],) + tuple(tuple(asarray(p, dtype = float).tobytes()
+                                for p in polys) for polys in term[1])
+                if key not in seen:
+                    seen.add(key)
+                    prepared.append(term)
+            for cluster in clusterBoxes([term[2] for term in prepared]):
+                polygons.extend(self.resolveCluster([prepared[i]
+                                                        for i in cluster]))
+            result = None
+            if len(polygons) > 0:
+                result = gdspy.PolygonSet(polygons, spec[0], spec[1])
+                self.cellName.add(result)
+                updateIndex(self.cellName, result)
+            results[spec] = result
+        self.pending = {}
+        return results
+
+    def prepare(self, term):
+        ### Polygons of the operands of a term and the bounding box of the
+        ### term's result
+        kind, operands = term
+        polys = [polygonsOf(obj) for obj in operands]
+        boxes = [boundingBox(p) for p in polys]
+        if kind == 'union':
+            box = boundingBox([corner for b in boxes for corner in b])
+        else:
+            box = boxes[0]
+        return kind, polys, box, boxes
+
+    def resolveCluster(self, terms):
+        ### Resolves a list of prepared terms whose boxes overlap
+        ### Returns the resulting polygons
+        if len(terms) == 1 and terms[0][0] == 'subtract':
+            kind, polys, box, boxes = terms[0]
+            if not any([boxesOverlap(box, b) for b in boxes[1:]]):
+                # Nothing is removed from the target
+                return polys[0]
+        # Operands are passed as plain polygons, every term keeps the range
+        # of its polygons [beg, end) and of its target polygons [beg, mid)
+        operands = []
+        groups = []
+        for kind, polys, box, boxes in terms:
+            beg = len(operands)
+            for p in polys:
+                operands.extend(p)
+            mid = beg + len(polys[0])
+            groups.append((kind == 'union', beg, mid, len(operands)))
+        def operation(*counts):
+            for isUnion, beg, mid, end in groups:
+                if isUnion:
+                    for i in range(beg, end):
+                        if counts[i]:
+                            return True
+                    continue
+                for i in range(beg, mid):
+                    if counts[i]:
+                        break
+                else:
+                    continue
+                for i in range(mid, end):
+                    if counts[i]:
+                        break
+                else:
+                    return True
+            return False
+        result = gdspy.boolean(operands, operation)
+        return [] if result is None else result.polygons
+
+def booleanQueue(cellName):
+    ### Returns the BooleanQueue of a cell, creating it when needed
+    if cellName.name not in BooleanQueue.queues:
+        BooleanQueue.queues[cellName.name] = BooleanQueue(cellName)
+    return BooleanQueue.queues[cellName.name]
+
+@profiled
+def resolveBooleans():
+    ### Resolves the queued boolean operations of all cells
+    for queue in BooleanQueue.queues.values():
+        queue.resolve()
+
+def pointSegmentDistances(points, start, stop):
+    ### Distances between points [N][2] and segments start-stop [M][2]
+    ### Returns an [N][M] array
+    points = asarray(points, dtype = float)[:, newaxis, :]
+    start = asarray(start, dtype = float)[newaxis, :, :]
+    delta = asarray(stop, dtype = float)[newaxis, :, :] - start
+    lengthSq = (delta**2).sum(axis = 2)
+    with errstate(divide = 'ignore', invalid = 'ignore'):
+        t = ((points - start)*delta).sum(axis = 2)/lengthSq
+    t = clip(nan_to_num(t), 0, 1)
+    return sqrt(((start + t[:, :, newaxis]*delta - points)**2).sum(axis = 2))
+
+def segmentDistances(a0, a1, b0, b1):
+    ### Distances between the segments a0-a1 [N][2] and b0-b1 [M][2]
+    ### Returns an [N][M] array, 0 where the segments cross
+    a0 = asarray(a0, dtype = float)
+    a1 = asarray(a1, dtype = float)
+    b0 = asarray(b0, dtype = float)
+    b1 = asarray(b1, dtype = float)
+    dist = minimum(minimum(pointSegmentDistances(a0, b0, b1),
+                           pointSegmentDistances(a1, b0, b1)),
+                   minimum(pointSegmentDistances(b0, a0, a1).T,
+                           pointSegmentDistances(b1, a0, a1).T))
+    # Proper crossings
+    def side(p, q0, q1):
+        return sign((q1[newaxis, :, 0] - q0[newaxis, :, 0])*(p[:, newaxis, 1]
+                - q0[newaxis, :, 1]) - (q1[newaxis, :, 1] - q0[newaxis, :, 1])
+                *(p[:, newaxis, 0] - q0[newaxis, :, 0]))
+    crosses = (side(a0, b0, b1)*side(a1, b0, b1) < 0) \
+                & (side(b0, a0, a1)*side(b1, a0, a1) < 0).T
+    dist[crosses] = 0
+    return dist
+
+def polygonDistance(one, two):
+    ### Smallest distance between two polygons, 0 if they overlap
+    one = asarray(one, dtype = float)
+    two = asarray(two, dtype = float)
+    if insidePolygon(one[:1], two)[0] or insidePolygon(two[:1], one)[0]:
+        return 0.
+    return segmentDistances(one, roll(one, -1, axis = 0),
+                            two, roll(two, -1, axis = 0)).min()
+
+
+class SpatialIndex:
+    """ Uniform grid index of polygon bounding boxes
+    Every polygon gets an id (its insertion order) and is registered in the
+    grid buckets its bounding box covers, so box, point and nearest queries
+    only look at the polygons of a few buckets instead of the whole cell.
+    Bounding boxes, layers and datatypes are kept in NumPy arrays and the
+    candidates of a query are filtered in one vectorized pass
+    pitch - size of the grid buckets, about the size of a typical polygon
+    """
+    # Indexes of all cells, indexed by cell name
+    indexes = {}
+
+    def __init__(self, pitch = 500):
+        self.pitch = float(pitch)
+        self.grid = {}
+        self.polygons = []
+        self.boxes = zeros((64, 4))
+        self.specs = zeros((64, 2), dtype = int)
+        self.count = 0
+
+    def add(self, obj, layer = -1, datatype = -1):
+        ### Adds the polygons of obj (see polygonsOf), Polygons and
+        ### PolygonSets keep their own layer and datatype, plain vertex
+        ### arrays get layer and datatype
+        ### Returns the list of new ids
+        ids = []
+        for poly, spec in polygonSpecs(obj, layer, datatype):
+            ids.append(self.addPolygon(poly, spec[0], spec[1]))
+        return ids
+
+    def addPolygon(self, polygon, layer = -1, datatype = -1):
+        ### Adds one polygon, returns its id
+        polygon = asarray(polygon, dtype = float)
+        if self.count == len(self.boxes):
+            self.boxes = concatenate([self.boxes, zeros(self.boxes.shape)])
+            self.specs = concatenate([self.specs, zeros(self.specs.shape,
+                                                                dtype = int)])
+        i = self.count
+        self.count += 1
+        self.polygons.append(polygon)
+        self.boxes[i, :2] = polygon.min(axis = 0)
+        self.boxes[i, 2:] = polygon.max(axis = 0)
+        self.specs[i] = layer, datatype
+        lo, hi = self.buckets(self.boxes[i])
+        for bx in range(lo[0], hi[0] + 1):
+            for by in range(lo[1], hi[1] + 1):
+                self.grid.setdefault((bx, by), []).append(i)
+        return i
+
+    def buckets(self, box):
+        ### Lowest and highest grid bucket covered by box [x0, y0, x1, y1]
+        lo = floor(asarray(box[:2])/self.pitch).astype(int)
+        hi = floor(asarray(box[2:])/self.pitch).astype(int)
+        return lo, hi
+
+    def candidates(self, box):
+        ### Ids registered in the buckets covered by box [x0, y0, x1, y1]
+        lo, hi = self.buckets(box)
+        if (hi - lo + 1).prod() > len(self.grid):
+            # Query larger than the index, walk the occupied buckets
+            keys = [key for key in self.grid if lo[0] <= key[0] <= hi[0]
+                                                and lo[1] <= key[1] <= hi[1]]
+        else:
+            keys = [(bx, by) for bx in range(lo[0], hi[0] + 1)
+                             for by in range(lo[1], hi[1] + 1)]
+        lists = [self.grid[key] for key in keys if key in self.grid]
+        if len(lists) == 0:
+            return zeros(0, dtype = int)
+        return unique(concatenate(lists))
+
+    def select(self, ids, layers):
+        ### Keeps the ids on one of layers (layer numbers or
+        ### (layer, datatype) pairs), all of them if layers is None
+        if layers is None or len(ids) == 0:
+            return ids
+        keep = zeros(len(ids), dtype = bool)
+        for spec in layers:
+            if isinstance(spec, tuple):
+                keep |= (self.specs[ids, 0] == spec[0]) \
+                            & (self.specs[ids, 1] == spec[1])
+            else:
+                keep |= self.specs[ids, 0] == spec
+        return ids[keep]
+
+    def queryBox(self, box, layers = None, margin = 0):
+        ### Ids of the polygons whose bounding boxes touch box
+        ### [[x0, y0], [x1, y1]] grown by margin
+        box = array([box[0][0] - margin, box[0][1] - margin,
+                     box[1][0] + margin, box[1][1] + margin], dtype = float)
+        ids = self.select(self.candidates(box), layers)
+        b = self.boxes[ids]
+        hit = (b[:, 0] <= box[2]) & (b[:, 2] >= box[0]) \
+                & (b[:, 1] <= box[3]) & (b[:, 3] >= box[1])
+        return ids[hit]
+
+    def queryPoint(self, point, layers = None):
+        ### Ids of the polygons containing point
+        ids = self.queryBox([point, point], layers)
+        return array([i for i in ids
+                    if insidePolygon([point], self.polygons[i])[0]], dtype = int)
+
+    def queryPolygon(self, polygon, distance = 0, layers = None):
+        ### Ids of the polygons closer than distance to polygon (touching or
+        ### overlapping ones when distance is 0)
+        polygon = asarray(polygon, dtype = float)
+        box = [polygon.min(axis = 0), polygon.max(axis = 0)]
+        ids = self.queryBox(box, layers, margin = distance)
+        return array([i for i in ids if polygonDistance(polygon,
+                            self.polygons[i]) <= distance], dtype = int)
+
+    def nearest(self, point, k = 1, layers = None, maxDistance = None):
+        ### The k polygons closest to point (0 for the ones containing it),
+        ### searching rings of buckets around point until no unvisited
+        ### bucket can hold anything closer
+        ### Returns (ids, distances) sorted by distance
+        point = asarray(point, dtype = float)
+        center = floor(point/self.pitch).astype(int)
+        if len(self.grid) == 0:
+            return zeros(0, dtype = int), zeros(0)
+        keys = array(list(self.grid.keys()))
+        lastRing = abs(keys - center).max()
+        found = {}
+        ring = 0
+        while ring <= lastRing:
+            ids = []
+            for bx in range(center[0] - ring, center[0] + ring + 1):
+                for by in range(center[1] - ring, center[1] + ring + 1):
+                    if maximum(abs(bx - center[0]), abs(by - center[1])) == ring:
+                        ids.extend(self.grid.get((bx, by), []))
+            ids = self.select(unique(array(ids, dtype = int)), layers)
+            for i in ids:
+                if i in found:
+                    continue
+                poly = self.polygons[i]
+                if insidePolygon([point], poly)[0]:
+                    found[i] = 0.
+                else:
+                    found[i] = pointSegmentDistances([point], poly,
+                                            roll(poly, -1, axis = 0)).min()
+            best = sorted(found.values())
+            # Buckets outside this ring are at least ring*pitch away
+            reach = ring*self.pitch
+            if len(best) >= k and best[k - 1] <= reach:
+                break
+            if maxDistance is not None and reach > maxDistance:
+                break
+            ring += 1
+        order = sorted(found, key = lambda i: found[i])
+        if maxDistance is not None:
+            order = [i for i in order if found[i] <= maxDistance]
+        order = order[:k]
+        return array(order, dtype = int), array([found[i] for i in order])
+
+def spatialIndex(cellName, pitch = 500):
+    ### Returns the SpatialIndex of a cell, creating it from the polygons
+    ### already in the cell when needed. Polygons added later through
+    ### gdslib (CPWPath.end, addPolyToCell, resonatorArray, resolved boolean
+    ### queues) are indexed as they are added, stitch grids are not
+    if cellName.name not in SpatialIndex.indexes:
+        index = SpatialIndex(pitch)
+        index.add(cellName)
+        SpatialIndex.indexes[cellName.name] = index
+    return SpatialIndex.indexes[cellName.name]
+
+def updateIndex(cellName, obj):
+    ### Adds obj to the SpatialIndex of cellName, if the cell has one
+    if obj is not None and cellName is not None \
+                        and cellName.name in SpatialIndex.indexes:
+        SpatialIndex.indexes[cellName.name].add(obj)
+
+@profiled
+def gdsPrint(outfile, cells = None, name = 'library', unit = 1.0e-6,
+                                                        precision = 1.0e-9):
+    ### gdspy.gds_print after resolving all queued boolean operations
+    resolveBooleans()
+    gdspy.gds_print(outfile, cells, name, unit, precision)